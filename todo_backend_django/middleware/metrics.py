@@ -0,0 +1,166 @@
+import bisect
+import hmac
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.http import HttpResponse
+
+
+# Upper bounds (seconds) of the latency histogram buckets, Prometheus' defaults
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Timings of the request being handled (set by RequestLoggingMiddleware), or None outside a request
+current_timings = ContextVar("current_timings", default=None)
+
+
+class RequestTimings:
+    """
+    What one request spent its time on: database queries and serialization.
+    """
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper(): times every query of the request
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.db_queries += 1
+
+
+@contextmanager
+def measure_serialization():
+    """
+    Adds the time spent in the block to the current request's serialization time.
+    """
+    timings = current_timings.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.serialize_seconds += time.perf_counter() - started
+
+
+class Histogram:
+    """
+    Cumulative latency histogram in Prometheus' layout (one counter per upper bound).
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    In-process request metrics, labelled by resolved route and method.
+
+    Each server process keeps its own numbers; Prometheus scrapes every process (or
+    sums them), like it does for any multi-process exporter without shared storage.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}  # (view, method) -> [latency Histogram, db queries, db seconds, serialize seconds]
+        self._collectors = []  # Callables returning more metric lines (e.g. the connection pools)
+
+    def add_collector(self, collector):
+        """
+        Adds a callable returning extra lines in the text format to every render().
+        """
+        self._collectors.append(collector)
+
+    def observe(self, view, method, seconds, timings):
+        with self._lock:
+            series = self._series.get((view, method))
+            if series is None:
+                series = self._series[(view, method)] = [Histogram(), 0, 0.0, 0.0]
+            series[0].observe(seconds)
+            series[1] += timings.db_queries
+            series[2] += timings.db_seconds
+            series[3] += timings.serialize_seconds
+
+    def render(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            series = sorted((key, [value[0].counts[:], value[0].sum, value[0].count] + value[1:])
+                            for key, value in self._series.items())
+
+        lines = [
+            "# HELP http_request_duration_seconds Request wall time by route.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (view, method), (counts, total, count, *_) in series:
+            labels = f'view="{escape_label(view)}",method="{method}"'
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS + (None,), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound is None else repr(bound)
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {total}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {count}")
+
+        counters = [
+            ("http_request_db_queries_total", "Database queries run by requests, by route.", 3),
+            ("http_request_db_seconds_total", "Time requests spent in database queries, by route.", 4),
+            ("http_request_serialize_seconds_total", "Time requests spent serializing responses, by route.", 5),
+        ]
+        for name, help_text, index in counters:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for (view, method), values in series:
+                lines.append(f'{name}{{view="{escape_label(view)}",method="{method}"}} {values[index]}')
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+def escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# The process-wide registry filled by RequestLoggingMiddleware
+registry = MetricsRegistry()
+
+
+def metrics_view(request):
+    """
+    To scrape the metrics===>http://127.0.0.1:8000/metrics (Authorization: Bearer <METRICS_TOKEN>)
+
+    Serves the latency histograms and per-route counters of this process, and the
+    metrics of the collectors (the connection pools, see todo_backend.db.pool, and the
+    password hashing pool, see users.hashing). The routes and load they reveal are not
+    public: the scraper must send settings.METRICS_TOKEN, and without one the endpoint
+    answers 404.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        return HttpResponse(status=404)
+    scheme, _, credentials = request.META.get("HTTP_AUTHORIZATION", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(credentials.strip().encode(), token.encode()):
+        response = HttpResponse(status=401)
+        response["WWW-Authenticate"] = 'Bearer realm="metrics"'
+        return response
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,22 +1,255 @@
-import datetime
+import itertools
+import logging
+import os
+import re
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from todo_backend.routers import apin_user_to_primary, pin_user_to_primary, routing_scope
+from . import profiling
+from .metrics import RequestTimings, current_timings, registry
+from .queries import observe_queries
+from .structured_logging import request_context
+
+
+logger = logging.getLogger(__name__)
+
+# Request ids accepted from the X-Request-ID header (e.g. set by the load balancer)
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
 
 class RequestLoggingMiddleware:
     """
     Middleware to log details of incoming requests and add custom data to the request object.
+
+    It also instruments every request: wall time, the number and duration of database
+    queries (through connection.execute_wrapper) and the time spent serializing the
+    response. The numbers are sent back in a Server-Timing header (visible in the
+    browser's network panel) and added to the per-route histograms served at /metrics.
+    For streaming responses only the time to the first byte is measured.
+
+    Every request gets a request id (the incoming X-Request-ID header, or a new one),
+    returned in X-Request-ID and added with the user id and view name to every log record
+    written while the request runs (see middleware.structured_logging).
+
+    Under ASGI the middleware runs on the event loop, like the async views behind it.
     """
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Django runs sync hooks of an async chain on a thread: use the coroutine versions
+            self.process_view = self.aprocess_view
+            self.process_template_response = self.aprocess_template_response
 
     def __call__(self, request):
-        # Log request details
-        # print(f"satyam singh inside middleware code is running [{datetime.datetime.now()}] {request.method} {request.path}")
-        
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started, tokens = self.start(request)
+        try:
+            with observe_queries(request.timings):  # Count and time every query
+                # Proceed to the next middleware or view
+                response = self.get_response(request)
+            return self.finish(request, response, started)
+        finally:
+            self.reset(tokens)
+
+    async def __acall__(self, request):
+        started, tokens = self.start(request)
+        try:
+            with observe_queries(request.timings):  # Also reaches the sync_to_async threads running queries
+                response = await self.get_response(request)
+            return self.finish(request, response, started)
+        finally:
+            self.reset(tokens)
+
+    def start(self, request):
         # Add custom data to the request object
         request.custom_data = "This is custom data added by the middleware"
-        
-        # Proceed to the next middleware or view
-        response = self.get_response(request)
-        
-       
+
+        request_id = request.META.get("HTTP_X_REQUEST_ID", "")
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+        context_token = request_context.set({"request_id": request_id, "user_id": None, "view": None})
+
+        request.timings = RequestTimings()
+        timings_token = current_timings.set(request.timings)  # Lets measure_serialization() find this request
+        return time.perf_counter(), (context_token, timings_token)
+
+    def reset(self, tokens):
+        context_token, timings_token = tokens
+        current_timings.reset(timings_token)
+        request_context.reset(context_token)
+
+    def finish(self, request, response, started):
+        elapsed = time.perf_counter() - started
+        timings = request.timings
+
+        # Log request details (a high-volume event: sampled by the LOGGING config)
+        logger.info("%s %s %s", request.method, request.path, response.status_code, extra={
+            "event": "http.request",
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(elapsed * 1000, 2),
+            "db_queries": timings.db_queries,
+        })
+
+        match = getattr(request, "resolver_match", None)
+        view = match.route if match is not None else "unmatched"  # The URL pattern, so ids do not explode the label set
+        registry.observe(view, request.method, elapsed, timings)
+
+        response["Server-Timing"] = ", ".join([
+            f"total;dur={elapsed * 1000:.2f}",
+            f'db;dur={timings.db_seconds * 1000:.2f};desc="{timings.db_queries} queries"',
+            f"serialize;dur={timings.serialize_seconds * 1000:.2f}",
+        ])
+        response["X-Request-ID"] = request.request_id
         return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Name the view in the log context (class-based views by their class)
+        view = getattr(view_func, "view_class", view_func)
+        context = request_context.get()
+        if context is not None:
+            context["view"] = f"{view.__module__}.{view.__qualname__}"
+        return None
+
+    def process_template_response(self, request, response):
+        # Called right before DRF's Response is rendered: time the rendering (serialization) step
+        started = time.perf_counter()
+
+        def rendered(response):
+            request.timings.serialize_seconds += time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    # Coroutine versions of the hooks, which __init__ installs when the chain is async
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        return type(self).process_view(self, request, view_func, view_args, view_kwargs)
+
+    async def aprocess_template_response(self, request, response):
+        return type(self).process_template_response(self, request, response)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles one request in PROFILING["SAMPLE_RATE"], plus any request carrying a valid
+    signed X-Profile header (see middleware.profiling.make_profile_header).
+
+    The profile is written to PROFILING["DIRECTORY"]: a collapsed-stack file for flame
+    graphs (MODE "sample", a helper thread samples the request thread's stack) or a
+    cProfile dump (MODE "cprofile"). Old files are rotated out by count and total size.
+    The response names the file in an X-Profile header.
+
+    Requests that are not profiled pay for one counter increment and one header lookup.
+    Under ASGI the event loop's thread is profiled (see profiling.aprofile_call).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = settings.PROFILING
+        self.sample_rate = config["SAMPLE_RATE"]  # 0 profiles only requests with the header
+        self.config = config
+        self._counter = itertools.count(1)  # next() is atomic under the GIL
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.wants_profile(request):
+            return self.get_response(request)
+        response, suffix, write = profiling.profile_call(
+            self.config["MODE"], self.config["SAMPLE_INTERVAL"], self.get_response, request
+        )
+        return self.save(request, response, suffix, write)
+
+    async def __acall__(self, request):
+        if not self.wants_profile(request):
+            return await self.get_response(request)
+        response, suffix, write = await profiling.aprofile_call(
+            self.config["MODE"], self.config["SAMPLE_INTERVAL"], self.get_response, request
+        )
+        return self.save(request, response, suffix, write)
+
+    def wants_profile(self, request):
+        sampled = self.sample_rate and next(self._counter) % self.sample_rate == 0
+        header = request.META.get("HTTP_X_PROFILE")
+        return sampled or bool(header and profiling.valid_profile_header(header, self.config["HEADER_MAX_AGE"]))
+
+    def save(self, request, response, suffix, write):
+        directory = self.config["DIRECTORY"]
+        os.makedirs(directory, exist_ok=True)
+        path = profiling.profile_path(directory, request, suffix)
+        write(path)
+        profiling.rotate(directory, self.config["MAX_FILES"], self.config["MAX_BYTES"])
+        response["X-Profile"] = os.path.basename(path)
+        return response
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Read-your-writes for todo_backend.routers.ReplicaRouter.
+
+    A request that writes is answered with a signed cookie, and its user gets a cache
+    marker; for READ_YOUR_WRITES_SECONDS afterwards either one sends that client's or
+    user's reads to the primary instead of a replica that may not have caught up yet.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    cookie_name = "db_primary_pin"
+    cookie_salt = "middleware.replica-stickiness"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routing_scope(self.pinned(request)) as state:
+            response = self.get_response(request)
+        user_id = self.remember_write(state, response)
+        if user_id is not None:
+            pin_user_to_primary(user_id)  # Also covers the user's other clients and tokens
+        return response
+
+    async def __acall__(self, request):
+        with routing_scope(self.pinned(request)) as state:
+            response = await self.get_response(request)
+        user_id = self.remember_write(state, response)
+        if user_id is not None:
+            await apin_user_to_primary(user_id)
+        return response
+
+    def pinned(self, request):
+        window = settings.READ_YOUR_WRITES_SECONDS
+        return request.get_signed_cookie(self.cookie_name, default=None, salt=self.cookie_salt, max_age=window) is not None
+
+    def remember_write(self, state, response):
+        """
+        Pins the client with the cookie if the request wrote; returns the user id to pin, if any.
+        """
+        if not state.wrote:
+            return None
+        response.set_signed_cookie(
+            self.cookie_name, "1", salt=self.cookie_salt, max_age=settings.READ_YOUR_WRITES_SECONDS,
+            httponly=True, samesite="Lax",
+        )
+        return state.user_id
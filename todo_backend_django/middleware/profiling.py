@@ -0,0 +1,147 @@
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.core import signing
+
+
+# Salt of the signed X-Profile request header
+PROFILE_HEADER_SALT = "middleware.profiling"
+
+
+def make_profile_header():
+    """
+    Returns a value for the X-Profile request header that makes ProfilingMiddleware
+    profile the request. It is signed with SECRET_KEY and expires after
+    PROFILING["HEADER_MAX_AGE"] seconds, so only people with the key can trigger profiling:
+
+        python manage.py shell -c "from middleware.profiling import make_profile_header; print(make_profile_header())"
+    """
+    return signing.TimestampSigner(salt=PROFILE_HEADER_SALT).sign("profile")
+
+
+def valid_profile_header(value, max_age):
+    try:
+        return signing.TimestampSigner(salt=PROFILE_HEADER_SALT).unsign(value, max_age=max_age) == "profile"
+    except signing.BadSignature:  # Also raised for expired values
+        return False
+
+
+class StackSampler:
+    """
+    Samples the call stack of one thread every `interval` seconds from a helper thread.
+
+    The result is in the collapsed-stack format ("outer;inner;innermost count" per line)
+    read by flamegraph.pl, speedscope and most flame graph viewers.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def write(self, path):
+        with open(path, "w") as output:
+            output.write(self.collapsed())
+
+
+def profile_call(mode, interval, function, *args):
+    """
+    Runs function(*args) under the profiler.
+
+    Returns:
+        tuple: (function's result, file suffix, callable writing the profile to a path)
+    """
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        result = profiler.runcall(function, *args)
+        return result, ".prof", profiler.dump_stats  # Open with pstats or snakeviz
+
+    sampler = StackSampler(threading.get_ident(), interval)
+    sampler.start()
+    try:
+        result = function(*args)
+    finally:
+        sampler.stop()
+    return result, ".collapsed", sampler.write
+
+
+async def aprofile_call(mode, interval, function, *args):
+    """
+    profile_call() for a coroutine function, profiling the event loop's thread until it returns.
+
+    The profile also covers whatever else the loop runs meanwhile (other requests), and
+    the work the coroutine hands to sync_to_async threads only shows up as waiting.
+    """
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            result = await function(*args)
+        finally:
+            profiler.disable()
+        return result, ".prof", profiler.dump_stats
+
+    sampler = StackSampler(threading.get_ident(), interval)
+    sampler.start()
+    try:
+        result = await function(*args)
+    finally:
+        sampler.stop()
+    return result, ".collapsed", sampler.write
+
+
+def profile_path(directory, request, suffix):
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", request.path).strip("-")[:60] or "root"
+    unique = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    return os.path.join(directory, f"{unique}-{request.method}-{slug}{suffix}")
+
+
+def rotate(directory, max_files, max_bytes):
+    """
+    Deletes the oldest profiles until at most max_files remain, taking at most max_bytes
+    (the newest profile is always kept).
+    """
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.endswith((".prof", ".collapsed")):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    entries.sort(reverse=True)  # Newest first
+
+    kept_bytes = 0
+    for index, (_, size, path) in enumerate(entries):
+        kept_bytes += size
+        if index and (index >= max_files or kept_bytes > max_bytes):
+            try:
+                os.remove(path)
+            except FileNotFoundError:  # Another worker rotated it already
+                pass
@@ -0,0 +1,196 @@
+import logging
+import os
+import re
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+logger = logging.getLogger(__name__)
+
+# Literals and placeholder lists that vary between runs of the same query
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:%s|\?)\s*,)*\s*(?:%s|\?)\s*\)")
+
+# Execute wrappers observing the queries of the current request or block (see observe_queries)
+query_observers = ContextVar("query_observers", default=())
+
+
+def dispatch_query(execute, sql, params, many, context):
+    """
+    Execute wrapper installed once on every database connection: runs the query through
+    the observers of the current context, outermost first.
+    """
+    for observer in reversed(query_observers.get()):
+        execute = partial(observer, execute)
+    return execute(sql, params, many, context)
+
+
+def install_query_dispatch(connection, **kwargs):
+    if dispatch_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(dispatch_query)
+
+
+# Database connections are per thread, and under ASGI a request's queries run on
+# sync_to_async threads, so the wrapper goes on every connection as it is opened
+connection_created.connect(install_query_dispatch)
+
+
+@contextmanager
+def observe_queries(observer):
+    """
+    Runs every query of the block through observer, an execute wrapper
+    (see connection.execute_wrapper()), on every database and thread the block's context
+    reaches: sync_to_async carries it to the threads running an async view's queries, so
+    no thread has to be entered to install it.
+    """
+    for connection in connections.all(initialized_only=True):
+        install_query_dispatch(connection)  # Opened before this module was imported
+    token = query_observers.set(query_observers.get() + (observer,))
+    try:
+        yield observer
+    finally:
+        query_observers.reset(token)
+
+
+def normalize_sql(sql):
+    """
+    Reduces a query to its shape: literals become ?, and IN (...) lists of any length match.
+    """
+    sql = STRING_LITERAL.sub("?", sql)
+    sql = NUMBER_LITERAL.sub("?", sql)
+    sql = PLACEHOLDER_LIST.sub("(...)", sql.replace("%s", "?"))
+    return " ".join(sql.split())
+
+
+def application_stack():
+    """
+    Returns the formatted stack frames of the project's own code (no Django, DRF or this module).
+    """
+    project = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()[:-2]
+        if frame.filename.startswith(project) and "site-packages" not in frame.filename
+        and os.path.abspath(frame.filename) != os.path.abspath(__file__)
+    ]
+    return "".join(traceback.format_list(frames))
+
+
+class RepeatedQueryError(AssertionError):
+    """
+    Raised when one query shape runs more often than allowed within a request or block,
+    the usual sign of an N+1 pattern (one query per row instead of a join or prefetch).
+    """
+
+
+class QueryShapeCollector:
+    """
+    connection.execute_wrapper() callable that counts executed SQL by normalized shape.
+
+    The first time a shape reaches the threshold, the stack of the code that ran it is
+    recorded; stacks are not captured for any other query, so the collector is cheap.
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.counts = Counter()
+        self.stacks = {}  # Shape -> stack at the query that crossed the threshold
+
+    def __call__(self, execute, sql, params, many, context):
+        shape = normalize_sql(sql)
+        self.counts[shape] += 1
+        if self.counts[shape] == self.threshold:
+            self.stacks[shape] = application_stack()
+        return execute(sql, params, many, context)
+
+    def repeated(self):
+        """
+        Returns [(shape, count, stack)] for the shapes that reached the threshold.
+        """
+        return [(shape, self.counts[shape], stack) for shape, stack in self.stacks.items()]
+
+    def report(self):
+        return "\n\n".join(
+            f"{count}x {shape}\nTriggered by:\n{stack or '  (no project frames)'}"
+            for shape, count, stack in self.repeated()
+        )
+
+
+@contextmanager
+def collect_query_shapes(threshold):
+    """
+    Collects the query shapes run on every database connection inside the block.
+    """
+    with observe_queries(QueryShapeCollector(threshold)) as collector:
+        yield collector
+
+
+class RepeatedQueryMiddleware:
+    """
+    Development aid: flags requests that run one query shape QUERY_DETECTOR["THRESHOLD"]
+    times or more, with the stack of the code that did it.
+
+    ACTION "warn" logs a warning on the middleware.queries logger; "raise" fails the
+    request with RepeatedQueryError. Disabled unless QUERY_DETECTOR["ENABLED"] (DEBUG by default).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        config = settings.QUERY_DETECTOR
+        if not config["ENABLED"]:
+            raise MiddlewareNotUsed()  # Removed from the chain: no cost in production
+        self.get_response = get_response
+        self.threshold = config["THRESHOLD"]
+        self.action = config["ACTION"]
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)  # Stays on the event loop under ASGI
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with collect_query_shapes(self.threshold) as collector:
+            response = self.get_response(request)
+        self.check(request, collector)
+        return response
+
+    async def __acall__(self, request):
+        with collect_query_shapes(self.threshold) as collector:
+            response = await self.get_response(request)
+        self.check(request, collector)
+        return response
+
+    def check(self, request, collector):
+        if collector.stacks:
+            message = f"Repeated queries in {request.method} {request.path}:\n\n{collector.report()}"
+            if self.action == "raise":
+                raise RepeatedQueryError(message)
+            logger.warning(message, extra={"event": "db.repeated_queries"})
+
+
+class RepeatedQueryTestMixin:
+    """
+    TestCase mixin to fail tests that introduce N+1 queries:
+
+        with self.assertNoRepeatedQueries():
+            self.client.get("/api/todos/")
+    """
+
+    repeated_query_threshold = 5
+
+    @contextmanager
+    def assertNoRepeatedQueries(self, threshold=None):
+        with collect_query_shapes(threshold or self.repeated_query_threshold) as collector:
+            yield collector
+        if collector.stacks:
+            raise self.failureException(f"Repeated queries:\n\n{collector.report()}")
@@ -0,0 +1,113 @@
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+
+# Request id, user id and view of the request being handled, added to every log record
+request_context = ContextVar("request_context", default=None)
+
+# LogRecord attributes that are not extra fields passed by the caller
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def update_log_context(**values):
+    """
+    Adds values (e.g. user_id once the token is validated) to the current request's log context.
+    """
+    context = request_context.get()
+    if context is not None:
+        context.update(values)
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line: timestamp, level, logger, message, the
+    request context and any fields passed with extra={...}, plus the traceback as
+    "exception" (formatted by QueueingHandler.prepare, see there).
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a share of the records of high-volume events.
+
+    Records name their event with extra={"event": "..."}; rates maps event names to the
+    share kept (0.01 keeps one in a hundred). Records of other events are all kept.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = rates or {}
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, "event", None))
+        return rate is None or random.random() < rate
+
+
+class QueueingHandler(QueueHandler):
+    """
+    Hands records to a background thread that formats them as JSON and writes them out,
+    so request threads never block on stdout/stderr.
+
+    The request context is captured in the calling thread. When the queue is full (the
+    output cannot keep up), records are dropped and counted instead of blocking.
+    """
+
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(JSONFormatter())
+        self.dropped = 0
+        self.listener = OutputListener(self.queue, output)
+        self.listener.start()
+
+    def prepare(self, record):
+        # QueueHandler.prepare() would append the traceback to the message and clear
+        # exc_text; keep the traceback apart in exc_text instead. Args and traceback are
+        # formatted here, in the logging thread, while the objects they refer to are current.
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        context = request_context.get()
+        if context is not None:
+            for key, value in context.items():
+                record.__dict__.setdefault(key, value)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        # logging.shutdown() calls this at exit: write out what is still queued
+        if self.listener._thread is not None:
+            self.listener.stop()
+        super().close()
+
+
+class OutputListener(QueueListener):
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)  # Wait for room instead of failing on a full queue
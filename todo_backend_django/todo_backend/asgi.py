@@ -3,6 +3,10 @@ ASGI config for todo_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn todo_backend.asgi:application``) for the
+native async views and the Server-Sent Events stream at /api/todos/events/, whose idle
+connections wait on the event loop instead of holding a thread each.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -0,0 +1,12 @@
+from django.db.backends.mysql import base
+
+from todo_backend.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """
+    Django's MySQL backend with pooled connections (ENGINE 'todo_backend.db.mysql').
+    """
+
+    def pool_check(self, connection):
+        connection.ping()  # One round trip, no statement to parse
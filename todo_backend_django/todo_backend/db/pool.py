@@ -0,0 +1,345 @@
+import os
+import threading
+import time
+import weakref
+from collections import Counter, deque
+from functools import partial
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError
+
+from middleware.metrics import Histogram, escape_label, registry
+
+
+# Upper bounds (seconds) of the checkout wait histogram buckets
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Defaults of a database's OPTIONS["pool"] settings
+POOL_DEFAULTS = {
+    "max_size": 10,  # Open connections per process, idle or in use
+    "timeout": 10.0,  # Seconds a checkout waits for a free connection before failing
+    "max_lifetime": 1800.0,  # Seconds before a connection is replaced; keep it below MySQL's wait_timeout
+}
+
+
+class PoolTimeout(OperationalError):
+    """
+    Raised when no connection became free within the pool's timeout.
+    """
+
+
+class _Waiter:
+    """
+    A thread waiting for a connection. The releasing thread hands it an idle entry, or
+    None as the right to open a new connection.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.entry = None
+
+
+class ConnectionPool:
+    """
+    Thread-safe, bounded pool of DB-API connections.
+
+    At most max_size connections are open at once. A checkout reuses the most recently
+    returned connection, replaces it when it is older than max_lifetime or fails the
+    health check, and opens a new one while there is room. When there is none, callers
+    queue up and are served first come, first served: a returned connection (or the slot
+    of a discarded one) goes straight to the longest waiter, so newcomers cannot jump
+    the queue. A waiter gives up with PoolTimeout after `timeout` seconds.
+
+    Args:
+        connect (callable): Opens a new DB-API connection.
+        check (callable): Raises if a connection is not usable (e.g. connection.ping()).
+    """
+
+    def __init__(self, connect, check, max_size, timeout, max_lifetime):
+        self.connect = connect
+        self.check = check
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.pid = os.getpid()
+        self.params = None  # Connection parameters, set by get_pool()
+        self.retired = False  # Replaced by another pool: close connections as they come back
+        self._lock = threading.Lock()
+        self._idle = []  # (connection, opened at) stack: the warmest connection is reused first
+        self._in_use = {}  # id(connection) -> opened at
+        self._waiters = deque()
+        self._size = 0  # Connections open or being opened
+        self.counters = Counter()  # checkouts, timeouts, opened, expired, failed_checks
+        self.wait_seconds = Histogram(WAIT_BUCKETS)
+
+    def checkout(self):
+        """
+        Returns a healthy connection, opening one if needed.
+
+        Raises:
+            PoolTimeout: If no connection became free within the timeout.
+        """
+        started = time.monotonic()
+        while True:
+            entry = self._acquire(started + self.timeout)
+            if entry is None:
+                entry = self._open()
+            elif not self._usable(entry):
+                continue  # Replaced; its slot was freed for the next attempt
+            with self._lock:
+                self._in_use[id(entry[0])] = entry[1]
+                self.counters["checkouts"] += 1
+                self.wait_seconds.observe(time.monotonic() - started)
+            return entry[0]
+
+    def _acquire(self, deadline):
+        # Returns an idle entry, or None after reserving a slot for a new connection
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            if self._size < self.max_size:
+                self._size += 1
+                return None
+            waiter = _Waiter()
+            self._waiters.append(waiter)
+
+        if not waiter.event.wait(max(0.0, deadline - time.monotonic())):
+            with self._lock:
+                if not waiter.event.is_set():  # Not served between the timeout and taking the lock
+                    self._waiters.remove(waiter)
+                    self.counters["timeouts"] += 1
+                    raise PoolTimeout(f"No database connection became free within {self.timeout} seconds.")
+        return waiter.entry
+
+    def _open(self):
+        try:
+            connection = self.connect()
+        except BaseException:
+            self._free_slot()
+            raise
+        with self._lock:
+            self.counters["opened"] += 1
+        return connection, time.monotonic()
+
+    def _usable(self, entry):
+        connection, opened_at = entry
+        if time.monotonic() - opened_at >= self.max_lifetime:
+            counter = "expired"
+        else:
+            try:
+                self.check(connection)
+                return True
+            except Exception:
+                counter = "failed_checks"
+        with self._lock:
+            self.counters[counter] += 1
+        self._close(connection)
+        return False
+
+    def release(self, connection):
+        """
+        Returns a checked-out connection to the pool (it must be out of any transaction).
+        """
+        with self._lock:
+            opened_at = self._in_use.pop(id(connection), None)
+            if opened_at is None:
+                return  # Not checked out from this pool, or released already
+            if not self.retired and time.monotonic() - opened_at < self.max_lifetime:
+                self._put((connection, opened_at))
+                return
+            if not self.retired:
+                self.counters["expired"] += 1
+        self._close(connection)
+
+    def discard(self, connection):
+        """
+        Closes a checked-out connection instead of returning it (e.g. it is broken).
+        """
+        with self._lock:
+            if self._in_use.pop(id(connection), None) is None:
+                return
+        self._close(connection)
+
+    def _put(self, entry):
+        # Called with the lock held
+        if self._waiters:
+            waiter = self._waiters.popleft()
+            waiter.entry = entry
+            waiter.event.set()
+        else:
+            self._idle.append(entry)
+
+    def _free_slot(self):
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().event.set()  # Entry None: the waiter opens a connection
+            else:
+                self._size -= 1
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass  # It is being thrown away
+        self._free_slot()
+
+    def close_idle(self):
+        """
+        Closes every idle connection (e.g. before the process exits).
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._close(connection)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self._size,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "waiting": len(self._waiters),
+                **self.counters,
+            }
+
+
+# Connection pools of this process by database alias
+pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, options, params, connect, check):
+    """
+    Returns the process-wide pool of the database alias, creating it on first use.
+
+    The pool is replaced when the connection parameters change (e.g. the test runner
+    switching to the test database), and is not inherited across a fork (e.g. gunicorn
+    --preload): those connections belong to the parent, so the child starts its own.
+    """
+    pool = pools.get(alias)
+    if pool is not None and pool.pid == os.getpid() and pool.params == params:
+        return pool
+    with _pools_lock:
+        pool = pools.get(alias)
+        if pool is None or pool.pid != os.getpid() or pool.params != params:
+            unknown = set(options) - set(POOL_DEFAULTS)
+            if unknown:
+                raise ImproperlyConfigured(f"Unknown pool options for database {alias!r}: {', '.join(sorted(unknown))}")
+            if pool is not None and pool.pid == os.getpid():
+                pool.retired = True
+                pool.close_idle()  # Connections to the old database; checked-out ones close on release
+            pool = pools[alias] = ConnectionPool(connect, check, **{**POOL_DEFAULTS, **options})
+            pool.params = params
+    return pool
+
+
+def render_pool_metrics():
+    """
+    Returns the pool gauges, counters and wait-time histograms in the Prometheus text format.
+    """
+    stats = {alias: (pool.stats(), pool.wait_seconds) for alias, pool in sorted(pools.items())}
+    if not stats:
+        return []
+
+    lines = [
+        "# HELP db_pool_connections Pooled database connections by state.",
+        "# TYPE db_pool_connections gauge",
+    ]
+    for alias, (values, _) in stats.items():
+        for state in ("in_use", "idle"):
+            lines.append(f'db_pool_connections{{alias="{escape_label(alias)}",state="{state}"}} {values[state]}')
+
+    gauges = [
+        ("db_pool_waiting", "gauge", "Threads waiting for a pooled connection.", "waiting"),
+        ("db_pool_checkouts_total", "counter", "Connections checked out of the pool.", "checkouts"),
+        ("db_pool_timeouts_total", "counter", "Checkouts that gave up waiting.", "timeouts"),
+        ("db_pool_opened_total", "counter", "Connections opened by the pool.", "opened"),
+        ("db_pool_expired_total", "counter", "Connections closed for reaching max_lifetime.", "expired"),
+        ("db_pool_failed_checks_total", "counter", "Connections closed for failing the checkout health check.", "failed_checks"),
+    ]
+    for name, kind, help_text, key in gauges:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for alias, (values, _) in stats.items():
+            lines.append(f'{name}{{alias="{escape_label(alias)}"}} {values.get(key, 0)}')
+
+    lines.append("# HELP db_pool_wait_seconds Time spent waiting for a pooled connection.")
+    lines.append("# TYPE db_pool_wait_seconds histogram")
+    for alias, (_, histogram) in stats.items():
+        label = f'alias="{escape_label(alias)}"'
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + (None,), histogram.counts[:]):
+            cumulative += count
+            le = "+Inf" if bound is None else repr(bound)
+            lines.append(f'db_pool_wait_seconds_bucket{{{label},le="{le}"}} {cumulative}')
+        lines.append(f"db_pool_wait_seconds_sum{{{label}}} {histogram.sum}")
+        lines.append(f"db_pool_wait_seconds_count{{{label}}} {histogram.count}")
+    return lines
+
+
+registry.add_collector(render_pool_metrics)
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    DatabaseWrapper mixin that borrows connections from the alias' ConnectionPool.
+
+    Enable it with OPTIONS["pool"] = True or {"max_size": ..., "timeout": ..., "max_lifetime": ...}.
+    Django opens a connection on a request's first query and closes it when the request
+    finishes (CONN_MAX_AGE = 0); here closing returns it to the pool, after rolling back
+    any transaction left open. That holds for WSGI worker threads and for the threads ASGI
+    runs sync code in alike: the pool is shared by the threads of the process, never used
+    from the event loop (Django only allows queries from sync code).
+
+    A connection whose wrapper is garbage collected without being closed (e.g. a thread
+    that died) is discarded, so its slot is not lost.
+    """
+
+    _pool = None
+    _pool_finalizer = None
+
+    @property
+    def pool_options(self):
+        options = self.settings_dict["OPTIONS"].get("pool", False)
+        return {} if options is True else options
+
+    def pool_check(self, connection):
+        """
+        Health check run on every checkout; raises if the connection is not usable.
+        """
+        cursor = connection.cursor()  # Plain DB-API: not every driver's cursor is a context manager
+        try:
+            cursor.execute("SELECT 1")
+        finally:
+            cursor.close()
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop("pool", None)  # Ours, not the driver's
+        return params
+
+    def get_new_connection(self, conn_params):
+        if self.pool_options is False:
+            return super().get_new_connection(conn_params)
+        if self.settings_dict["CONN_MAX_AGE"] != 0:
+            raise ImproperlyConfigured("Pooled connections need CONN_MAX_AGE = 0: the pool keeps them open.")
+        pool = get_pool(
+            self.alias, self.pool_options, conn_params, partial(super().get_new_connection, conn_params), self.pool_check
+        )
+        connection = pool.checkout()
+        self._pool = pool
+        self._pool_finalizer = weakref.finalize(self, pool.discard, connection)
+        return connection
+
+    def _close(self):
+        if self._pool_finalizer is None or self.connection is None:
+            return super()._close()
+        self._pool_finalizer.detach()
+        self._pool_finalizer = None
+        try:
+            if self.in_atomic_block or not self.autocommit:
+                self.connection.rollback()  # The next borrower must not inherit a transaction
+        except Exception:
+            self._pool.discard(self.connection)
+        else:
+            self._pool.release(self.connection)
@@ -0,0 +1,192 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from todos.sharding import is_sharded, shard_for_user
+
+
+# Apps whose reads may be served by a replica
+REPLICATED_APPS = {"todos", "users"}
+
+# Routing state of the current request (set by ReplicaStickinessMiddleware), or None outside requests
+routing_state = ContextVar("routing_state", default=None)
+
+
+class RoutingState:
+    """
+    Whether the current request must read from the primary: it wrote, the client (by
+    cookie) or the user (by cache marker) wrote within READ_YOUR_WRITES_SECONDS, or the
+    code is inside a read_from_primary() block.
+    """
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+        self.user_id = None  # Set by the authentication (see set_current_user)
+        self.user_checked = False
+        self.primary_blocks = 0  # Depth of read_from_primary() blocks
+
+
+@contextmanager
+def routing_scope(pinned=False):
+    """
+    Tracks writes and primary pinning for the code inside the block (one request).
+    """
+    state = RoutingState(pinned)
+    token = routing_state.set(state)
+    try:
+        yield state
+    finally:
+        routing_state.reset(token)
+
+
+@contextmanager
+def read_from_primary():
+    """
+    Sends the block's reads to the primary, e.g. for results cached beyond the replica lag.
+    """
+    state = routing_state.get()
+    if state is None:
+        with routing_scope(pinned=True):
+            yield
+        return
+    state.primary_blocks += 1
+    try:
+        yield
+    finally:
+        state.primary_blocks -= 1
+
+
+def mark_written():
+    """
+    Records a write made through an explicit alias (QuerySet.using()), which the routers
+    never see: like a routed write, it pins the rest of the request and the user's next
+    reads to the primary.
+    """
+    state = routing_state.get()
+    if state is not None:
+        state.wrote = True
+
+
+def set_current_user(user_id):
+    """
+    Records the authenticated user of the current request, whose writes pin their reads.
+    """
+    state = routing_state.get()
+    if state is not None:
+        state.user_id = user_id
+
+
+def user_pin_key(user_id):
+    return f"db:primary-pin:{user_id}"
+
+
+def pin_user_to_primary(user_id):
+    """
+    Sends the user's reads to the primary for READ_YOUR_WRITES_SECONDS, from any worker.
+    """
+    cache.set(user_pin_key(user_id), True, settings.READ_YOUR_WRITES_SECONDS)
+
+
+async def apin_user_to_primary(user_id):
+    await cache.aset(user_pin_key(user_id), True, settings.READ_YOUR_WRITES_SECONDS)
+
+
+class ReplicaRouter:
+    """
+    Sends writes to the primary (DATABASE_PRIMARY) and todo/user reads to a random
+    replica from DATABASE_REPLICAS, except when reading a replica could miss a write:
+
+    - inside a transaction.atomic() block on the primary (reads must see its writes),
+    - for the rest of a request that wrote,
+    - for READ_YOUR_WRITES_SECONDS after the client or user last wrote, remembered in a
+      signed cookie and in a per-user cache marker (see ReplicaStickinessMiddleware),
+    - inside read_from_primary() blocks.
+
+    With no replicas configured every query goes to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        primary = settings.DATABASE_PRIMARY
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or model._meta.app_label not in REPLICATED_APPS:
+            return primary
+        if connections[primary].in_atomic_block:
+            return primary
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            return instance._state.db  # Follow relations on the database the object came from
+
+        state = routing_state.get()
+        if state is not None:
+            if state.pinned or state.wrote or state.primary_blocks:
+                return primary
+            if not state.user_checked:
+                if state.user_id is not None:  # Known once the token is validated; checked once per request
+                    state.user_checked = True
+                    state.pinned = cache.get(user_pin_key(state.user_id)) is not None
+                    if state.pinned:
+                        return primary
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = routing_state.get()
+        if state is not None and model._meta.app_label in REPLICATED_APPS:
+            state.wrote = True  # The rest of the request reads its own writes
+        return settings.DATABASE_PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The primary and the replicas hold the same data
+        databases = {settings.DATABASE_PRIMARY, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+# Models whose rows live on their owner's shard
+SHARDED_MODELS = {"todos.Todo", "todos.TodoTombstone"}
+
+
+class ShardRouter:
+    """
+    Database router that keeps every todos.Todo (and TodoTombstone) row on its owner's shard.
+
+    Saving a todo (Todo.objects.create(), serializer.save(), todo.save()) writes to
+    shard_for_user(todo.user_id), and user.todos reads from the user's shard. Queries
+    that start from Todo.objects must pick the shard themselves, through
+    Todo.objects.for_user() / shard() or all_shards() (see todos.models.UserShardedQuerySet).
+
+    Users stay on the primary; the todos table keeps user_id without a database-level
+    foreign key, since the referenced row lives in another database.
+    """
+
+    def _applies(self, model):
+        return model._meta.label in SHARDED_MODELS and is_sharded()
+
+    def db_for_read(self, model, **hints):
+        if not self._applies(model):
+            return None
+        instance = hints.get("instance")
+        if instance is None:
+            return None
+        if instance._meta.label == "users.User":
+            return shard_for_user(instance.pk)  # user.todos.all()
+        return instance._state.db
+
+    def db_for_write(self, model, **hints):
+        if not self._applies(model):
+            return None
+        instance = hints.get("instance")
+        if instance is not None and getattr(instance, "user_id", None) is not None:
+            return shard_for_user(instance.user_id)
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        labels = {obj1._meta.label, obj2._meta.label}
+        if "users.User" in labels and labels & SHARDED_MODELS:
+            return True  # A todo on a shard still belongs to its user on the primary
+        return None
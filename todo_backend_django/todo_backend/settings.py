@@ -33,11 +33,15 @@ SECRET_KEY = env('SECRET_KEY', default='django-insecure-l6_ofy!w%t@r+ef-__@clfmi
 # Configure Django REST Framework and JWT settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',  # Use JWT
+        'users.authentication.ClaimsJWTAuthentication',  # Use JWT (validated once, claims exposed on request.auth)
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',  # Require authentication by default
     ),
+    # Reverse proxies in front of the app. Throttles identify clients by REMOTE_ADDR when 0,
+    # otherwise by the X-Forwarded-For entry this many hops from the right. Unset, DRF would
+    # trust the whole client-supplied header, letting anyone pick a fresh IP per request.
+    'NUM_PROXIES': env.int('NUM_PROXIES', default=0),
 }
 
 # Configure JWT settings
@@ -51,6 +55,88 @@ SIMPLE_JWT = {
     'TOKEN_OBTAIN_PAIR_SERIALIZER': 'users.serializers.CustomTokenObtainPairSerializer',
 }
 
+# Logout revokes tokens by jti (users/revocation.py). Each process keeps a Bloom filter of
+# revoked jtis so valid tokens are checked without a database query.
+TOKEN_REVOCATION = {
+    'BLOOM_CAPACITY': 100000,  # Revocations the filter holds at the target error rate
+    'BLOOM_ERROR_RATE': 0.01,  # Share of valid tokens that need a database check
+    'LRU_SIZE': 10000,  # Database answers remembered per process
+    'REBUILD_INTERVAL': 3600,  # Seconds before the filter is rebuilt without expired revocations
+    # Workers learn about each other's revocations through CACHES. With a per-process cache
+    # (local memory) they poll the table instead, so a logout takes effect everywhere within:
+    'POLL_INTERVAL': 2,
+    'COMMIT_MARGIN': 60,  # Seconds a revocation may take to commit (plus clock skew between workers)
+}
+
+# Token-bucket throttling of the unauthenticated auth endpoints (users/throttling.py).
+# Rates use DRF's "count/period" format; "username" is the account named in the request.
+AUTH_THROTTLING = {
+    'RATES': {
+        'login': {'ip': '30/min', 'username': '5/min'},
+        'password_reset': {'ip': '10/min', 'username': '3/hour'},
+    },
+    'MAX_KEYS': 100000,  # Buckets kept per process (least recently used are dropped)
+    # Merge buckets across workers through CACHES; only enable it with a shared cache backend
+    'SHARED_CACHE': env.bool('AUTH_THROTTLING_SHARED_CACHE', default=False),
+    'SYNC_INTERVAL': 1,  # Seconds between merges of a bucket with the shared cache
+}
+
+# Email outbox (users/outbox.py): views queue emails, `manage.py run_outbox` delivers them
+EMAIL_OUTBOX = {
+    'BATCH_SIZE': 50,  # Emails sent per SMTP connection
+    'MAX_ATTEMPTS': 5,  # Failed sends before an email is marked failed
+    'BACKOFF_SECONDS': 30,  # Delay before the first retry, doubled after every failure
+    'MAX_BACKOFF_SECONDS': 3600,
+    'LEASE_SECONDS': 300,  # How long a claimed batch is hidden from other workers
+    'POLL_INTERVAL': 5,  # Seconds the worker sleeps when nothing is due
+}
+
+# Bearer token the Prometheus scraper sends to /metrics (middleware/metrics.py); unset disables the endpoint
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+
+# Request profiling (middleware.middleware.ProfilingMiddleware). Requests with a signed
+# X-Profile header (middleware.profiling.make_profile_header()) are always profiled.
+PROFILING = {
+    'SAMPLE_RATE': env.int('PROFILING_SAMPLE_RATE', default=0),  # Profile 1 request in N; 0 = header only
+    'MODE': 'sample',  # 'sample' (collapsed stacks for flame graphs) or 'cprofile' (.prof dumps)
+    'SAMPLE_INTERVAL': 0.005,  # Seconds between stack samples in 'sample' mode
+    'DIRECTORY': os.path.join(BASE_DIR, 'profiles'),
+    'MAX_FILES': 100,  # Oldest profiles are deleted beyond this count...
+    'MAX_BYTES': 50 * 1024 * 1024,  # ...or this total size
+    'HEADER_MAX_AGE': 3600,  # Seconds a signed X-Profile header stays valid
+}
+
+# Structured logging (middleware/structured_logging.py): JSON lines tagged with the request id,
+# user id and view, written by a background thread so request threads never block on output.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'sampling': {
+            '()': 'middleware.structured_logging.SamplingFilter',
+            # Share of the records kept per high-volume event
+            'rates': {
+                'http.request': env.float('LOG_SAMPLE_HTTP_REQUEST', default=1.0),
+                'todos.role_scope': 0.01,
+            },
+        },
+    },
+    'handlers': {
+        # todo_backend.test_runner swaps it for a NullHandler while the tests run
+        'queue': {
+            '()': 'middleware.structured_logging.QueueingHandler',
+            'filters': ['sampling'],
+        },
+    },
+    'loggers': {
+        app: {'handlers': ['queue'], 'level': env('LOG_LEVEL', default='INFO'), 'propagate': False}
+        for app in ('todos', 'users', 'middleware')
+    },
+}
+
+# `manage.py test` keeps the structured logs off stderr (assertLogs still sees the records)
+TEST_RUNNER = 'todo_backend.test_runner.TestRunner'
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
@@ -88,9 +174,20 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     #custom middleware
     'middleware.middleware.RequestLoggingMiddleware',  # Your custom middleware
+    'middleware.middleware.ProfilingMiddleware',  # Profiles sampled requests (see PROFILING)
+    'middleware.queries.RepeatedQueryMiddleware',  # Flags N+1 query patterns in development (see QUERY_DETECTOR)
+    'middleware.middleware.ReplicaStickinessMiddleware',  # Read-your-writes for the replica router
 
 ]
 
+# N+1 detection (middleware/queries.py): warn or fail when one query shape repeats this
+# often within a request. Only active when ENABLED (development by default).
+QUERY_DETECTOR = {
+    'ENABLED': DEBUG,
+    'THRESHOLD': 5,  # Runs of the same normalized query per request
+    'ACTION': 'warn',  # 'warn' (log with the triggering stack) or 'raise'
+}
+
 ROOT_URLCONF = 'todo_backend.urls'
 
 TEMPLATES = [
@@ -116,15 +213,83 @@ WSGI_APPLICATION = 'todo_backend.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',  # Specifies MySQL as the database engine
+        # Django's MySQL backend with a per-process connection pool (see todo_backend.db.pool)
+        'ENGINE': 'todo_backend.db.mysql',
         'NAME': env('DB_NAME', default='django_todo'),  # The name of the MySQL database
         'USER': env('DB_USER', default='root'),  # MySQL database username
         'PASSWORD': env('DB_PASSWORD', default='toor'),  # Password for the MySQL user
         'HOST': env('DB_HOST', default='localhost'),  # Database host (localhost for local development)
         'PORT': env('DB_PORT', default='3306'),  # MySQL's default port number
+        'CONN_MAX_AGE': 0,  # Connections are returned to the pool at the end of each request
+        'OPTIONS': {
+            'pool': {
+                'max_size': env.int('DB_POOL_MAX_SIZE', default=10),  # Per process: keep workers x max_size below max_connections
+                'timeout': env.float('DB_POOL_TIMEOUT', default=10.0),  # Seconds to wait for a free connection
+                'max_lifetime': env.float('DB_POOL_MAX_LIFETIME', default=1800.0),  # Below MySQL's wait_timeout
+            },
+        },
+    }
+}
+
+# Read replicas: every host in DB_REPLICA_HOSTS (comma-separated) becomes an alias replica_<n>
+# with the primary's credentials. todo_backend.routers.ReplicaRouter sends todo and user reads
+# there and keeps writers reading from the primary for READ_YOUR_WRITES_SECONDS.
+DATABASE_PRIMARY = 'default'
+DATABASE_REPLICAS = []
+for index, host in enumerate(env.list('DB_REPLICA_HOSTS', default=[]), start=1):
+    DATABASES[f'replica_{index}'] = {**DATABASES['default'], 'HOST': host}
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+# Todo shards: every host in DB_SHARD_HOSTS (comma-separated) becomes an alias shard_<n>
+# with the primary's credentials. Users stay on the primary; each user's todos live on
+# the shard picked by a consistent-hash ring over TODO_SHARDS (see todos.sharding).
+# Changing TODO_SHARDS moves some users to another shard: run
+# `python manage.py rebalance_todos --all` right after deploying the change.
+# Todo ids are only unique per shard unless each shard uses its own auto_increment_offset.
+TODO_SHARDS = [DATABASE_PRIMARY]
+for index, host in enumerate(env.list('DB_SHARD_HOSTS', default=[]), start=1):
+    DATABASES[f'shard_{index}'] = {**DATABASES['default'], 'HOST': host}
+    TODO_SHARDS.append(f'shard_{index}')
+TODO_SHARD_VNODES = 64  # Points per shard on the ring; more points spread users more evenly
+
+# ShardRouter first: it places todos on their shard and defers everything else
+DATABASE_ROUTERS = ['todo_backend.routers.ShardRouter', 'todo_backend.routers.ReplicaRouter']
+READ_YOUR_WRITES_SECONDS = 5  # Longer than the usual replication lag
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# The todo list cache keeps a version per user in here. Local memory is per process, so with
+# several workers point this at a shared backend (Redis/Memcached) or writes in one worker
+# will not invalidate the copies cached by the others (token revocation falls back to polling
+# the database, see TOKEN_REVOCATION).
+CACHES = {
+    'default': {
+        'BACKEND': env('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env('CACHE_LOCATION', default='todo-backend'),
     }
 }
 
+TODO_LIST_CACHE_TIMEOUT = 300  # Seconds a cached GET /api/todos/ response is kept (writes invalidate it sooner)
+
+# Delta sync (GET /api/todos/changes/, see todos.sync)
+TODO_SYNC = {
+    'PAGE_SIZE': 100,  # Changes per response unless ?limit= asks for fewer
+    'MAX_PAGE_SIZE': 500,
+    'SETTLE_SECONDS': 2,  # Changes younger than this wait for the next call (longer than a write transaction)
+    # Deletions are kept this long (compact with `python manage.py compact_tombstones`, e.g. daily);
+    # clients whose cursor is older get 410 Gone and sync again from scratch
+    'TOMBSTONE_TTL_DAYS': 30,
+}
+
+# Push of todo events (GET /api/todos/events/, Server-Sent Events; serve with todo_backend.asgi)
+TODO_EVENTS = {
+    # Pub/sub backend. LocalBackend only reaches the streams of the process that saved the
+    # todo: with several server processes, plug in a backend they share (see todos.events).
+    'BACKEND': 'todos.events.LocalBackend',
+    'QUEUE_SIZE': 100,  # Events buffered per connection before a slow client is told to resync
+    'HEARTBEAT_SECONDS': 15,  # Comment line sent on idle connections (below proxy idle timeouts)
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -143,6 +308,14 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing runs in a pool of worker processes (see users/hashing.py) so a burst of
+# signups/logins cannot starve the request threads. WORKERS=0 hashes inline on the request thread.
+PASSWORD_HASHING_POOL = {
+    'WORKERS': env.int('PASSWORD_HASHING_WORKERS', default=2),  # Hashing processes per server worker
+    'MAX_PENDING': 32,  # Jobs queued or running before new callers have to wait
+    'WAIT_TIMEOUT': 5,  # Seconds to wait for a free slot before answering 503
+}
+
 # Specify the custom user model
 AUTH_USER_MODEL = 'users.User'
 
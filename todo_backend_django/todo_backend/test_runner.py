@@ -0,0 +1,30 @@
+import logging.config
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    DiscoverRunner that keeps the structured logs (settings.LOGGING) off stderr and hashes
+    passwords inline.
+
+    The app loggers keep their levels, so the records are still created and assertLogs
+    sees them, but the queueing handler is replaced by a NullHandler for the run.
+
+    PASSWORD_HASHING_POOL["WORKERS"] is 0, so logins and signups do not spawn hashing
+    processes; the tests of users.hashing build pools with real workers themselves.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.inline_hashing = override_settings(PASSWORD_HASHING_POOL={**settings.PASSWORD_HASHING_POOL, "WORKERS": 0})
+        self.inline_hashing.enable()
+        # Closes the configured handlers (stopping the queue's writer thread) and installs the quiet one
+        logging.config.dictConfig({**settings.LOGGING, "handlers": {"queue": {"class": "logging.NullHandler"}}})
+
+    def teardown_test_environment(self, **kwargs):
+        self.inline_hashing.disable()
+        logging.config.dictConfig(settings.LOGGING)
+        super().teardown_test_environment(**kwargs)
@@ -24,6 +24,7 @@ from rest_framework_swagger.views import get_swagger_view
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
+from middleware.metrics import metrics_view  # Prometheus metrics collected by RequestLoggingMiddleware
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -40,6 +41,7 @@ urlpatterns = [
     path('api/users/', include('users.urls')),  # URL routing for user operations
     path('api/todos/', include('todos.urls')),  # URL routing for to-do operations
     path('docs/', schema_view.with_ui('swagger', cache_timeout=0),name='schema-swagger-ui'),
+    path('metrics', metrics_view, name='metrics'),  # Per-route latency histograms (Prometheus text format, METRICS_TOKEN)
 
  
 ]
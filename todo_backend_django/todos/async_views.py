@@ -0,0 +1,199 @@
+import json  # Used to parse request bodies
+import math
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from users.authentication import StatelessClaimsJWTAuthentication
+from .events import event_stream, get_broker
+from .models import Todo
+from .pagination import acursor_paginate, InvalidCursor
+from .serializers import TodoSerializer, TodoBatchItemSerializer
+from .sync import delete_todo
+from .views import TodoFilterMixin
+
+
+class AsyncTokenAuthMixin:
+    """
+    Authenticates async views with StatelessClaimsJWTAuthentication before dispatching.
+    """
+
+    def authenticate(self, request):
+        """
+        Authenticates the Bearer token and sets request.user / request.auth like DRF does.
+
+        Returns:
+            JsonResponse: An error response, or None when the request is authenticated.
+        """
+        try:
+            result = StatelessClaimsJWTAuthentication().authenticate(request)
+        except APIException as e:
+            return JsonResponse({"detail": e.detail}, status=e.status_code)
+        if result is None:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=status.HTTP_401_UNAUTHORIZED)
+        request.user, request.auth = result
+        return None
+
+    async def dispatch(self, request, *args, **kwargs):
+        error = await sync_to_async(self.authenticate)(request)
+        if error is not None:
+            return error
+        return await super().dispatch(request, *args, **kwargs)
+
+
+# Native async version of TodoListView for the ASGI entry point (todo_backend/asgi.py)
+@method_decorator(csrf_exempt, name='dispatch')  # Token-authenticated API, like DRF's APIView
+class AsyncTodoListView(AsyncTokenAuthMixin, TodoFilterMixin, View):
+    """
+    Handles listing, creating, updating and deleting todos without leaving the event loop.
+
+    DRF's APIView only runs synchronous handlers, so under ASGI every TodoListView call is
+    pushed through sync_to_async onto a worker thread. This view uses Django's async ORM
+    (async iteration, aget, acreate, asave, adelete) instead. Authentication is the same
+    StatelessClaimsJWTAuthentication (run on a thread, as its revocation check may need
+    the database), and the role scoping and filters are shared with TodoListView through
+    TodoFilterMixin.
+
+    The list response is not cached here (see todos.cache for the sync view).
+    """
+
+    def parse_body(self, request):
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    async def get(self, request):
+        """
+        Fetches todos for the authenticated user; same parameters and response as TodoListView.get.
+        """
+        page_size = request.GET.get('page_size', 10)
+
+        todos = self.todos_for(request)  # All todos for admins, the user's own todos otherwise
+        try:
+            todos = self.filter_todos(todos, request.GET)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        cursor = request.GET.get('cursor', None)
+        if cursor is not None:
+            try:
+                paginated_data = await acursor_paginate(todos, cursor, page_size)
+            except InvalidCursor:
+                return JsonResponse({"error": "Invalid cursor."}, status=status.HTTP_400_BAD_REQUEST)
+            except ValueError:
+                return JsonResponse({"error": "Invalid page size."}, status=status.HTTP_400_BAD_REQUEST)
+            return JsonResponse({
+                "todos": TodoSerializer(paginated_data["items"], many=True).data,
+                "pagination": {
+                    "next": paginated_data["next"],
+                    "previous": paginated_data["previous"],
+                }
+            })
+
+        # Page-number mode, with the same clamping as Paginator.get_page()
+        try:
+            page_size = int(page_size)
+        except ValueError:
+            return JsonResponse({"error": "Invalid page size."}, status=status.HTTP_400_BAD_REQUEST)
+        total_pages = max(1, math.ceil(await todos.acount() / max(page_size, 1)))
+        try:
+            page_number = min(max(int(request.GET.get('page', 1)), 1), total_pages)
+        except ValueError:
+            page_number = 1
+        offset = (page_number - 1) * page_size
+        items = [todo async for todo in todos.order_by('id')[offset:offset + page_size]]
+        return JsonResponse({
+            "todos": TodoSerializer(items, many=True).data,
+            "pagination": {
+                "total_pages": total_pages,
+                "current_page": page_number,
+                "has_next": page_number < total_pages,
+                "has_previous": page_number > 1,
+            }
+        })
+
+    async def post(self, request):
+        """
+        Creates a new todo for the authenticated user.
+        """
+        data = self.parse_body(request)
+        if data is None:
+            return JsonResponse({"error": "Invalid JSON body."}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = TodoBatchItemSerializer(data=data)  # Validates without a User lookup
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        todo = await Todo.objects.acreate(user_id=request.user.id, **serializer.validated_data)
+        return JsonResponse(TodoSerializer(todo).data, status=status.HTTP_201_CREATED)
+
+    async def put(self, request, todo_id):
+        """
+        Updates a specific todo for the authenticated user.
+        """
+        try:
+            todo = await Todo.objects.for_user(request.user.id).aget(id=todo_id)
+        except Todo.DoesNotExist:
+            return JsonResponse({"error": "Todo not found."}, status=status.HTTP_404_NOT_FOUND)
+        data = self.parse_body(request)
+        if data is None:
+            return JsonResponse({"error": "Invalid JSON body."}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = TodoBatchItemSerializer(todo, data=data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        for field, value in serializer.validated_data.items():
+            setattr(todo, field, value)
+        await todo.asave()
+        return JsonResponse(TodoSerializer(todo).data, status=status.HTTP_200_OK)
+
+    async def delete(self, request, todo_id):
+        """
+        Deletes a specific todo item for the authenticated user.
+        """
+        try:
+            todo = await Todo.objects.for_user(request.user.id).aget(id=todo_id)
+        except Todo.DoesNotExist:
+            return JsonResponse({"message": "Todo not found or you don't have access to it."}, status=status.HTTP_404_NOT_FOUND)
+        await sync_to_async(delete_todo)(todo)  # Deletes it and records the tombstone in one transaction
+        return JsonResponse({"message": "Todo successfully deleted."}, status=status.HTTP_204_NO_CONTENT)
+
+
+# Push channel for todo changes, served by the ASGI entry point (todo_backend/asgi.py)
+class TodoEventsView(AsyncTokenAuthMixin, View):
+    """
+    To follow changes===>http://127.0.0.1:8000/api/todos/events/ (Authorization: Bearer <token>)
+
+    Streams the authenticated user's todo events as Server-Sent Events:
+
+        event: created / updated    data: {"type": ..., "todo": {...}}
+        event: deleted              data: {"type": "deleted", "id": 1}
+        event: changed              data: {"type": "changed"}  (bulk changes: fetch /api/todos/changes/)
+        event: resync               data: {"type": "resync"}   (the client fell behind; the stream ends)
+
+    plus a ": heartbeat" comment every TODO_EVENTS["HEARTBEAT_SECONDS"] on idle streams.
+    Events are not replayed: after (re)connecting, catch up with /api/todos/changes/.
+
+    Each open stream is a coroutine waiting on its own bounded queue (see todos.events),
+    so idle connections cost no thread and thousands fit in one ASGI worker. Under WSGI a
+    stream would hold a worker thread for as long as it is open, so it is refused there.
+    """
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse({"error": "Event streams are only served by the ASGI app."}, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+        subscribe = partial(get_broker().subscribe, request.user.id)
+        response = StreamingHttpResponse(
+            event_stream(subscribe, settings.TODO_EVENTS["HEARTBEAT_SECONDS"]), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # Tells nginx not to buffer the stream
+        return response
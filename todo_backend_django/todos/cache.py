@@ -0,0 +1,94 @@
+import hashlib  # Used to build cache keys and ETags
+import uuid  # Used to generate new namespace versions
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache  # Django's cache framework (local-memory unless CACHES says otherwise)
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from todo_backend.routers import read_from_primary
+from .encoders import FastJSONRenderer
+
+
+# Namespace used for the admin list, which covers every user's todos
+ALL_USERS = "all"
+
+
+def version_key(scope):
+    return f"todos:list:version:{scope}"
+
+
+def get_version(scope):
+    """
+    Returns the current version of a list namespace (a user id or ALL_USERS), creating it if needed.
+    """
+    version = cache.get(version_key(scope))
+    if version is None:
+        cache.add(version_key(scope), uuid.uuid4().hex, None)  # add() keeps a version another worker just created
+        version = cache.get(version_key(scope))
+    return version
+
+
+def bump_version(user_id):
+    """
+    Invalidates every cached list response of a user (and the admin list, which includes it).
+
+    A fresh random version is written instead of incrementing, so the bump needs no
+    read and cannot collide with a version another worker wrote concurrently.
+    """
+    cache.set_many({version_key(user_id): uuid.uuid4().hex, version_key(ALL_USERS): uuid.uuid4().hex}, None)
+
+
+def list_cache_key(scope, role, query_params):
+    """
+    Builds the cache key of one list response from the namespace version and the query parameters.
+    """
+    params = "&".join(f"{key}={value}" for key, value in sorted(query_params.lists()))
+    digest = hashlib.sha256(f"{role}?{params}".encode()).hexdigest()
+    return f"todos:list:{scope}:{get_version(scope)}:{digest}"
+
+
+def make_etag(data):
+    """
+    Strong ETag over the JSON representation of the response data.
+    """
+    return hashlib.sha256(FastJSONRenderer().render(data)).hexdigest()
+
+
+def cached_list_response(view_method):
+    """
+    Decorator for TodoListView.get that caches the response per user and answers
+    matching If-None-Match requests with 304 Not Modified.
+
+    A cache hit costs only cache reads: the version lookup and the entry itself. The
+    version is bumped by the Todo post_save/post_delete signals (see todos.signals) and by
+    the bulk endpoints, so a changed list is never served from the cache. A miss reads
+    from the primary: a lagging replica's rows would be cached under the new version.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        role = request.auth.get('role', None) if request.auth is not None else None
+        scope = ALL_USERS if role == 'admin' else request.user.id  # Admins list every user's todos
+        key = list_cache_key(scope, role, request.query_params)
+
+        entry = cache.get(key)
+        if entry is None:
+            with read_from_primary():
+                response = view_method(self, request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response  # Errors are not cached
+            entry = {"etag": make_etag(response.data), "data": response.data}
+            cache.set(key, entry, settings.TODO_LIST_CACHE_TIMEOUT)
+        else:
+            response = Response(entry["data"])
+
+        etag = quote_etag(entry["etag"])
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        response["ETag"] = etag
+        return response
+
+    return wrapper
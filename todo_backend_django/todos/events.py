@@ -0,0 +1,171 @@
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+
+def channel_for(user_id):
+    return f"todos:{user_id}"
+
+
+class LocalBackend:
+    """
+    Pub/sub backend that delivers messages to the subscribers of this process only.
+
+    With several server processes, a backend shared by all of them (e.g. Redis pub/sub)
+    has to implement the same four methods; publish() may then be called in one process
+    and the callbacks run in another, from the backend's listener thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # Channel -> set of callbacks
+
+    def publish(self, channel, message):
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, ()))
+        for callback in callbacks:
+            callback(message)
+
+    def subscribe(self, channel, callback):
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(callback)
+
+    def unsubscribe(self, channel, callback):
+        with self._lock:
+            callbacks = self._subscribers.get(channel)
+            if callbacks is not None:
+                callbacks.discard(callback)
+                if not callbacks:
+                    del self._subscribers[channel]
+
+    def has_subscribers(self, channel):
+        """
+        Whether publishing to the channel can reach anyone; a shared backend returns True.
+        """
+        return channel in self._subscribers
+
+
+class Broker:
+    """
+    Publishes per-user todo events to the connections subscribed to them.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def wants(self, user_id):
+        """
+        Whether anyone may receive the user's events, so publishers can skip building them.
+        """
+        return self.backend.has_subscribers(channel_for(user_id))
+
+    def publish(self, user_id, event):
+        # Formatted as a Server-Sent Event once here, however many connections receive it
+        data = json.dumps(event, cls=DjangoJSONEncoder)
+        self.backend.publish(channel_for(user_id), f"event: {event['type']}\ndata: {data}\n\n")
+
+    def subscribe(self, user_id, queue_size=None):
+        """
+        Returns a Subscription to the user's events; call it from the event loop that consumes them.
+        """
+        return Subscription(self.backend, channel_for(user_id), queue_size or settings.TODO_EVENTS["QUEUE_SIZE"])
+
+
+class Subscription:
+    """
+    The events of one channel for one connection, in a bounded asyncio queue.
+
+    Events may be published from any thread; they are handed to the consumer's event
+    loop. When the consumer falls QUEUE_SIZE events behind (a slow client), the
+    subscription is marked overflowed instead of buffering more: the consumer should
+    tell its client to resync and end the stream.
+    """
+
+    def __init__(self, backend, channel, queue_size):
+        self.backend = backend
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(queue_size)
+        self.overflowed = False
+        backend.subscribe(channel, self._deliver)
+
+    def _deliver(self, message):
+        # Runs in the publishing thread
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:  # The loop is closed: the connection is gone
+            self.close()
+
+    def _put(self, message):
+        # Runs in the event loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout):
+        """
+        Returns the next message, or None if none arrived within timeout seconds.
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.backend.unsubscribe(self.channel, self._deliver)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """
+    Returns the process-wide broker over the TODO_EVENTS["BACKEND"] backend.
+    """
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = Broker(import_string(settings.TODO_EVENTS["BACKEND"])())
+    return _broker
+
+
+def publish_changed(user_id):
+    """
+    Tells the user's connections that todos changed in bulk (bulk_create/update send no
+    signals), so clients fetch the details from the changes feed.
+    """
+    broker = get_broker()
+    if broker.wants(user_id):
+        broker.publish(user_id, {"type": "changed"})
+
+
+async def event_stream(subscribe, heartbeat):
+    """
+    Yields the Server-Sent Events of a subscription: one event per message, a comment
+    line every `heartbeat` seconds without one (keeps proxies from closing the idle
+    connection and lets the server notice gone clients), and a final "resync" event
+    if the client fell too far behind.
+
+    subscribe() returns the Subscription. It is only called once the stream is consumed,
+    so a client that disconnects before the first event leaves nothing subscribed.
+    """
+    subscription = subscribe()
+    try:
+        yield "retry: 3000\n\n"  # Reconnect delay for EventSource clients
+        while True:
+            message = await subscription.get(heartbeat)
+            if subscription.overflowed:
+                yield 'event: resync\ndata: {"type": "resync"}\n\n'
+                return
+            yield ": heartbeat\n\n" if message is None else message
+    finally:
+        subscription.close()
@@ -0,0 +1,69 @@
+import csv  # Used to write the CSV export
+import json  # Used to write the NDJSON export
+
+from rest_framework import serializers
+
+from .sharding import split_shards
+
+
+# Columns of an exported todo, in the same order and with the same names as TodoSerializer
+EXPORT_FIELDS = ["id", "user", "title", "description", "completed", "created_at", "updated_at"]
+
+# Rows fetched per query while exporting
+EXPORT_CHUNK_SIZE = 2000
+
+_datetime_field = serializers.DateTimeField()  # Formats timestamps exactly like the JSON API does
+
+
+def iter_todo_rows(todos, chunk_size=None):
+    """
+    Yields the todos as dicts keyed by EXPORT_FIELDS, one chunk of rows at a time.
+
+    Each chunk is a separate keyset query (WHERE id > last_id ORDER BY id LIMIT chunk_size)
+    over values_list(), so no model instances are built and at most one chunk is held in
+    memory. A single queryset.iterator() would not bound memory on MySQL, because
+    mysqlclient buffers the whole result set on the client.
+
+    A sharded (admin) export walks the shards one after the other, each in id order.
+    """
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    columns = ["id", "user_id", "title", "description", "completed", "created_at", "updated_at"]
+    for shard_todos in split_shards(todos):  # Ids are only unique within a shard
+        last_id = 0
+        while True:
+            chunk = list(shard_todos.filter(id__gt=last_id).order_by("id").values_list(*columns)[:chunk_size])
+            for row in chunk:
+                todo = dict(zip(EXPORT_FIELDS, row))
+                todo["created_at"] = _datetime_field.to_representation(todo["created_at"])
+                todo["updated_at"] = _datetime_field.to_representation(todo["updated_at"])
+                yield todo
+            if len(chunk) < chunk_size:
+                break
+            last_id = chunk[-1][0]
+
+
+def ndjson_lines(rows):
+    """
+    Yields one JSON document per todo, newline-terminated.
+    """
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+class _Echo:
+    """
+    File-like object whose write() returns the value, so csv.writer can feed a generator.
+    """
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    """
+    Yields the CSV header and then one CSV line per todo.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow([row[field] for field in EXPORT_FIELDS])
@@ -0,0 +1,181 @@
+import csv  # Used to parse CSV uploads row by row
+import io
+import json  # Used to parse NDJSON uploads line by line
+
+from django.db import transaction
+from rest_framework.fields import BooleanField
+
+from todo_backend.routers import mark_written
+
+from .cache import bump_version
+from .events import publish_changed
+from .models import Todo
+from .sharding import shard_for_user
+
+
+# Rows inserted per bulk_create
+IMPORT_BATCH_SIZE = 1000
+
+# Row errors kept in the report; further errors are only counted
+MAX_REPORTED_ERRORS = 100
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+TITLE_MAX_LENGTH = Todo._meta.get_field("title").max_length
+
+
+
+def guess_format(filename):
+    """
+    Returns the import format implied by a file name, or None.
+    """
+    for import_format in IMPORT_FORMATS:
+        if filename and filename.lower().endswith(f".{import_format}"):
+            return import_format
+    return None
+
+
+def iter_records(binary_file, import_format):
+    """
+    Yields (row_number, record) pairs from a binary file object without reading it all.
+
+    CSV files need a header row with at least a "title" column. Records that cannot
+    be parsed are yielded as (row_number, None).
+    """
+    text = io.TextIOWrapper(binary_file, encoding="utf-8", newline="" if import_format == "csv" else None)
+    if import_format == "csv":
+        for row_number, row in enumerate(csv.DictReader(text), start=1):
+            yield row_number, row
+        return
+
+    for row_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield row_number, record if isinstance(record, dict) else None
+
+
+def _to_text(value):
+    """
+    Converts a value the way DRF's CharField does (numbers become strings, whitespace is
+    trimmed); returns None for values it rejects as "Not a valid string.".
+    """
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        return None
+    return str(value).strip()
+
+
+def validate_record(record):
+    """
+    Checks one record against the same rules TodoSerializer applies to the writable fields,
+    without building a serializer: titles and descriptions are trimmed, an empty
+    description stays "", and completed takes the values BooleanField accepts. An empty
+    CSV cell for completed means False, as an empty form field does.
+
+    Returns:
+        tuple: (field values, errors); errors is empty when the record is valid.
+    """
+    if record is None:
+        return None, {"non_field_errors": ["Row could not be parsed."]}
+
+    errors = {}
+    title = record.get("title")
+    if title is not None:
+        title = _to_text(title)
+        if title is None:
+            errors["title"] = ["Not a valid string."]
+    if "title" not in errors:
+        if not title:
+            errors["title"] = ["This field is required."]
+        elif len(title) > TITLE_MAX_LENGTH:
+            errors["title"] = [f"Ensure this field has no more than {TITLE_MAX_LENGTH} characters."]
+
+    description = record.get("description")
+    if description is not None:
+        description = _to_text(description)
+        if description is None:
+            errors["description"] = ["Not a valid string."]
+
+    completed = record.get("completed", False)
+    try:
+        if completed in BooleanField.TRUE_VALUES:
+            completed = True
+        elif completed in BooleanField.FALSE_VALUES or completed == "":
+            completed = False
+    except TypeError:  # Unhashable (a JSON list or object)
+        pass
+    if not isinstance(completed, bool):
+        errors["completed"] = ["Must be a valid boolean."]
+
+    if errors:
+        return None, errors
+    return {"title": title, "description": description, "completed": completed}, {}
+
+
+def import_todos(binary_file, import_format, user_id, batch_size=None, on_batch=None):
+    """
+    Imports todos for one user from a CSV or NDJSON file in fixed-size batches.
+
+    Only one batch of rows and at most MAX_REPORTED_ERRORS errors are held in memory,
+    so the file size does not matter. Each batch is inserted with bulk_create in its own
+    transaction; rows that fail validation are skipped and reported.
+
+    A file that stops being readable partway (not UTF-8, malformed CSV such as a field
+    over csv.field_size_limit()) ends the import: the valid rows read before are still
+    imported, and report["fatal_error"] names the row reached. Decoding runs ahead of
+    parsing, so for an encoding error a few rows before that one may be missing too.
+
+    Args:
+        binary_file: A binary file object (an upload or an open file).
+        import_format (str): "csv" or "ndjson".
+        user_id (int): Owner of the imported todos.
+        batch_size (int): Rows per bulk_create (default IMPORT_BATCH_SIZE).
+        on_batch (callable): Called with the running report after every batch.
+
+    Returns:
+        dict: The import report (processed, imported, failed, batches, errors, and
+        fatal_error when the file could not be read to the end).
+    """
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    report = {"processed": 0, "imported": 0, "failed": 0, "batches": 0, "errors": []}
+    batch = []
+
+    def flush():
+        shard = shard_for_user(user_id)  # All of the user's todos live on one shard
+        with transaction.atomic(using=shard):
+            Todo.objects.using(shard).bulk_create(batch)
+        mark_written()  # using() bypasses the router's write tracking
+        report["imported"] += len(batch)
+        report["batches"] += 1
+        batch.clear()
+        if on_batch is not None:
+            on_batch(report)
+
+    try:
+        try:
+            for row_number, record in iter_records(binary_file, import_format):
+                report["processed"] += 1
+                values, errors = validate_record(record)
+                if errors:
+                    report["failed"] += 1
+                    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                        report["errors"].append({"row": row_number, "errors": errors})
+                    continue
+                batch.append(Todo(user_id=user_id, **values))
+                if len(batch) >= batch_size:
+                    flush()
+        except UnicodeDecodeError:
+            report["fatal_error"] = {"row": report["processed"] + 1, "error": "The file must be UTF-8 encoded."}
+        except csv.Error as e:
+            report["fatal_error"] = {"row": report["processed"] + 1, "error": f"Malformed CSV: {e}."}
+        if batch:
+            flush()
+    finally:
+        # Earlier batches are committed even if the import stopped early
+        if report["imported"]:
+            bump_version(user_id)  # bulk_create sends no post_save
+            publish_changed(user_id)
+    return report
@@ -0,0 +1,94 @@
+import asyncio
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from todo_backend.asgi import application  # The same ASGI callable a server such as uvicorn runs
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks GET /api/todos/ (sync APIView under ASGI) against GET /api/todos/async/ "
+        "(native async view) by calling the ASGI application in-process at a given concurrency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", required=True, help="Username whose todos are listed")
+        parser.add_argument("--requests", type=int, default=2000, help="Requests per endpoint")
+        parser.add_argument("--concurrency", type=int, default=200, help="Requests in flight at once")
+        parser.add_argument("--query", default="cursor=", help="Query string sent with every request")
+        parser.add_argument(
+            "--cached", action="store_true",
+            help="Let the sync view answer from its list cache (by default every request gets a unique query string)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']!r} does not exist.")
+
+        refresh = RefreshToken.for_user(user)
+        refresh["username"] = user.username
+        token = str(refresh.access_token)
+
+        for label, path in (("sync under ASGI", "/api/todos/"), ("native async", "/api/todos/async/")):
+            latencies, elapsed = asyncio.run(self.run(path, options, token))
+            latencies.sort()
+            self.stdout.write(
+                f"{label:16} {len(latencies) / elapsed:8.1f} req/s  "
+                f"p50 {statistics.median(latencies) * 1000:7.2f} ms  "
+                f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:7.2f} ms"
+            )
+
+    async def request(self, path, query, token):
+        """
+        Sends one GET through the ASGI application and returns the response status.
+        """
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": query.encode(), "root_path": "",
+            "headers": [(b"host", b"localhost"), (b"authorization", f"Bearer {token}".encode())],
+            "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+        }
+        body_sent = False
+        response_status = []
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await asyncio.Future()  # The client never disconnects; Django cancels this wait when done
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response_status.append(message["status"])
+
+        await application(scope, receive, send)
+        return response_status[0]
+
+    async def run(self, path, options, token):
+        semaphore = asyncio.Semaphore(options["concurrency"])
+        latencies = []
+
+        counter = iter(range(options["requests"] + 1))
+
+        async def one():
+            query = options["query"] if options["cached"] else f"{options['query']}&_={next(counter)}"
+            async with semaphore:
+                started = time.perf_counter()
+                response_status = await self.request(path, query, token)
+                latencies.append(time.perf_counter() - started)
+                if response_status != 200:
+                    raise CommandError(f"{path} returned {response_status}")
+
+        await one()  # Warm up (URL resolution, first connection)
+        latencies.clear()
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(options["requests"])))
+        return latencies, time.perf_counter() - started
@@ -0,0 +1,46 @@
+import timeit
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from todos.encoders import FastJSONRenderer, render_todo_list
+from todos.models import Todo
+from todos.serializers import TodoSerializer
+
+
+class Command(BaseCommand):
+    help = "Microbenchmark of one todo list page: TodoSerializer + JSONRenderer against the values_list fast path."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100, help="Todos per page")
+        parser.add_argument("--repeat", type=int, default=200, help="Pages encoded per measurement")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        # The rows a values_list(*TODO_LIST_COLUMNS) query returns; no database needed
+        rows = [
+            (i, f"todo number {i}", "some description" if i % 3 else None, i % 2 == 0, now - timedelta(minutes=i), now, 1)
+            for i in range(1, options["rows"] + 1)
+        ]
+        pagination = {"next": None, "previous": None}
+
+        def model_serializer():
+            # Model instances as the ORM would build them, then per-field to_representation()
+            todos = [
+                Todo(id=i, title=t, description=d, completed=c, created_at=ca, updated_at=ua, user_id=u)
+                for i, t, d, c, ca, ua, u in rows
+            ]
+            return JSONRenderer().render({"todos": TodoSerializer(todos, many=True).data, "pagination": pagination})
+
+        def fast_path():
+            return FastJSONRenderer().render(render_todo_list(rows, pagination))
+
+        assert model_serializer() == fast_path(), "fast path output differs from TodoSerializer"
+
+        before = min(timeit.repeat(model_serializer, number=options["repeat"], repeat=3)) / options["repeat"]
+        after = min(timeit.repeat(fast_path, number=options["repeat"], repeat=3)) / options["repeat"]
+        self.stdout.write(f"TodoSerializer: {before * 1000:8.3f} ms/page")
+        self.stdout.write(f"fast path:      {after * 1000:8.3f} ms/page")
+        self.stdout.write(f"speedup:        {before / after:8.1f}x ({options['rows']} rows/page)")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from todos.sync import compact_tombstones
+
+
+class Command(BaseCommand):
+    help = "Deletes todo tombstones older than TODO_SYNC['TOMBSTONE_TTL_DAYS'] on every shard (run it periodically, e.g. from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=None, help="Tombstones deleted per statement")
+
+    def handle(self, *args, **options):
+        deleted = compact_tombstones(options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Compacted {deleted} tombstones."))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import User
+from todos.importer import IMPORT_FORMATS, guess_format, import_todos
+
+
+class Command(BaseCommand):
+    help = "Imports todos for a user from a CSV or NDJSON file in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV (with a header row) or NDJSON file to import")
+        parser.add_argument("--user", required=True, help="Username that will own the imported todos")
+        parser.add_argument("--format", choices=IMPORT_FORMATS, help="File format (default: from the file extension)")
+        parser.add_argument("--batch-size", type=int, default=None, help="Rows per bulk insert")
+
+    def handle(self, *args, **options):
+        import_format = options["format"] or guess_format(options["path"])
+        if import_format is None:
+            raise CommandError("Cannot tell the file format, please pass --format.")
+
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']!r} does not exist.")
+
+        def progress(report):
+            self.stdout.write(f"{report['processed']} rows read, {report['imported']} imported, {report['failed']} failed")
+
+        with open(options["path"], "rb") as binary_file:
+            report = import_todos(binary_file, import_format, user.id, options["batch_size"], on_batch=progress)
+
+        for error in report["errors"]:
+            self.stderr.write(f"row {error['row']}: {error['errors']}")
+        if "fatal_error" in report:
+            fatal = report["fatal_error"]
+            raise CommandError(
+                f"Stopped at row {fatal['row']}: {fatal['error']} {report['imported']} rows were imported before it."
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['imported']} of {report['processed']} rows in {report['batches']} batches."
+        ))
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from todos.rebalance import IdConflict, misplaced_users, move_user_todos
+from todos.sharding import shard_for_user
+
+
+class Command(BaseCommand):
+    help = "Moves todos to the shard their owner maps to on the current ring (run after changing TODO_SHARDS)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="users", help="Id of a user whose todos to move (repeatable)")
+        parser.add_argument("--all", action="store_true", help="Move every user found on another shard than their own")
+        parser.add_argument("--chunk-size", type=int, default=None, help="Todos copied per transaction")
+        parser.add_argument("--dry-run", action="store_true", help="Only report which users would move")
+
+    def handle(self, *args, **options):
+        if not options["users"] and not options["all"]:
+            raise CommandError("Pass --user <id> or --all.")
+
+        total = 0
+        for source in settings.TODO_SHARDS:
+            if options["all"]:
+                user_ids = misplaced_users(source)
+            else:
+                user_ids = [user_id for user_id in options["users"] if shard_for_user(user_id) != source]
+            for user_id in user_ids:
+                target = shard_for_user(user_id)
+                if options["dry_run"]:
+                    self.stdout.write(f"user {user_id}: {source} -> {target}")
+                    continue
+                try:
+                    moved = move_user_todos(user_id, source, target, options["chunk_size"])
+                except IdConflict as e:
+                    raise CommandError(str(e))
+                if moved:
+                    self.stdout.write(f"user {user_id}: moved {moved} todos from {source} to {target}")
+                total += moved
+
+        self.stdout.write(self.style.SUCCESS(f"Moved {total} todos."))
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-18 06:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0002_todo_delete_todoitem'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['user', 'completed', 'created_at'], name='todo_user_completed_created'),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['user', 'updated_at'], name='todo_user_updated'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-18 06:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0005_todotombstone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['user', 'created_at'], name='todo_user_created'),
+        ),
+    ]
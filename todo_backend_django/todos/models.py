@@ -1,11 +1,51 @@
+from django.conf import settings
+from django.utils import timezone
 from django.db import models  # Importing the models module to define database models
 from users.models import User  # Importing the User model to establish a relationship with Todo
+from .sharding import ShardedQuerySet, is_sharded, shard_for_user  # Todos are sharded by user (settings.TODO_SHARDS)
+
+
+class UserShardedQuerySet(models.QuerySet):
+    """
+    Picks the database for queries over rows kept on their owner's shard (todos and
+    their tombstones). With a single shard these add nothing, so reads still go through
+    the routers.
+    """
+
+    def shard(self, user_id):
+        """
+        Runs the query on the shard holding the user's rows (e.g. for bulk_create).
+        """
+        return self.using(shard_for_user(user_id)) if is_sharded() else self.all()
+
+    def for_user(self, user_id):
+        """
+        Returns the user's rows, from their shard.
+        """
+        return self.shard(user_id).filter(user_id=user_id)
+
+    def create(self, **kwargs):
+        # QuerySet.create() saves with using=self.db, which the routers see without the
+        # instance: pick the owner's shard here
+        if self._db is not None or not is_sharded():
+            return super().create(**kwargs)
+        return self.using(shard_for_user(self.model(**kwargs).user_id)).create(**kwargs)
+
+    def all_shards(self):
+        """
+        Returns every row: a scatter-gather ShardedQuerySet when there are several shards.
+        """
+        if not is_sharded():
+            return self.all()
+        return ShardedQuerySet([self.using(alias) for alias in settings.TODO_SHARDS])
+
 
 # Todo model to store task details
 class Todo(models.Model):
     # Foreign key to associate the todo item with a user
     user = models.ForeignKey(
-        User, on_delete=models.CASCADE, related_name="todos"
+        # No database-level constraint: a user's todos may live on another shard than the user
+        User, on_delete=models.CASCADE, related_name="todos", db_constraint=False
     )  
     # Title of the task
     title = models.CharField(max_length=100)  
@@ -16,4 +56,36 @@ class Todo(models.Model):
     # Timestamp when the task was created
     created_at = models.DateTimeField(auto_now_add=True)  
     # Timestamp when the task was last updated
-    updated_at = models.DateTimeField(auto_now=True)  
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = UserShardedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Serves the per-user list with the completed and created_at filters as one range scan
+            models.Index(fields=["user", "completed", "created_at"], name="todo_user_completed_created"),
+            # Serves the per-user created_after/created_before filters without completed
+            models.Index(fields=["user", "created_at"], name="todo_user_created"),
+            # Serves the per-user updated_since filter
+            models.Index(fields=["user", "updated_at"], name="todo_user_updated"),
+        ]
+
+
+# Tombstone left by a deleted todo, so delta sync clients learn about the deletion
+class TodoTombstone(models.Model):
+    # Owner of the deleted todo; kept on the same shard as the user's todos
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+", db_constraint=False)
+    # Id the deleted todo had
+    todo_id = models.BigIntegerField()
+    # When it was deleted; tombstones older than TODO_SYNC["TOMBSTONE_TTL_DAYS"] are compacted
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    objects = UserShardedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Serves the per-user changes feed, which seeks on (deleted_at, id)
+            models.Index(fields=["user", "deleted_at"], name="tombstone_user_deleted"),
+            # Serves the compaction job
+            models.Index(fields=["deleted_at"], name="tombstone_deleted"),
+        ]
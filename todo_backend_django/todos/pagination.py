@@ -0,0 +1,130 @@
+import base64  # Used to make the cursor opaque and URL-safe
+import json  # Used to pack the cursor position into a string
+from datetime import datetime  # Used to parse the timestamp stored inside a cursor
+
+from django.db.models import Q  # Used to build the keyset (seek) predicate
+
+
+# Direction markers stored inside a cursor
+NEXT = "n"
+PREVIOUS = "p"
+
+# Upper bound on the number of items a single cursor page may return
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a client sends a cursor that cannot be decoded.
+    """
+
+
+def encode_cursor(todo, direction):
+    """
+    Builds an opaque cursor pointing at the given todo.
+
+    Args:
+        todo (Todo): The todo the next/previous page should start after/before.
+        direction (str): NEXT or PREVIOUS.
+
+    Returns:
+        str: A URL-safe base64 string.
+    """
+    payload = {"c": todo.created_at.isoformat(), "i": todo.id, "d": direction}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")  # Padding is not needed to decode
+
+
+def decode_cursor(cursor):
+    """
+    Reverses encode_cursor().
+
+    Returns:
+        tuple: (created_at, id, direction)
+
+    Raises:
+        InvalidCursor: If the cursor was tampered with or is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        created_at = datetime.fromisoformat(payload["c"])
+        todo_id = int(payload["i"])
+        direction = payload["d"]
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor("Invalid cursor.")
+    if direction not in (NEXT, PREVIOUS):
+        raise InvalidCursor("Invalid cursor.")
+    return created_at, todo_id, direction
+
+
+def cursor_query(todos, cursor, page_size=10):
+    """
+    Builds the seek query for one cursor page (one row more than the page, to detect
+    whether another page follows).
+
+    Returns:
+        tuple: (queryset, state) where state is passed on to cursor_page() with the rows.
+    """
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))  # Keep page size within sane bounds
+
+    if not cursor:
+        # First page: no seek predicate, nothing before it
+        return todos.order_by("created_at", "id")[:page_size + 1], (NEXT, page_size, False)
+
+    created_at, todo_id, direction = decode_cursor(cursor)
+    if direction == NEXT:
+        # Everything strictly after the cursor position
+        todos = todos.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=todo_id))
+        return todos.order_by("created_at", "id")[:page_size + 1], (NEXT, page_size, True)
+    # Everything strictly before the cursor position, walked backwards then flipped
+    todos = todos.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=todo_id))
+    return todos.order_by("-created_at", "-id")[:page_size + 1], (PREVIOUS, page_size, True)
+
+
+def cursor_page(rows, state):
+    """
+    Turns the rows fetched by a cursor_query() queryset into the page and its cursors.
+    """
+    direction, page_size, came_from_cursor = state
+    has_more = len(rows) > page_size
+    if direction == NEXT:
+        items = rows[:page_size]
+        has_next, has_previous = has_more, came_from_cursor
+    else:
+        items = rows[:page_size][::-1]
+        has_next, has_previous = True, has_more
+
+    return {
+        "items": items,  # Items in the current page
+        "next": encode_cursor(items[-1], NEXT) if items and has_next else None,  # Cursor for the next page
+        "previous": encode_cursor(items[0], PREVIOUS) if items and has_previous else None,  # Cursor for the previous page
+    }
+
+
+def cursor_paginate(todos, cursor, page_size=10):
+    """
+    To get todo with a cursor===>http://127.0.0.1:8000/api/todos?cursor=&page_size=10
+    (pass the returned "next"/"previous" value as the cursor to move between pages)
+
+    Paginates the todos queryset by seeking on (created_at, id) instead of using
+    COUNT(*) + OFFSET, so every page costs the same no matter how deep the client goes.
+
+    Args:
+        todos (QuerySet): The (already filtered) queryset of todos to paginate.
+        cursor (str): The opaque cursor from a previous response, or "" for the first page.
+        page_size (int): The number of items per page (default is 10).
+
+    Returns:
+        dict: Paginated data with items and the next/previous cursors.
+    """
+    queryset, state = cursor_query(todos, cursor, page_size)
+    return cursor_page(list(queryset), state)
+
+
+async def acursor_paginate(todos, cursor, page_size=10):
+    """
+    Async version of cursor_paginate() for the async views.
+    """
+    queryset, state = cursor_query(todos, cursor, page_size)
+    return cursor_page([todo async for todo in queryset], state)
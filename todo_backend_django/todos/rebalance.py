@@ -0,0 +1,93 @@
+from django.db import IntegrityError, transaction
+
+from .cache import bump_version
+from .events import publish_changed
+from .models import Todo, TodoTombstone
+from .sharding import shard_for_user
+from .signals import moving_todos
+
+
+# Todos copied per transaction while moving a user
+MOVE_CHUNK_SIZE = 1000
+
+
+class IdConflict(Exception):
+    """
+    Raised when a moved todo's id is already used by another todo on the target shard.
+    """
+
+
+def misplaced_users(source):
+    """
+    Returns the ids of the users with todos on `source` whose shard is now another one.
+    """
+    user_ids = Todo.objects.using(source).order_by().values_list("user_id", flat=True).distinct()
+    return [user_id for user_id in user_ids if shard_for_user(user_id) != source]
+
+
+def move_user_todos(user_id, source, target=None, chunk_size=None):
+    """
+    Moves one user's todos from the `source` shard to `target` (default: the user's shard).
+
+    Todos keep their ids and timestamps. Each chunk is copied in one transaction on the
+    target and then deleted from the source; a copy that was interrupted between the two
+    can simply be run again, since rows already on the target are not copied twice.
+    The user's tombstones follow, so delta sync clients still learn about earlier deletions.
+    The copies are deleted from the source inside moving_todos(), which silences the
+    post_delete handlers: the todos still exist, so their owner's streams must not get a
+    "deleted" per todo; they get one "changed" event for the whole move instead.
+
+    Returns:
+        int: The number of todos moved.
+
+    Raises:
+        IdConflict: If an id is taken on the target (ids are unique per shard only).
+    """
+    target = target or shard_for_user(user_id)
+    chunk_size = chunk_size or MOVE_CHUNK_SIZE
+    if target == source:
+        return 0
+
+    moved = 0
+    while True:
+        todos = list(Todo.objects.using(source).filter(user_id=user_id).order_by("id")[:chunk_size])
+        if not todos:
+            break
+        ids = [todo.id for todo in todos]
+        copied = set(Todo.objects.using(target).filter(user_id=user_id, id__in=ids).values_list("id", flat=True))
+        copies = [todo for todo in todos if todo.id not in copied]
+        timestamps = [(todo.created_at, todo.updated_at) for todo in copies]
+        try:
+            with transaction.atomic(using=target):
+                Todo.objects.using(target).bulk_create(copies)  # Sets created_at/updated_at to now
+                for todo, (created_at, updated_at) in zip(copies, timestamps):
+                    todo.created_at, todo.updated_at = created_at, updated_at
+                Todo.objects.using(target).bulk_update(copies, ["created_at", "updated_at"])
+        except IntegrityError as e:
+            raise IdConflict(f"Cannot move the todos of user {user_id} to {target}: {e}") from e
+        with moving_todos():
+            Todo.objects.using(source).filter(user_id=user_id, id__in=ids).delete()
+        moved += len(todos)
+
+    move_tombstones(user_id, source, target)
+    if moved:
+        bump_version(user_id)  # bulk_create sends no post_save
+        publish_changed(user_id)
+    return moved
+
+
+def move_tombstones(user_id, source, target):
+    """
+    Moves one user's tombstones (at most TOMBSTONE_TTL_DAYS of deletions) in one transaction.
+
+    They get new ids on the target; a client may then receive a deletion twice, which is harmless.
+    """
+    tombstones = list(TodoTombstone.objects.using(source).filter(user_id=user_id).order_by("id"))
+    if not tombstones:
+        return
+    with transaction.atomic(using=target):
+        TodoTombstone.objects.using(target).bulk_create([
+            TodoTombstone(user_id=user_id, todo_id=tombstone.todo_id, deleted_at=tombstone.deleted_at)
+            for tombstone in tombstones
+        ])
+    TodoTombstone.objects.using(source).filter(user_id=user_id, id__lte=tombstones[-1].id).delete()
@@ -10,3 +10,15 @@ class TodoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Todo  # Specify the model the serializer is based on
         fields = '__all__'  # Include all fields of the model in the API response
+
+
+# Serializer for the items of a batch request
+class TodoBatchItemSerializer(serializers.ModelSerializer):
+    """
+    Validates the editable fields of one batch item. The owner is always the authenticated
+    user, so the user field is left out and no per-item User lookup is needed.
+    """
+
+    class Meta:
+        model = Todo  # Specify the model the serializer is based on
+        fields = ['title', 'description', 'completed']  # Only the fields a client may set
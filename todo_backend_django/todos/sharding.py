@@ -0,0 +1,181 @@
+import bisect
+import hashlib
+import heapq
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent-hash ring over the shard aliases.
+
+    Every shard owns `vnodes` points on the ring and a user belongs to the first point
+    at or after the hash of their id. Adding a shard only takes over the users whose
+    points it lands between, about 1/n of them, instead of reshuffling everyone.
+    """
+
+    def __init__(self, shards, vnodes):
+        self.shards = tuple(shards)
+        points = sorted((_hash(f"{shard}#{i}"), shard) for shard in self.shards for i in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def shard_for(self, key):
+        index = bisect.bisect(self._hashes, _hash(str(key))) % len(self._hashes)
+        return self._owners[index]
+
+
+_ring = None
+
+
+def get_ring():
+    """
+    Returns the ring for settings.TODO_SHARDS (rebuilt when the setting changes).
+    """
+    global _ring
+    shards = tuple(settings.TODO_SHARDS)
+    if _ring is None or _ring.shards != shards:
+        _ring = HashRing(shards, settings.TODO_SHARD_VNODES)
+    return _ring
+
+
+def is_sharded():
+    return len(settings.TODO_SHARDS) > 1
+
+
+def shard_for_user(user_id):
+    """
+    Returns the database alias holding the user's todos.
+    """
+    if not is_sharded():
+        return settings.TODO_SHARDS[0]
+    return get_ring().shard_for(user_id)
+
+
+def split_shards(todos):
+    """
+    Returns the per-shard querysets behind a ShardedQuerySet, or [todos] for a plain queryset.
+    """
+    return todos.querysets if isinstance(todos, ShardedQuerySet) else [todos]
+
+
+class ShardedQuerySet:
+    """
+    Scatter-gather over the same query on every shard, for listings across all users.
+
+    filter(), order_by(), values_list() and friends are applied to every shard's queryset.
+    Reading runs the query on each shard and merges the (already sorted) results by the
+    ordering fields, so a slice [start:stop] fetches at most `stop` rows per shard.
+    count(), update() and delete() add up the per-shard results. Rows are merged as model
+    instances, dicts or named values_list() rows; without an order_by() they merge by id.
+    """
+
+    def __init__(self, querysets, window=None):
+        self.querysets = querysets
+        self.window = window  # (start, stop) of a slice, applied after merging
+
+    @property
+    def model(self):
+        return self.querysets[0].model
+
+    @property
+    def ordered(self):
+        return all(queryset.ordered for queryset in self.querysets)
+
+    def _chain(self, method, *args, **kwargs):
+        if self.window is not None:
+            raise TypeError("Cannot filter a sharded query once a slice has been taken.")
+        return ShardedQuerySet([getattr(queryset, method)(*args, **kwargs) for queryset in self.querysets])
+
+    def all(self):
+        return self._chain("all")
+
+    def filter(self, *args, **kwargs):
+        return self._chain("filter", *args, **kwargs)
+
+    def exclude(self, *args, **kwargs):
+        return self._chain("exclude", *args, **kwargs)
+
+    def order_by(self, *fields):
+        return self._chain("order_by", *fields)
+
+    def values(self, *fields, **expressions):
+        return self._chain("values", *fields, **expressions)
+
+    def values_list(self, *fields, **kwargs):
+        return self._chain("values_list", *fields, **kwargs)
+
+    def __getitem__(self, index):
+        if isinstance(index, int):
+            return list(self[index:index + 1])[0]
+        if index.step is not None or (index.start or 0) < 0 or (index.stop is not None and index.stop < 0):
+            raise ValueError("Sharded queries only support forward slices.")
+        start = index.start or 0
+        querysets = self._ordered_querysets()
+        if index.stop is not None:
+            querysets = [queryset[:index.stop] for queryset in querysets]  # No shard can contribute more
+        return ShardedQuerySet(querysets, (start, index.stop))
+
+    def _ordered_querysets(self):
+        if all(queryset.query.order_by for queryset in self.querysets):
+            return self.querysets
+        return [queryset.order_by("id") for queryset in self.querysets]
+
+    def _sort_key(self):
+        fields = list(self._ordered_querysets()[0].query.order_by)
+        descending = {field.startswith("-") for field in fields}
+        if len(descending) > 1:
+            raise ValueError("Sharded queries need every order_by() field in the same direction.")
+        names = [field.lstrip("-") for field in fields]
+
+        def key(row):
+            if isinstance(row, dict):
+                return tuple(row[name] for name in names)
+            return tuple(getattr(row, name) for name in names)
+
+        return key, descending == {True}
+
+    def _fetch(self, rows_per_shard):
+        key, reverse = self._sort_key()
+        rows = heapq.merge(*rows_per_shard, key=key, reverse=reverse)
+        if self.window is not None:
+            rows = islice(rows, *self.window)
+        return list(rows)
+
+    def __iter__(self):
+        return iter(self._fetch(list(queryset) for queryset in self._ordered_querysets()))
+
+    async def __aiter__(self):
+        rows = await sync_to_async(list)(self)  # The shards are queried one after the other
+        for row in rows:
+            yield row
+
+    def count(self):
+        if self.window is not None:
+            return len(list(self))
+        return sum(queryset.count() for queryset in self.querysets)
+
+    async def acount(self):
+        return await sync_to_async(self.count)()
+
+    def exists(self):
+        return any(queryset.exists() for queryset in self.querysets)
+
+    def update(self, **kwargs):
+        return sum(queryset.update(**kwargs) for queryset in self.querysets)
+
+    def delete(self):
+        deleted, per_model = 0, {}
+        for queryset in self.querysets:
+            count, counts = queryset.delete()
+            deleted += count
+            for label, value in counts.items():
+                per_model[label] = per_model.get(label, 0) + value
+        return deleted, per_model
+
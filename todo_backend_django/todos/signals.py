@@ -0,0 +1,83 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.models import User
+
+from .cache import bump_version
+from .events import get_broker
+from .models import Todo, TodoTombstone
+from .serializers import TodoSerializer
+from .sharding import is_sharded, shard_for_user
+
+
+# True inside moving_todos(): the todos deleted there still exist on another shard
+moving = ContextVar("todos_moving", default=False)
+
+
+@contextmanager
+def moving_todos():
+    """
+    Turns the post_delete handlers below into no-ops for the block, for deletions that
+    remove a copy rather than a todo (see todos.rebalance); the caller invalidates the
+    cache and notifies the owner once for the whole move.
+    """
+    token = moving.set(True)
+    try:
+        yield
+    finally:
+        moving.reset(token)
+
+
+@receiver(post_save, sender=Todo)
+@receiver(post_delete, sender=Todo)
+def invalidate_todo_list_cache(sender, instance, using, **kwargs):
+    """
+    Bumps the owner's list cache version right away and again once the change is committed,
+    so a reader cannot re-cache the old rows between the first bump and the commit.
+    """
+    if moving.get():
+        return
+    bump_version(instance.user_id)
+    transaction.on_commit(lambda: bump_version(instance.user_id), using=using)  # The database that was written
+
+
+@receiver(post_save, sender=Todo)
+def publish_todo_saved(sender, instance, created, using, **kwargs):
+    """
+    Pushes a "created" or "updated" event to the owner's open event streams once committed.
+    """
+    broker = get_broker()
+    if broker.wants(instance.user_id):  # Nobody listening: skip serializing
+        event = {"type": "created" if created else "updated", "todo": TodoSerializer(instance).data}
+        transaction.on_commit(lambda: broker.publish(instance.user_id, event), using=using)
+
+
+@receiver(post_delete, sender=Todo)
+def publish_todo_deleted(sender, instance, using, **kwargs):
+    """
+    Pushes a "deleted" event to the owner's open event streams once committed.
+    """
+    if moving.get():
+        return
+    broker = get_broker()
+    if broker.wants(instance.user_id):
+        event = {"type": "deleted", "id": instance.id}  # Read now: Django clears the pk after the signal
+        transaction.on_commit(lambda: broker.publish(instance.user_id, event), using=using)
+
+
+@receiver(pre_delete, sender=User)
+def delete_sharded_todos(sender, instance, using, **kwargs):
+    """
+    Deletes the user's todos and tombstones when they live on another shard than the user,
+    where the ON DELETE CASCADE that Django emulates (on the user's database) cannot reach them.
+    """
+    if not is_sharded():
+        return
+    shard = shard_for_user(instance.pk)
+    if shard != using:
+        Todo.objects.using(shard).filter(user_id=instance.pk).delete()
+        TodoTombstone.objects.using(shard).filter(user_id=instance.pk).delete()
@@ -0,0 +1,158 @@
+import base64  # Used to make the cursor opaque and URL-safe
+import json  # Used to pack the cursor positions into a string
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Todo, TodoTombstone
+from .pagination import InvalidCursor
+from .sharding import shard_for_user
+
+
+# Position before every row, for a first sync
+START = (datetime(1970, 1, 1, tzinfo=dt_timezone.utc), 0)
+
+# Tombstones deleted per statement while compacting
+COMPACT_CHUNK_SIZE = 1000
+
+
+class CursorExpired(Exception):
+    """
+    Raised for a cursor older than the tombstone horizon: deletions since then may have
+    been compacted away, so the client has to sync again from scratch.
+    """
+
+
+def encode_sync_cursor(todo_position, tombstone_position):
+    """
+    Packs the (timestamp, id) positions reached in the todos and in the tombstones.
+    """
+    payload = {
+        "t": [todo_position[0].isoformat(), todo_position[1]],
+        "d": [tombstone_position[0].isoformat(), tombstone_position[1]],
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_sync_cursor(cursor):
+    """
+    Reverses encode_sync_cursor().
+
+    Raises:
+        InvalidCursor: If the cursor was tampered with or is malformed.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        positions = tuple((datetime.fromisoformat(payload[key][0]), int(payload[key][1])) for key in ("t", "d"))
+    except (ValueError, TypeError, KeyError, IndexError):
+        raise InvalidCursor("Invalid cursor.")
+    if any(timezone.is_naive(moment) for moment, _ in positions):
+        raise InvalidCursor("Invalid cursor.")
+    return positions
+
+
+def seek(field, position):
+    # Rows strictly after the (timestamp, id) position
+    moment, row_id = position
+    return Q(**{f"{field}__gt": moment}) | Q(**{field: moment, "id__gt": row_id})
+
+
+def changes_since(user_id, cursor, limit):
+    """
+    Returns the user's todos created or updated, and the ids of those deleted, after the cursor.
+
+    Both feeds are keyset scans on the (user, updated_at) and (user, deleted_at) indexes,
+    so a call costs O(changes), whatever the size of the list. Rows newer than
+    TODO_SYNC["SETTLE_SECONDS"] are left for the next call: their transactions may still be
+    committing rows with earlier timestamps, which a cursor past them would skip.
+
+    Returns:
+        dict: todos (Todo list), deleted (todo ids), cursor (for the next call), has_more.
+
+    Raises:
+        InvalidCursor: If the cursor is malformed.
+        CursorExpired: If the cursor is older than the tombstone horizon.
+    """
+    config = settings.TODO_SYNC
+    now = timezone.now()
+    settled = now - timedelta(seconds=config["SETTLE_SECONDS"])
+    if cursor:
+        todo_position, tombstone_position = decode_sync_cursor(cursor)
+        if tombstone_position[0] < now - timedelta(days=config["TOMBSTONE_TTL_DAYS"]):
+            raise CursorExpired("The cursor is too old, sync again without one.")
+    else:
+        # A first sync downloads every todo; only deletions after it matter
+        todo_position, tombstone_position = START, (settled, 0)
+
+    todos = list(
+        Todo.objects.for_user(user_id).filter(seek("updated_at", todo_position), updated_at__lte=settled)
+        .order_by("updated_at", "id")[:limit + 1]
+    )
+    tombstones = list(
+        TodoTombstone.objects.for_user(user_id).filter(seek("deleted_at", tombstone_position), deleted_at__lte=settled)
+        .order_by("deleted_at", "id").values_list("deleted_at", "id", "todo_id")[:limit + 1]
+    )
+    has_more = len(todos) > limit or len(tombstones) > limit
+    todos, tombstones = todos[:limit], tombstones[:limit]
+
+    # Move on to the last row returned, or to the settled time once a feed is exhausted, so
+    # the next scans start from there and the cursor of an idle client does not expire
+    if len(todos) == limit:
+        todo_position = (todos[-1].updated_at, todos[-1].id)
+    else:
+        todo_position = max(todo_position, (settled, 0))
+    if len(tombstones) == limit:
+        tombstone_position = tombstones[-1][:2]
+    else:
+        tombstone_position = max(tombstone_position, (settled, 0))
+
+    return {
+        "todos": todos,
+        "deleted": [todo_id for _, _, todo_id in tombstones],
+        "cursor": encode_sync_cursor(todo_position, tombstone_position),
+        "has_more": has_more,
+    }
+
+
+def record_tombstones(user_id, todo_ids):
+    """
+    Leaves a tombstone for each deleted todo; call it in the transaction that deletes them.
+    """
+    TodoTombstone.objects.shard(user_id).bulk_create(
+        [TodoTombstone(user_id=user_id, todo_id=todo_id) for todo_id in todo_ids], batch_size=COMPACT_CHUNK_SIZE
+    )
+
+
+def delete_todo(todo):
+    """
+    Deletes one todo and records its tombstone.
+    """
+    todo_id, user_id = todo.id, todo.user_id
+    with transaction.atomic(using=shard_for_user(user_id)):
+        todo.delete()
+        record_tombstones(user_id, [todo_id])
+
+
+def compact_tombstones(chunk_size=None):
+    """
+    Deletes the tombstones older than TODO_SYNC["TOMBSTONE_TTL_DAYS"] on every shard,
+    chunk_size rows per statement so no long lock is held.
+
+    Returns:
+        int: The number of tombstones deleted.
+    """
+    chunk_size = chunk_size or COMPACT_CHUNK_SIZE
+    horizon = timezone.now() - timedelta(days=settings.TODO_SYNC["TOMBSTONE_TTL_DAYS"])
+    deleted = 0
+    for alias in settings.TODO_SHARDS:
+        tombstones = TodoTombstone.objects.using(alias)
+        while True:
+            ids = list(tombstones.filter(deleted_at__lt=horizon).order_by("deleted_at").values_list("id", flat=True)[:chunk_size])
+            if not ids:
+                break
+            deleted += tombstones.filter(id__in=ids).delete()[0]
+    return deleted
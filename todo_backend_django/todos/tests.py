@@ -1,3 +1,1142 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import SyncToAsync, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.http import HttpResponse, QueryDict
+from django.db import connections, transaction
+from django.db.backends.sqlite3 import base as sqlite3_base
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import urlencode
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from middleware.metrics import registry
+from middleware.middleware import ReplicaStickinessMiddleware
+from middleware.profiling import make_profile_header
+from middleware.queries import RepeatedQueryError, RepeatedQueryMiddleware, RepeatedQueryTestMixin, normalize_sql
+from middleware.structured_logging import QueueingHandler, SamplingFilter
+from todo_backend.db.pool import POOL_DEFAULTS, ConnectionPool, PooledDatabaseWrapperMixin, PoolTimeout, pools
+from todo_backend.routers import routing_scope, set_current_user
+from users.hashing import PasswordHashingPool
+from users.models import User, UserSettings
+from . import export
+from .events import Broker, LocalBackend, event_stream, get_broker
+from .cache import cached_list_response
+from .encoders import TODO_LIST_COLUMNS, FastJSONRenderer, render_todo_list
+from .models import Todo, TodoTombstone
+from .rebalance import move_user_todos
+from .serializers import TodoSerializer
+from .sharding import HashRing, shard_for_user
+from .sync import encode_sync_cursor
+from .views import TodoListView
+
+
+def make_user(username, role="user"):
+    """Creates a user with its settings row, like RegisterView does."""
+    user = User.objects.create_user(username=username, email=f"{username}@example.com", password="pass12345")
+    UserSettings.objects.create(user=user, role=role)
+    return user
+
+
+def auth_client(user, role="user"):
+    """Returns an APIClient carrying an access token with the role claim embedded."""
+    refresh = RefreshToken.for_user(user)
+    refresh["role"] = role
+    refresh["username"] = user.username
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+    return client
+
+
+class TodoTestCase(TestCase):
+    def setUp(self):
+        cache.clear()  # Cached list responses must not leak between tests (user ids get reused)
+
+
+class CursorPaginationTests(TodoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user("alice")
+        self.client = auth_client(self.user)
+        self.todos = [Todo.objects.create(user=self.user, title=f"todo {i}") for i in range(25)]
+
+    def test_walks_forward_and_backward_without_gaps(self):
+        seen = []
+        cursor = ""
+        while cursor is not None:
+            response = self.client.get("/api/todos/", {"cursor": cursor, "page_size": 10})
+            self.assertEqual(response.status_code, 200)
+            seen.extend(todo["id"] for todo in response.json()["todos"])
+            last_page = response.json()
+            cursor = response.json()["pagination"]["next"]
+        self.assertEqual(seen, [todo.id for todo in self.todos])
+        self.assertNotIn("total_pages", last_page["pagination"])
+
+        response = self.client.get("/api/todos/", {"cursor": last_page["pagination"]["previous"], "page_size": 10})
+        self.assertEqual([todo["id"] for todo in response.json()["todos"]], seen[10:20])
+        self.assertIsNotNone(response.json()["pagination"]["next"])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get("/api/todos/", {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_page_number_mode_is_still_the_default(self):
+        response = self.client.get("/api/todos/", {"page": 2})
+        self.assertEqual(response.json()["pagination"]["total_pages"], 3)
+        self.assertEqual(response.json()["pagination"]["current_page"], 2)
+
+
+class IndexedFilterTests(TodoTestCase):
+    """
+    Every supported filter combination on the per-user list must be served by an index range scan.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = make_user("bob")
+        for i in range(50):
+            Todo.objects.create(user=self.user, title=f"todo {i}", completed=i % 2 == 0)
+
+    def plan_for(self, query_string):
+        queryset = TodoListView().filter_todos(Todo.objects.filter(user=self.user), QueryDict(query_string))
+        return queryset.order_by("created_at", "id").explain()
+
+    def assertUsesIndex(self, plan, index_names):
+        self.assertTrue(any(name in plan for name in index_names), plan)
+
+    def test_completed_and_created_filters_use_composite_index(self):
+        for query_string in (
+            "completed=True",
+            "completed=True&created_at=2024-01-01",
+            "completed=False&created_after=2024-01-01&created_before=2024-02-01",
+        ):
+            with self.subTest(query_string=query_string):
+                self.assertUsesIndex(self.plan_for(query_string), ["todo_user_completed_created"])
+
+    def assertRangeScan(self, plan, index_name, column):
+        # SQLite: "SEARCH ... USING INDEX name (user_id=? AND column>?)"; MySQL: access type "range" on the key
+        if connections["default"].vendor == "sqlite":
+            self.assertRegex(plan, rf"USING INDEX {index_name} \(user_id=\? AND {column}[<>]")
+        else:
+            self.assertRegex(plan, rf"\brange\b.*\b{index_name}\b")
+
+    def test_created_range_without_completed_uses_user_created_index(self):
+        for query_string in ("created_after=2024-01-01&created_before=2024-02-01", "created_before=2024-02-01"):
+            with self.subTest(query_string=query_string):
+                self.assertRangeScan(self.plan_for(query_string), "todo_user_created", "created_at")
+
+    def test_updated_since_uses_updated_index(self):
+        self.assertUsesIndex(self.plan_for("updated_since=2024-01-01T10:00:00"), ["todo_user_updated"])
+
+    def test_created_at_compiles_to_half_open_range(self):
+        queryset = TodoListView().filter_todos(Todo.objects.all(), QueryDict("created_at=2024-01-01"))
+        sql = str(queryset.query)
+        self.assertIn('"created_at" >=', sql.replace("`", '"'))
+        self.assertIn('"created_at" <', sql.replace("`", '"'))
+        self.assertNotIn("django_datetime_cast_date", sql)
+
+    def test_range_filters_are_half_open(self):
+        today = timezone.now()
+        response = auth_client(self.user).get("/api/todos/", {
+            "created_after": today.date().isoformat(),
+            "created_before": today.date().isoformat(),
+        })
+        self.assertEqual(response.json()["todos"], [])
+
+    def test_invalid_range_value_is_rejected(self):
+        response = auth_client(self.user).get("/api/todos/", {"updated_since": "yesterday"})
+        self.assertEqual(response.status_code, 400)
+
+
+class RoleClaimTests(TodoTestCase):
+    def test_admin_role_from_token_lists_every_todo(self):
+        admin, owner = make_user("admin", role="admin"), make_user("dave")
+        Todo.objects.create(user=owner, title="not mine")
+
+        response = auth_client(admin, role="admin").get("/api/todos/")
+        self.assertEqual(len(response.json()["todos"]), 1)
+
+        response = auth_client(admin, role="user").get("/api/todos/")
+        self.assertEqual(len(response.json()["todos"]), 0)
+
+
+class StatelessUserTests(TodoTestCase):
+    def test_list_runs_a_single_query(self):
+        user = make_user("erin")
+        Todo.objects.create(user=user, title="one")
+        client = auth_client(user)
+        client.get("/api/todos/", {"cursor": "", "page_size": 1})  # Warm up the token revocation filter
+
+        with self.assertNumQueries(1):  # No users.User lookup, no COUNT(*)
+            response = client.get("/api/todos/", {"cursor": ""})
+        self.assertEqual(len(response.json()["todos"]), 1)
+
+    def test_create_and_update_use_the_token_user_id(self):
+        user = make_user("frank")
+        client = auth_client(user)
+
+        response = client.post("/api/todos/", {"title": "write tests"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["user"], user.id)
+
+        todo_id = response.data["id"]
+        response = client.put(f"/api/todos/{todo_id}/", {"title": "done", "user": user.id, "completed": True}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Todo.objects.get(id=todo_id).completed)
+
+
+class BatchTests(TodoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user("hank")
+        self.client = auth_client(self.user)
+        self.existing = [Todo.objects.create(user=self.user, title=f"todo {i}") for i in range(3)]
+
+    def test_batch_applies_everything_in_one_transaction(self):
+        response = self.client.post("/api/todos/batch/", {
+            "create": [{"title": "new 1"}, {"title": "new 2", "completed": True}],
+            "update": [{"id": self.existing[0].id, "completed": True}],
+            "delete": [self.existing[1].id],
+        }, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["status"] for r in response.data["results"]["create"]], [201, 201])
+        self.assertEqual(response.data["results"]["update"][0]["todo"]["completed"], True)
+        self.assertEqual(Todo.objects.filter(user=self.user).count(), 4)
+        self.assertTrue(Todo.objects.get(id=self.existing[0].id).completed)
+        self.assertFalse(Todo.objects.filter(id=self.existing[1].id).exists())
+
+    def test_any_failed_item_rolls_back_the_whole_batch(self):
+        other = Todo.objects.create(user=make_user("ivy"), title="not yours")
+        response = self.client.post("/api/todos/batch/", {
+            "create": [{"title": "ok"}, {"title": ""}],
+            "delete": [self.existing[0].id, other.id],
+        }, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["results"]["create"][1]["status"], 400)
+        self.assertEqual(response.data["results"]["delete"][1], {"id": other.id, "status": 404})
+        self.assertEqual(Todo.objects.filter(user=self.user).count(), 3)
+        self.assertTrue(Todo.objects.filter(id=other.id).exists())
+
+    def test_batch_and_import_writes_pin_the_client_to_the_primary(self):
+        # Both write with Todo.objects.using(shard), which the replica router never sees
+        response = self.client.post("/api/todos/batch/", {"create": [{"title": "new"}]}, format="json")
+        self.assertIn(ReplicaStickinessMiddleware.cookie_name, response.cookies)
+
+        upload = SimpleUploadedFile("todos.csv", b"title\nimported\n")
+        response = self.client.post("/api/todos/import/", {"file": upload}, format="multipart")
+        self.assertIn(ReplicaStickinessMiddleware.cookie_name, response.cookies)
+
+    def test_malformed_ids_are_rejected_per_item(self):
+        todo = self.existing[0]
+        response = self.client.post("/api/todos/batch/", {
+            "update": [{"id": [todo.id], "completed": True}, {"id": True, "completed": True}],
+            "delete": [[todo.id], {}, True, todo.id],
+        }, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        results = response.data["results"]
+        self.assertEqual([r["status"] for r in results["update"]], [400, 400])
+        self.assertEqual([r["status"] for r in results["delete"]], [400, 400, 400, 204])
+        self.assertIn("id", results["delete"][0]["errors"])
+        self.assertTrue(Todo.objects.filter(id=todo.id, completed=False).exists())
+
+    def test_filter_update_runs_as_a_single_statement(self):
+        Todo.objects.filter(id=self.existing[0].id).update(created_at=timezone.now() - timedelta(days=10))
+        cutoff = (timezone.now() - timedelta(days=1)).isoformat()
+
+        with self.assertNumQueries(1):
+            response = self.client.post("/api/todos/batch/filter/", {
+                "filters": {"created_before": cutoff}, "update": {"completed": True},
+            }, format="json")
+
+        self.assertEqual(response.data, {"updated": 1})
+        self.assertEqual(list(Todo.objects.filter(completed=True)), [self.existing[0]])
+
+
+class ListCacheTests(TodoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user("jack")
+        self.client = auth_client(self.user)
+        self.todo = Todo.objects.create(user=self.user, title="cached")
+
+    def test_matching_etag_gets_304_without_touching_the_database(self):
+        response = self.client.get("/api/todos/", {"cursor": ""})
+        etag = response["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/todos/", {"cursor": ""}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_writes_invalidate_the_users_cached_lists(self):
+        etag = self.client.get("/api/todos/")["ETag"]
+
+        self.client.put(f"/api/todos/{self.todo.id}/", {"title": "changed", "user": self.user.id}, format="json")
+        response = self.client.get("/api/todos/", HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()["todos"][0]["title"], "changed")
+
+    def test_bulk_updates_invalidate_too(self):
+        etag = self.client.get("/api/todos/")["ETag"]
+        self.client.post("/api/todos/batch/filter/", {"filters": {}, "update": {"completed": True}}, format="json")
+        self.assertEqual(self.client.get("/api/todos/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_query_parameters_are_part_of_the_key(self):
+        all_todos = self.client.get("/api/todos/")
+        completed = self.client.get("/api/todos/", {"completed": "true"})
+        self.assertNotEqual(all_todos["ETag"], completed["ETag"])
+        self.assertEqual(completed.json()["todos"], [])
+
+    def test_other_users_writes_do_not_invalidate(self):
+        etag = self.client.get("/api/todos/")["ETag"]
+        Todo.objects.create(user=make_user("kate"), title="someone else")
+        self.assertEqual(self.client.get("/api/todos/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class ExportTests(TodoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user("liam")
+        self.todos = [Todo.objects.create(user=self.user, title=f"todo {i}", completed=i == 0) for i in range(5)]
+        Todo.objects.create(user=make_user("mia"), title="not exported")
+
+    def read(self, response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson_rows_match_the_list_serializer_in_bounded_chunks(self):
+        with mock.patch("todos.export.EXPORT_CHUNK_SIZE", 2):
+            response = auth_client(self.user).get("/api/todos/export/", {"format": "ndjson"})
+            with self.assertNumQueries(3):  # Chunks of 2, 2 and 1 rows
+                lines = self.read(response).splitlines()
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual([json.loads(line) for line in lines], TodoSerializer(self.todos, many=True).data)
+
+    def test_csv_honours_filters(self):
+        response = auth_client(self.user).get("/api/todos/export/", {"format": "csv", "completed": "true"})
+        rows = list(csv.reader(io.StringIO(self.read(response))))
+        self.assertEqual(rows[0], export.EXPORT_FIELDS)
+        self.assertEqual([row[2] for row in rows[1:]], ["todo 0"])
+
+    def test_admin_exports_everything(self):
+        response = auth_client(self.user, role="admin").get("/api/todos/export/")
+        self.assertEqual(len(self.read(response).splitlines()), 6)
+
+    def test_unknown_format_is_rejected(self):
+        self.assertEqual(auth_client(self.user).get("/api/todos/export/", {"format": "xml"}).status_code, 400)
+
+
+class ImportTests(TodoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user("noah")
+
+    def upload(self, name, content, **params):
+        upload = SimpleUploadedFile(name, content.encode())
+        return auth_client(self.user).post(f"/api/todos/import/?{urlencode(params)}", {"file": upload}, format="multipart")
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=10)  # Spool the upload to a temporary file like a large one
+    def test_csv_import_inserts_valid_rows_in_batches_and_reports_errors(self):
+        content = "title,description,completed\n" + "".join(f"task {i},,{i % 2}\n" for i in range(5)) + ",no title,false\n"
+        with mock.patch("todos.importer.IMPORT_BATCH_SIZE", 2):
+            response = self.upload("todos.csv", content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["imported"], 5)
+        self.assertEqual(response.data["batches"], 3)
+        self.assertEqual(response.data["errors"], [{"row": 6, "errors": {"title": ["This field is required."]}}])
+        self.assertEqual(Todo.objects.filter(user=self.user, completed=True).count(), 2)
+
+    def test_unreadable_file_reports_what_was_imported_before_it(self):
+        user_client = auth_client(self.user)
+        user_client.get("/api/todos/")  # Cached, must be invalidated by the partial import
+        too_long = "x" * (csv.field_size_limit() + 1)
+        content = "title\n" + "".join(f"task {i}\n" for i in range(3)) + f'"{too_long}"\nnever read\n'
+        with mock.patch("todos.importer.IMPORT_BATCH_SIZE", 2), mock.patch("todos.importer.publish_changed") as publish:
+            response = self.upload("todos.csv", content)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["imported"], 3)
+        self.assertEqual(response.data["fatal_error"]["row"], 4)
+        self.assertIn("Malformed CSV", response.data["fatal_error"]["error"])
+        publish.assert_called_once_with(self.user.id)
+        self.assertEqual(len(user_client.get("/api/todos/").json()["todos"]), 3)
+
+    def test_ndjson_import_validates_like_the_serializer(self):
+        content = "\n".join([
+            json.dumps({"title": "ok", "completed": True}),
+            json.dumps({"title": "x" * 101}),
+            "not json",
+        ])
+        response = self.upload("todos.ndjson", content)
+
+        self.assertEqual(response.data["imported"], 1)
+        self.assertEqual([error["row"] for error in response.data["errors"]], [2, 3])
+        self.assertFalse(TodoSerializer(data={"title": "x" * 101, "user": self.user.id}).is_valid())
+
+    def test_ndjson_import_stores_what_the_serializer_would(self):
+        records = [
+            {"title": "  padded  ", "description": ""},
+            {"title": "ok", "completed": 1, "description": "  text "},
+            {"title": "ok", "completed": 0},
+            {"title": "y" * 100 + "   ", "completed": "yes"},
+            {"title": "x" * 101},
+            {"title": "   "},
+            {"title": True},
+            {"title": "no", "completed": [1]},
+            {"title": "no", "completed": "maybe"},
+        ]
+        response = self.upload("todos.ndjson", "\n".join(json.dumps(record) for record in records))
+
+        expected, invalid_rows = [], []
+        for row, record in enumerate(records, start=1):
+            serializer = TodoSerializer(data={**record, "user": self.user.id})
+            if serializer.is_valid():
+                values = serializer.validated_data
+                expected.append({
+                    "title": values["title"], "description": values.get("description"), "completed": values.get("completed", False),
+                })
+            else:
+                invalid_rows.append(row)
+        imported = Todo.objects.filter(user=self.user).order_by("id").values("title", "description", "completed")
+        self.assertEqual(list(imported), expected)
+        self.assertEqual([error["row"] for error in response.data["errors"]], invalid_rows)
+
+    def test_management_command_imports_a_file(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False) as f:
+            f.write(json.dumps({"title": "from the command"}) + "\n")
+        self.addCleanup(os.remove, f.name)
+
+        call_command("import_todos", f.name, user="noah", stdout=io.StringIO())
+        self.assertTrue(Todo.objects.filter(user=self.user, title="from the command").exists())
+
+
+class AsyncViewTests(TodoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user("olga")
+        self.other = Todo.objects.create(user=make_user("pete"), title="not yours")
+        refresh = RefreshToken.for_user(self.user)
+        refresh["role"] = "user"
+        self.headers = {"Authorization": f"Bearer {refresh.access_token}"}
+
+    async def test_create_list_update_delete(self):
+        response = await self.async_client.post("/api/todos/async/", {"title": "async"}, content_type="application/json", headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        todo_id = response.json()["id"]
+
+        response = await self.async_client.get("/api/todos/async/", {"cursor": ""}, headers=self.headers)
+        self.assertEqual([todo["id"] for todo in response.json()["todos"]], [todo_id])
+
+        response = await self.async_client.put(f"/api/todos/async/{todo_id}/", {"title": "renamed", "completed": True}, content_type="application/json", headers=self.headers)
+        self.assertEqual(response.json()["completed"], True)
+
+        response = await self.async_client.get("/api/todos/async/", {"completed": "true"}, headers=self.headers)
+        self.assertEqual(response.json()["pagination"]["total_pages"], 1)
+        self.assertEqual(response.json()["todos"][0]["title"], "renamed")
+
+        response = await self.async_client.delete(f"/api/todos/async/{todo_id}/", headers=self.headers)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(await Todo.objects.filter(id=todo_id).aexists())
+
+    async def test_queries_on_worker_threads_are_measured(self):
+        response = await self.async_client.get("/api/todos/async/", {"cursor": ""}, headers=self.headers)
+        db_timing = next(part for part in response["Server-Timing"].split(",") if part.strip().startswith("db;"))
+        queries = int(db_timing.split('desc="')[1].split(" ")[0])
+        self.assertGreater(queries, 0)  # Run by sync_to_async, outside the event loop's thread
+
+    async def test_permissions_match_the_sync_view(self):
+        response = await self.async_client.get("/api/todos/async/")
+        self.assertEqual(response.status_code, 401)
+
+        response = await self.async_client.delete(f"/api/todos/async/{self.other.id}/", headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+
+class EventStreamTests(TodoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user("quinn")
+        refresh = RefreshToken.for_user(self.user)
+        refresh["role"] = "user"
+        self.headers = {"Authorization": f"Bearer {refresh.access_token}"}
+
+    def write(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            todo = Todo.objects.create(user=self.user, title="pushed")
+        with self.captureOnCommitCallbacks(execute=True):
+            todo.completed = True
+            todo.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            todo.delete()
+        Todo.objects.create(user=make_user("other"), title="not for this stream")
+
+    async def test_saves_and_deletes_are_pushed(self):
+        response = await self.async_client.get("/api/todos/events/", headers=self.headers)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertFalse(get_broker().wants(self.user.id))  # Nothing to leak if the client leaves now
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 3000\n\n")  # Subscribed once the stream started
+
+        await sync_to_async(self.write)()
+        events = [await anext(stream) for _ in range(3)]
+        self.assertEqual([event.split(b"\n")[0] for event in events], [b"event: created", b"event: updated", b"event: deleted"])
+        self.assertEqual(json.loads(events[1].split(b"data: ")[1])["todo"]["completed"], True)
+        waiting = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        waiting.cancel()  # What the ASGI handler does when the client disconnects
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertFalse(get_broker().wants(self.user.id))  # Unsubscribed
+
+    async def test_heartbeat_and_backpressure(self):
+        broker = Broker(LocalBackend())
+        stream = event_stream(lambda: broker.subscribe(self.user.id, queue_size=2), heartbeat=0.01)
+        await anext(stream)
+        self.assertEqual(await anext(stream), ": heartbeat\n\n")
+
+        for index in range(3):  # One more than the queue holds
+            broker.publish(self.user.id, {"type": "changed", "index": index})
+        await asyncio.sleep(0)  # Let the loop run the deliveries
+        self.assertEqual(await anext(stream), 'event: resync\ndata: {"type": "resync"}\n\n')
+        with self.assertRaises(StopAsyncIteration):
+            await anext(stream)
+        self.assertFalse(broker.wants(self.user.id))
+
+    def test_streams_are_only_served_over_asgi(self):
+        response = self.client.get("/api/todos/events/", headers=self.headers)
+        self.assertEqual(response.status_code, 501)
+        self.assertEqual(self.client.get("/api/todos/events/").status_code, 401)
+
+
+class FastListEncodingTests(TodoTestCase):
+    def test_output_is_byte_identical_to_the_model_serializer(self):
+        user = make_user("quinn")
+        Todo.objects.create(user=user, title='quotes " and \\ slashes', description=None)
+        Todo.objects.create(user=user, title="ünïcödé \u2028 line sep", description="tab\tnew\nline", completed=True)
+        Todo.objects.create(user=user, title="control \x01 char", description="")
+        todos = Todo.objects.filter(user=user).order_by("id")
+        pagination = {"next": None, "previous": "abc"}
+
+        expected = JSONRenderer().render({"todos": TodoSerializer(todos, many=True).data, "pagination": pagination})
+        fast = FastJSONRenderer().render(render_todo_list(todos.values_list(*TODO_LIST_COLUMNS), pagination))
+        self.assertEqual(fast, expected)
+
+    def test_list_endpoint_matches_the_model_serializer(self):
+        user = make_user("rita")
+        for i in range(3):
+            Todo.objects.create(user=user, title=f"todo {i}")
+        response = auth_client(user).get("/api/todos/", {"page": 1})
+
+        todos = Todo.objects.filter(user=user).order_by("id")
+        self.assertEqual(response.json()["todos"], TodoSerializer(todos, many=True).data)
+
+
+class InstrumentationTests(TodoTestCase):
+    def setUp(self):
+        super().setUp()
+        registry.clear()
+        self.user = make_user("nora")
+        Todo.objects.create(user=self.user, title="one")
+        self.client = auth_client(self.user)
+
+    def server_timing(self, response):
+        return dict(
+            (part.split(";")[0].strip(), part) for part in response["Server-Timing"].split(",")
+        )
+
+    def test_server_timing_reports_queries_and_serialization(self):
+        self.client.get("/api/todos/", {"cursor": ""})  # Warm up the token revocation filter
+        response = self.client.get("/api/todos/", {"cursor": "", "page_size": 5})
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {"total", "db", "serialize"})
+        self.assertIn('desc="1 queries"', timing["db"])
+
+    def test_every_request_is_logged_with_its_timings(self):
+        with self.assertLogs("middleware.middleware", "INFO") as logs:
+            self.client.get("/api/todos/")
+        [record] = [record for record in logs.records if record.event == "http.request"]
+        self.assertEqual(record.getMessage(), "GET /api/todos/ 200")
+        self.assertEqual((record.method, record.path, record.status), ("GET", "/api/todos/", 200))
+        self.assertGreater(record.db_queries, 0)
+
+    def test_metrics_exposes_a_histogram_per_route(self):
+        todo = Todo.objects.get()
+        for _ in range(3):
+            self.client.put(f"/api/todos/{todo.id}/", {"title": "renamed"}, format="json")
+        self.client.get("/api/todos/")
+
+        body = self.scrape().content.decode()
+        route = 'view="api/todos/<int:todo_id>/",method="PUT"'
+        self.assertIn(f'http_request_duration_seconds_bucket{{{route},le="+Inf"}} 3', body)
+        self.assertIn(f"http_request_duration_seconds_count{{{route}}} 3", body)
+        self.assertIn('http_request_duration_seconds_count{view="api/todos/",method="GET"} 1', body)
+        self.assertIn("# TYPE http_request_db_queries_total counter", body)
+
+    def scrape(self, token="scrape-token"):
+        with override_settings(METRICS_TOKEN="scrape-token"):
+            return APIClient().get("/metrics", HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_metrics_need_the_scrape_token(self):
+        self.assertEqual(self.scrape(token="guess").status_code, 401)
+        self.assertEqual(self.client.get("/metrics").status_code, 404)  # No METRICS_TOKEN configured
+
+    def test_metrics_include_the_password_hashing_pool(self):
+        pool = PasswordHashingPool(0, max_pending=4, wait_timeout=1)
+        with mock.patch("users.hashing._pool", pool):
+            body = self.scrape().content.decode()
+        self.assertIn("# TYPE password_hashing_pending gauge", body)
+        self.assertIn("password_hashing_max_pending 4", body)
+        self.assertIn("password_hashing_rejected_total 0", body)
+
+    @override_settings(DEBUG=True)  # Django logs every adapter it puts between sync and async middleware
+    def test_asgi_middleware_chain_has_no_thread_hops(self):
+        with self.assertNoLogs("django.request", "DEBUG"):
+            handler = ASGIHandler()
+        hooks = handler._view_middleware + handler._template_response_middleware
+        adapted = [hook.func for hook in hooks if isinstance(hook, SyncToAsync)]
+        self.assertFalse([hook for hook in adapted if hook.__module__.startswith("middleware.")])
+
+
+class ProfilingTests(TodoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.user = make_user("otto")
+        Todo.objects.create(user=self.user, title="one")
+
+    def profiling(self, **overrides):
+        config = {**settings.PROFILING, "DIRECTORY": self.directory, **overrides}
+        return override_settings(PROFILING=config)
+
+    def test_requests_are_not_profiled_by_default(self):
+        with self.profiling():
+            response = auth_client(self.user).get("/api/todos/")
+        self.assertNotIn("X-Profile", response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_signed_header_writes_a_collapsed_stack_profile(self):
+        with self.profiling(SAMPLE_INTERVAL=0.0005):
+            client = auth_client(self.user)
+            self.assertNotIn("X-Profile", client.get("/api/todos/", HTTP_X_PROFILE="forged:value"))
+            response = client.get("/api/todos/", HTTP_X_PROFILE=make_profile_header())
+
+        self.assertEqual(os.listdir(self.directory), [response["X-Profile"]])
+        self.assertTrue(response["X-Profile"].endswith("-GET-api-todos.collapsed"))
+
+    def test_one_in_n_sampling_with_rotation(self):
+        with self.profiling(SAMPLE_RATE=2, MODE="cprofile", MAX_FILES=2):
+            client = auth_client(self.user)
+            responses = [client.get("/api/todos/", {"_": i}) for i in range(8)]
+
+        self.assertEqual(sum("X-Profile" in response for response in responses), 4)
+        self.assertEqual(len(os.listdir(self.directory)), 2)  # The two newest .prof files
+        self.assertTrue(all(name.endswith(".prof") for name in os.listdir(self.directory)))
+
+
+class StructuredLoggingTests(TodoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.stream = io.StringIO()
+        self.handler = QueueingHandler(stream=self.stream)
+        self.addCleanup(self.handler.close)
+        views_logger = logging.getLogger("todos.views")
+        views_logger.addHandler(self.handler)
+        self.addCleanup(views_logger.removeHandler, self.handler)
+        level = views_logger.level
+        views_logger.setLevel(logging.DEBUG)
+        self.addCleanup(views_logger.setLevel, level)
+
+    def records(self):
+        self.handler.close()  # Waits until the background thread wrote everything
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_view_records_carry_request_id_user_id_and_view(self):
+        user = make_user("pia")
+        todo = Todo.objects.create(user=user, title="one")
+        response = auth_client(user).put(
+            f"/api/todos/{todo.id}/", {"title": "two"}, format="json", HTTP_X_REQUEST_ID="req-123"
+        )
+        self.assertEqual(response["X-Request-ID"], "req-123")
+
+        update = next(record for record in self.records() if record.get("event") == "todos.update")
+        self.assertEqual(update["todo_id"], todo.id)
+        self.assertEqual(update["request_id"], "req-123")
+        self.assertEqual(str(update["user_id"]), str(user.id))
+        self.assertEqual(update["view"], "todos.views.TodoListView")
+        self.assertEqual(update["level"], "DEBUG")
+
+    def test_exceptions_are_written_apart_from_the_message(self):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logging.getLogger("todos.views").exception("Import of %s failed", "todos.csv")
+        [record] = self.records()
+        self.assertEqual(record["message"], "Import of todos.csv failed")
+        self.assertTrue(record["exception"].startswith("Traceback"))
+        self.assertIn("ValueError: boom", record["exception"])
+
+    def test_high_volume_events_are_sampled(self):
+        self.handler.addFilter(SamplingFilter({"todos.role_scope": 0}))
+        view_logger = logging.getLogger("todos.views")
+        view_logger.debug("dropped", extra={"event": "todos.role_scope"})
+        view_logger.debug("kept", extra={"event": "todos.update"})
+        self.assertEqual([record["message"] for record in self.records()], ["kept"])
+
+    def test_a_full_queue_drops_records_instead_of_blocking(self):
+        handler = QueueingHandler(stream=io.StringIO(), maxsize=1)
+        handler.close()  # Nothing drains the queue any more
+        for _ in range(3):
+            handler.handle(logging.makeLogRecord({"msg": "hello"}))
+        self.assertEqual(handler.dropped, 2)
+
+
+class RepeatedQueryTests(RepeatedQueryTestMixin, TodoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user("quinn")
+        self.client = auth_client(self.user)
+        Todo.objects.bulk_create([Todo(user=self.user, title=f"todo {i}") for i in range(20)])
+
+    def test_shapes_ignore_literals_and_in_list_length(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            normalize_sql("SELECT * FROM t WHERE id IN (%s) AND name = 'y' LIMIT 5"),
+        )
+
+    def test_todo_endpoints_have_no_per_row_queries(self):
+        with self.assertNoRepeatedQueries():
+            self.client.get("/api/todos/")
+            self.client.get("/api/todos/", {"cursor": "", "page_size": 20})
+            b"".join(self.client.get("/api/todos/export/", {"format": "csv"}).streaming_content)
+            items = [{"id": todo.id, "completed": True} for todo in Todo.objects.all()]
+            response = self.client.post("/api/todos/batch/", {"update": items}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_per_row_relation_access_is_reported_with_its_stack(self):
+        with self.assertRaises(AssertionError) as failure:
+            with self.assertNoRepeatedQueries():
+                [todo.user.username for todo in Todo.objects.all()]  # One users.User query per todo
+        self.assertIn("20x SELECT", str(failure.exception))
+        self.assertIn("test_per_row_relation_access_is_reported_with_its_stack", str(failure.exception))
+
+        with self.assertNoRepeatedQueries():
+            [todo.user.username for todo in Todo.objects.select_related("user")]
+
+    @override_settings(QUERY_DETECTOR={"ENABLED": True, "THRESHOLD": 5, "ACTION": "raise"})
+    def test_middleware_fails_requests_with_repeated_queries(self):
+        def n_plus_one_view(request):
+            return HttpResponse(",".join(todo.user.username for todo in Todo.objects.all()))
+
+        middleware = RepeatedQueryMiddleware(n_plus_one_view)
+        with self.assertRaises(RepeatedQueryError):
+            middleware(RequestFactory().get("/"))
+
+
+@override_settings(TODO_SYNC={**settings.TODO_SYNC, "SETTLE_SECONDS": 0})
+class DeltaSyncTests(TodoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user("oscar")
+        self.todos = [Todo.objects.create(user=self.user, title=f"todo {i}") for i in range(5)]
+        Todo.objects.create(user=make_user("other"), title="not mine")
+        self.client = auth_client(self.user)
+
+    def sync(self, since="", **params):
+        response = self.client.get("/api/todos/changes/", {"since": since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_first_sync_pages_through_every_todo(self):
+        first = self.sync(limit=3)
+        self.assertEqual([todo["title"] for todo in first["todos"]], ["todo 0", "todo 1", "todo 2"])
+        self.assertTrue(first["has_more"])
+        second = self.sync(first["cursor"], limit=3)
+        self.assertEqual([todo["title"] for todo in second["todos"]], ["todo 3", "todo 4"])
+        self.assertEqual((second["deleted"], second["has_more"]), ([], False))
+
+    def test_only_changes_and_deletions_since_the_cursor_are_returned(self):
+        cursor = self.sync()["cursor"]
+        self.assertEqual(self.sync(cursor)["todos"], [])
+
+        kept, deleted, batch_deleted = self.todos[:3]
+        self.client.put(f"/api/todos/{kept.id}/", {"title": "renamed", "user": self.user.id}, format="json")
+        self.client.post("/api/todos/", {"title": "new"}, format="json")
+        self.assertEqual(self.client.delete(f"/api/todos/{deleted.id}/").status_code, 204)
+        self.client.post("/api/todos/batch/", {"delete": [batch_deleted.id]}, format="json")
+
+        changes = self.sync(cursor)
+        self.assertEqual([todo["title"] for todo in changes["todos"]], ["renamed", "new"])
+        self.assertEqual(changes["deleted"], [deleted.id, batch_deleted.id])
+
+        with self.assertNumQueries(2):  # One keyset scan per feed, whatever the list size
+            changes = self.sync(changes["cursor"])
+        self.assertEqual((changes["todos"], changes["deleted"]), ([], []))
+
+    def test_filter_deletes_leave_tombstones(self):
+        cursor = self.sync()["cursor"]
+        self.client.post("/api/todos/batch/filter/", {"filters": {}, "delete": True}, format="json")
+        self.assertEqual(sorted(self.sync(cursor)["deleted"]), sorted(todo.id for todo in self.todos))
+
+    def test_old_tombstones_are_compacted_and_old_cursors_expire(self):
+        self.client.delete(f"/api/todos/{self.todos[0].id}/")
+        old = timezone.now() - timedelta(days=settings.TODO_SYNC["TOMBSTONE_TTL_DAYS"] + 1)
+        TodoTombstone.objects.create(user=self.user, todo_id=12345, deleted_at=old)
+
+        call_command("compact_tombstones", stdout=io.StringIO())
+        self.assertEqual(list(TodoTombstone.objects.values_list("todo_id", flat=True)), [self.todos[0].id])
+
+        expired = encode_sync_cursor((old, 0), (old, 0))
+        self.assertEqual(self.client.get("/api/todos/changes/", {"since": expired}).status_code, 410)
+        self.assertEqual(self.client.get("/api/todos/changes/", {"since": "not-a-cursor"}).status_code, 400)
+
+
+class SQLiteAliasesMixin:
+    """
+    Registers and migrates one SQLite file per alias in `aliases` for the tests of the class.
+    """
+
+    aliases = ()
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        for alias in cls.aliases:
+            databases = {**connections.settings, alias: {
+                "ENGINE": "django.db.backends.sqlite3", "NAME": os.path.join(cls.directory, f"{alias}.sqlite3"),
+            }}
+            connections.settings[alias] = connections.configure_settings(databases)[alias]  # Fills in the defaults
+            call_command("migrate", database=alias, verbosity=0)
+        cls.databases = {*cls.databases, *cls.aliases}  # Set here, not on the class: the test runner must not create them
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in cls.aliases:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        shutil.rmtree(cls.directory)
+
+
+class ReplicaRouterTests(SQLiteAliasesMixin, SimpleTestCase):
+    """
+    Runs against two SQLite files standing in for the primary and a replica. They are not
+    replicated, so where a row can be read from shows which database served the read.
+    """
+
+    aliases = ("router_primary", "router_replica")
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.enterClassContext(override_settings(DATABASE_PRIMARY="router_primary", DATABASE_REPLICAS=["router_replica"]))
+
+    def setUp(self):
+        cache.clear()
+        for alias in self.aliases:
+            Todo.objects.using(alias).all().delete()
+            User.objects.using(alias).all().delete()
+        self.user = User.objects.create(username="sam", email="sam@example.com")  # Goes to the primary
+
+    def test_reads_use_the_replica_and_writes_the_primary(self):
+        Todo.objects.create(user=self.user, title="one")
+        self.assertEqual(Todo.objects.using("router_primary").count(), 1)
+        self.assertFalse(Todo.objects.exists())  # Read from the (stale) replica
+
+    def test_reads_inside_atomic_blocks_use_the_primary(self):
+        with transaction.atomic(using="router_primary"):
+            Todo.objects.create(user=self.user, title="one")
+            self.assertTrue(Todo.objects.exists())
+
+    def test_a_request_that_wrote_keeps_reading_the_primary(self):
+        with routing_scope() as state:
+            self.assertFalse(Todo.objects.exists())
+            Todo.objects.create(user=self.user, title="one")
+            self.assertTrue(state.wrote)
+            self.assertTrue(Todo.objects.exists())
+
+    def test_cookie_and_user_marker_pin_later_requests(self):
+        Todo.objects.create(user=self.user, title="one")
+
+        def write(request):
+            set_current_user(self.user.id)  # What the authentication does
+            Todo.objects.create(user=self.user, title="two")
+            return HttpResponse()
+
+        def read_as(user_id):
+            def read(request):
+                set_current_user(user_id)
+                return HttpResponse(str(Todo.objects.count()))
+            return read
+
+        read = read_as(self.user.id)
+        response = ReplicaStickinessMiddleware(write)(RequestFactory().post("/"))
+        cookie = response.cookies[ReplicaStickinessMiddleware.cookie_name]
+
+        # Same client: the signed cookie pins it
+        request = RequestFactory().get("/")
+        request.COOKIES[cookie.key] = cookie.value
+        self.assertEqual(ReplicaStickinessMiddleware(read)(request).content, b"2")
+
+        # Another client of the same user: the cache marker pins it
+        self.assertEqual(ReplicaStickinessMiddleware(read)(RequestFactory().get("/")).content, b"2")
+
+        # Another user reads the replica
+        self.assertEqual(ReplicaStickinessMiddleware(read_as(self.user.id + 1))(RequestFactory().get("/")).content, b"0")
+
+    def test_list_responses_are_cached_from_the_primary(self):
+        Todo.objects.create(user=self.user, title="one")  # Not on the replica yet
+
+        class ListView:
+            @cached_list_response
+            def get(self, request):
+                return Response({"count": Todo.objects.count()})
+
+        request = mock.Mock(auth=None, user=self.user, query_params=QueryDict(), headers={})
+        with routing_scope():
+            self.assertEqual(ListView().get(request).data, {"count": 1})
+            self.assertFalse(Todo.objects.exists())  # Other reads still use the replica
+
+
+class ShardingTests(SQLiteAliasesMixin, TodoTestCase):
+    """
+    Shards todos over the default database and two SQLite files; users stay on default.
+    """
+
+    aliases = ("shard_a", "shard_b")
+    shards = ["default", "shard_a", "shard_b"]
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.enterClassContext(override_settings(TODO_SHARDS=cls.shards))
+
+    def user_on(self, shard):
+        """Creates users until one maps to the shard."""
+        for _ in range(100):
+            user = make_user(f"user{User.objects.count()}")
+            if shard_for_user(user.id) == shard:
+                return user
+        self.fail(f"No user maps to {shard}")
+
+    def test_ring_moves_few_users_when_a_shard_is_added(self):
+        before = HashRing(["a", "b", "c"], 64)
+        after = HashRing(["a", "b", "c", "d"], 64)
+        owners = [before.shard_for(user_id) for user_id in range(3000)]
+        self.assertEqual(set(owners), {"a", "b", "c"})
+        self.assertEqual(owners, [HashRing(["a", "b", "c"], 64).shard_for(user_id) for user_id in range(3000)])
+        moved = [user_id for user_id, owner in enumerate(owners) if after.shard_for(user_id) != owner]
+        self.assertTrue(all(after.shard_for(user_id) == "d" for user_id in moved))  # Only to the new shard
+        self.assertLess(len(moved), 3000 * 0.4)
+
+    def test_todos_live_on_the_owners_shard(self):
+        user = self.user_on("shard_a")
+        client = auth_client(user)
+
+        response = client.post("/api/todos/", {"title": "sharded"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        todo_id = response.json()["id"]
+        self.assertEqual(Todo.objects.using("shard_a").filter(user=user).count(), 1)
+        self.assertFalse(Todo.objects.using("default").exists())
+        self.assertEqual(user.todos.get().title, "sharded")
+
+        self.assertEqual([todo["title"] for todo in client.get("/api/todos/", {"cursor": ""}).json()["todos"]], ["sharded"])
+        response = client.put(f"/api/todos/{todo_id}/", {"title": "renamed", "user": user.id}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Todo.objects.using("shard_a").get().title, "renamed")
+        self.assertEqual(client.delete(f"/api/todos/{todo_id}/").status_code, 204)
+        self.assertFalse(Todo.objects.using("shard_a").exists())
+
+    def test_batch_and_import_write_to_the_owners_shard(self):
+        user = self.user_on("shard_b")
+        client = auth_client(user)
+        response = client.post("/api/todos/batch/", {"create": [{"title": "one"}, {"title": "two"}]}, format="json")
+        self.assertEqual(response.status_code, 200)
+        upload = SimpleUploadedFile("todos.ndjson", b'{"title": "three"}\n')
+        self.assertEqual(client.post("/api/todos/import/", {"file": upload}).status_code, 200)
+        self.assertEqual(Todo.objects.using("shard_b").filter(user=user).count(), 3)
+
+        response = client.post("/api/todos/batch/filter/", {"filters": {}, "update": {"completed": True}}, format="json")
+        self.assertEqual(response.json(), {"updated": 3})
+
+    def test_admin_listing_merges_every_shard(self):
+        admin = make_user("admin", role="admin")
+        titles = []
+        for index, shard in enumerate(self.shards * 2):
+            Todo.objects.create(user=self.user_on(shard), title=f"todo {index}")
+            titles.append(f"todo {index}")
+        self.assertEqual({Todo.objects.using(shard).count() for shard in self.shards}, {2})
+        client = auth_client(admin, role="admin")
+
+        seen, cursor = [], ""
+        while cursor is not None:
+            page = client.get("/api/todos/", {"cursor": cursor, "page_size": 4}).json()
+            seen += [todo["title"] for todo in page["todos"]]
+            cursor = page["pagination"]["next"]
+        self.assertEqual(seen, titles)  # In created_at order across the shards
+
+        page = client.get("/api/todos/", {"page": 2, "page_size": 4}).json()
+        self.assertEqual(page["pagination"]["total_pages"], 2)
+        self.assertEqual([todo["title"] for todo in page["todos"]], ["todo 4", "todo 5"])
+
+        lines = client.get("/api/todos/export/", {"format": "ndjson"}).getvalue().decode().splitlines()
+        self.assertEqual(sorted(json.loads(line)["title"] for line in lines), titles)
+
+    def test_rebalance_moves_todos_to_the_owners_shard(self):
+        user = self.user_on("shard_a")
+        todo = Todo.objects.using("shard_b").create(user=user, title="misplaced")  # As if the ring had changed
+        created_at = todo.created_at - timedelta(days=3)
+        Todo.objects.using("shard_b").filter(id=todo.id).update(created_at=created_at)
+
+        call_command("rebalance_todos", "--all", stdout=io.StringIO())
+
+        self.assertFalse(Todo.objects.using("shard_b").exists())
+        moved = Todo.objects.using("shard_a").get()
+        self.assertEqual((moved.id, moved.title, moved.created_at), (todo.id, "misplaced", created_at))
+        self.assertEqual(move_user_todos(user.id, "shard_b"), 0)  # Nothing left to move
+
+    def test_rebalance_pushes_one_changed_event_instead_of_deletions(self):
+        user = self.user_on("shard_a")
+        Todo.objects.using("shard_b").bulk_create([Todo(user=user, title=f"todo {i}") for i in range(3)])
+        backend, messages = LocalBackend(), []
+        backend.subscribe(f"todos:{user.id}", messages.append)
+
+        with mock.patch("todos.events._broker", Broker(backend)):
+            with self.captureOnCommitCallbacks(execute=True, using="shard_b"):
+                self.assertEqual(move_user_todos(user.id, "shard_b"), 3)
+
+        self.assertEqual([message.split("\n")[0] for message in messages], ["event: changed"])
+
+    def test_deleting_a_user_deletes_their_sharded_todos(self):
+        user = self.user_on("shard_b")
+        Todo.objects.create(user=user, title="one")
+        user.delete()
+        self.assertFalse(Todo.objects.using("shard_b").exists())
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """
+    Runs the pool over SQLite connections to a temporary file.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "pool.sqlite3")
+
+    def make_pool(self, **options):
+        pool = ConnectionPool(
+            lambda: sqlite3.connect(self.path, check_same_thread=False),
+            lambda connection: connection.execute("SELECT 1"),
+            **{**POOL_DEFAULTS, **options},
+        )
+        self.addCleanup(pool.close_idle)
+        return pool
+
+    def test_connections_are_reused(self):
+        pool = self.make_pool()
+        connection = pool.checkout()
+        self.assertEqual((pool.stats()["in_use"], pool.stats()["idle"]), (1, 0))
+        pool.release(connection)
+        self.assertEqual((pool.stats()["in_use"], pool.stats()["idle"]), (0, 1))
+        self.assertIs(pool.checkout(), connection)
+        self.assertEqual(pool.stats()["opened"], 1)
+
+    def test_checkout_times_out_when_the_pool_is_exhausted(self):
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        pool.checkout()
+        with self.assertRaises(PoolTimeout):
+            pool.checkout()
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+    def test_waiters_are_served_in_arrival_order(self):
+        pool = self.make_pool(max_size=1, timeout=5)
+        connection = pool.checkout()
+        served = []
+
+        def wait(name):
+            pool.release(pool.checkout())
+            served.append(name)
+
+        threads = []
+        for name in ("first", "second", "third"):
+            thread = threading.Thread(target=wait, args=(name,))
+            thread.start()
+            threads.append(thread)
+            while pool.stats()["waiting"] < len(threads):  # Queued before the next one starts
+                time.sleep(0.001)
+        pool.release(connection)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(served, ["first", "second", "third"])
+        self.assertEqual(pool.stats()["opened"], 1)
+
+    def test_broken_and_expired_connections_are_replaced(self):
+        pool = self.make_pool()
+        connection = pool.checkout()
+        pool.release(connection)
+        connection.close()  # E.g. the server dropped it while idle
+        self.assertIsNot(pool.checkout(), connection)
+        self.assertEqual(pool.stats()["failed_checks"], 1)
+
+        pool = self.make_pool(max_lifetime=0)
+        connection = pool.checkout()
+        pool.release(connection)
+        self.assertEqual(pool.stats()["expired"], 1)
+        self.assertIsNot(pool.checkout(), connection)
+
+    def test_database_wrapper_returns_connections_to_the_pool(self):
+        class PooledSQLiteWrapper(PooledDatabaseWrapperMixin, sqlite3_base.DatabaseWrapper):
+            pass
+
+        alias = "pool_test"
+        settings_dict = connections.configure_settings({
+            "default": {}, alias: {"ENGINE": "django.db.backends.sqlite3", "NAME": self.path, "OPTIONS": {"pool": {"max_size": 2}}},
+        })[alias]
+        self.addCleanup(pools.pop, alias, None)
+        first = PooledSQLiteWrapper(settings_dict, alias)
+        with first.cursor() as cursor:
+            cursor.execute("CREATE TABLE item (name TEXT)")
+        raw = first.connection
+        first.close()
+        self.assertEqual(pools[alias].stats()["idle"], 1)
+
+        second = PooledSQLiteWrapper(settings_dict, alias)  # E.g. the next request's thread
+        second.set_autocommit(False)
+        self.assertIs(second.connection, raw)
+        with second.cursor() as cursor:
+            cursor.execute("INSERT INTO item VALUES ('uncommitted')")
+        second.close()  # Rolled back before going back to the pool
+        with raw:
+            self.assertEqual(raw.execute("SELECT COUNT(*) FROM item").fetchone(), (0,))
+
+        registry.clear()
+        self.assertIn(f'db_pool_connections{{alias="{alias}",state="idle"}} 1', registry.render())
+        pools[alias].close_idle()
@@ -1,9 +1,18 @@
 from django.urls import path  # Importing the path function for URL routing
-from .views import TodoListView  # Importing the TodoListView class-based view
+from .async_views import AsyncTodoListView, TodoEventsView  # Native async todo views for the ASGI entry point
+from .views import TodoListView, TodoBatchView, TodoFilterBatchView, TodoExportView, TodoImportView, TodoChangesView  # Importing the todo class-based views
 
 urlpatterns = [
     # Route for listing and creating todos
     path('', TodoListView.as_view(), name='todo-list'),  # Routes to the TodoListView
     path('<int:todo_id>/', TodoListView.as_view(), name='todo-detail'),  # URL for retrieving, updating, and deleting a specific todo
+    path('batch/', TodoBatchView.as_view(), name='todo-batch'),  # Bulk create, update and delete in one transaction
+    path('batch/filter/', TodoFilterBatchView.as_view(), name='todo-batch-filter'),  # Update or delete every todo matching a filter
+    path('export/', TodoExportView.as_view(), name='todo-export'),  # Streaming NDJSON/CSV export
+    path('import/', TodoImportView.as_view(), name='todo-import'),  # Batched CSV/NDJSON import
+    path('changes/', TodoChangesView.as_view(), name='todo-changes'),  # Delta sync: changes and deletions since a cursor
+    path('async/', AsyncTodoListView.as_view(), name='todo-list-async'),  # Native async list/create (serve with todo_backend.asgi)
+    path('async/<int:todo_id>/', AsyncTodoListView.as_view(), name='todo-detail-async'),  # Native async update/delete
+    path('events/', TodoEventsView.as_view(), name='todo-events'),  # Server-Sent Events push of todo changes (ASGI only)
 
 ]
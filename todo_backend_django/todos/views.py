@@ -1,25 +1,138 @@
 from rest_framework.views import APIView  # Importing APIView for creating class-based views
 from rest_framework.permissions import IsAuthenticated  # Importing permission to enforce authentication
 from rest_framework.response import Response  # Importing Response to send API responses
+from rest_framework.renderers import JSONRenderer, BrowsableAPIRenderer
+from rest_framework.parsers import MultiPartParser
 from rest_framework import status  # Importing status codes for API responses
 from .models import Todo  # Importing the Todo model
-from .serializers import TodoSerializer  # Importing the Todo serializer
+from .sharding import shard_for_user  # Database alias holding a user's todos
+from .sync import CursorExpired, changes_since, delete_todo, record_tombstones  # Delta sync with tombstones
+from .events import publish_changed  # Push to the open event streams (see TodoEventsView)
+from .serializers import TodoSerializer, TodoBatchItemSerializer  # Importing the Todo serializers
+from .pagination import cursor_paginate, InvalidCursor  # Keyset pagination for the opt-in cursor mode
+from .cache import cached_list_response, bump_version  # Per-user versioned list cache with ETag/304
+from .encoders import TODO_LIST_COLUMNS, FastJSONRenderer, render_todo_list  # Fast read path for the list
+from .export import iter_todo_rows, ndjson_lines, csv_lines  # Streaming NDJSON/CSV export
+from .importer import IMPORT_FORMATS, guess_format, import_todos  # Batched CSV/NDJSON import
+from users.authentication import StatelessClaimsJWTAuthentication  # Token-backed user for the read-heavy todo API
+from middleware.metrics import measure_serialization  # Counts toward the Server-Timing serialize time
+from todo_backend.routers import mark_written  # Read-your-writes for writes on an explicit shard alias
 from rest_framework import viewsets
 import re
+from django.conf import settings
 from django.core.paginator import Paginator
-from datetime import datetime  # Import datetime for date conversion
+from django.db import transaction  # Import transaction for atomic batch operations
+from django.http import StreamingHttpResponse  # Used to stream exports without building them in memory
+from datetime import datetime, time, timedelta  # Import datetime for date conversion
+from django.utils import timezone  # Used to turn naive dates into aware range bounds
+from django.utils.dateparse import parse_date, parse_datetime  # Used to parse the range filter values
+import logging  # Structured, queued logging (see middleware.structured_logging and settings.LOGGING)
 
-import jwt
-from django.conf import settings
 
+logger = logging.getLogger(__name__)
+
+
+def parse_timestamp(value):
+    """
+    Parses a range filter value given either as YYYY-MM-DD or as an ISO 8601 datetime.
+
+    Returns:
+        datetime: An aware datetime (dates map to midnight), or None if the value is invalid.
+    """
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            parsed = datetime.combine(day, time.min)
+    except ValueError:
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class TodoFilterMixin:
+    """
+    Shared role scoping and list filters for the todo views (list, batch, export).
+    """
+
+    def todos_for(self, request):
+        """
+        Returns the todos the authenticated user may see, based on the role claim of the token.
+        """
+        role = request.auth.get('role', None)  # 'role' is embedded in the JWT and was validated by ClaimsJWTAuthentication
+
+        # Fetch todos based on the user's role (sampled debug event, see LOGGING)
+        logger.debug("Todos scoped by role %s", role, extra={"event": "todos.role_scope", "role": role})
+        if role == 'admin':
+            return Todo.objects.all_shards()  # Fetch all todos for admin users (every shard)
+        return Todo.objects.for_user(request.user.id)  # Fetch todos owned by the current user, from their shard
+
+    def filter_todos(self, todos, query_params):
+        """
+        Applies the list filters from the query parameters to the todos queryset.
+
+        Every filter compiles to an equality or a half-open range predicate on a bare
+        column, so the (user, completed, created_at) and (user, updated_at) indexes can serve it.
+
+        Args:
+            todos (QuerySet): The queryset of todos to filter.
+            query_params (QueryDict): The request query parameters.
+
+        Returns:
+            QuerySet: The filtered queryset.
+
+        Raises:
+            ValueError: If a date parameter is malformed (the message is safe to return to the client).
+        """
+        # Extract filter parameters from the request
+        completed = query_params.get('completed', None)  # Filter by status
+        created_at = query_params.get('created_at', None)  # Filter by due_date
+
+        # Apply filters if provided
+        if completed:
+            completed_values = {'true': True, '1': True, 't': True, 'false': False, '0': False, 'f': False}
+            if completed.lower() not in completed_values:
+                raise ValueError("Invalid completed value. Please use true or false.")
+            # completed__in compiles to "completed IN (...)"; completed=True would compile to a bare
+            # "WHERE completed" that cannot be used as the equality prefix of the composite index
+            todos = todos.filter(completed__in=[completed_values[completed.lower()]])
+        if created_at:
+            try:
+                created_at = datetime.strptime(created_at, '%Y-%m-%d').date()  # Convert string to date object
+            except ValueError:
+                raise ValueError("Invalid date format. Please use YYYY-MM-DD.")
+            # Match the whole day as a half-open range instead of created_at__date, which wraps the column in a function
+            day_start = timezone.make_aware(datetime.combine(created_at, time.min))
+            todos = todos.filter(created_at__gte=day_start, created_at__lt=day_start + timedelta(days=1))
+
+        # Half-open range filters: created_after <= created_at < created_before, updated_at >= updated_since
+        range_filters = {
+            'created_after': 'created_at__gte',
+            'created_before': 'created_at__lt',
+            'updated_since': 'updated_at__gte',
+        }
+        for param, lookup in range_filters.items():
+            value = query_params.get(param, None)
+            if value:
+                timestamp = parse_timestamp(value)
+                if timestamp is None:
+                    raise ValueError(f"Invalid {param}. Please use YYYY-MM-DD or an ISO 8601 datetime.")
+                todos = todos.filter(**{lookup: timestamp})
+
+        return todos
 
 
 # Class-based view for managing todos
-class TodoListView(APIView):  
+class TodoListView(TodoFilterMixin, APIView):  
     """
     Handles listing and creating todos for the authenticated user.
     """
+    authentication_classes = [StatelessClaimsJWTAuthentication]  # Build request.user from the token claims, no User query
     permission_classes = [IsAuthenticated]  # Enforce authentication for this view
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]  # JSONRenderer that passes pre-encoded list responses through
 
     def pagination(self,todos, page_number, page_size=10):
 
@@ -49,67 +162,52 @@ class TodoListView(APIView):
             "has_previous": page.has_previous(),  # Whether there is a previous page
         }
 
+    @cached_list_response
     def get(self, request):
         """
         Fetches all todos for the authenticated user.
+
+        Pass ?cursor= (empty for the first page) to switch to cursor pagination; the
+        page-number response below stays the default for existing clients.
         """
 
-        user_email = request.user.email  # Extract the email of the authenticated user
         page_number = request.query_params.get('page', 1)  # Get the page number from query parameters
         page_size = request.query_params.get('page_size', 10)  # Get the page size from query parameters
 
-        # role = request.auth.get('role', None)  # 'role' is embedded in the JWT during token generation
+        todos = self.todos_for(request)  # All todos for admins, the user's own todos otherwise
 
-         # Decode the JWT token to access the role
+        # Apply the filters from the query parameters
         try:
-            # Get the token from the request headers (assuming 'Authorization: Bearer <token>')
-            token = request.headers.get("Authorization").split(" ")[1]
-            decoded_token = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-            role = decoded_token.get("role", None)  # Extract the role from the token payload
-        except (IndexError, jwt.ExpiredSignatureError, jwt.DecodeError, AttributeError):
-            return Response({"error": "Invalid or missing token."}, status=status.HTTP_401_UNAUTHORIZED)
-
+            todos = self.filter_todos(todos, request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+        # Read-only fast path: fetch plain rows and encode them directly (see todos.encoders)
+        rows = todos.values_list(*TODO_LIST_COLUMNS, named=True)
 
-         # Fetch todos based on the user's role
-        if role == 'admin':
-            print("The user has the 'admin' role.")  # Debug log for admin user
-            todos = Todo.objects.all()  # Fetch all todos for admin users
-        else:
-            print(f"The user has the role: {role}.")  # Debug log for non-admin user
-            todos = Todo.objects.filter(user=request.user)  # Fetch todos owned by the current user
-
-          # Extract filter parameters from the request
-        completed = request.query_params.get('completed', None)  # Filter by status
-        created_at = request.query_params.get('created_at', None)  # Filter by due_date
-
-        # Apply filters if provided
-        if completed:
-            todos = todos.filter(completed=completed)  # Assuming Todo model has a 'status' field
-        if created_at:
+        # Cursor mode (opt-in with ?cursor=...): seek on (created_at, id), no COUNT(*) and no OFFSET
+        cursor = request.query_params.get('cursor', None)
+        if cursor is not None:
             try:
-                created_at = datetime.strptime(created_at, '%Y-%m-%d').date()  # Convert string to date object
-                todos = todos.filter(created_at__date=created_at)  # Use __date to match only the date portion
+                paginated_data = cursor_paginate(rows, cursor, page_size)
+            except InvalidCursor:
+                return Response({"error": "Invalid cursor."}, status=status.HTTP_400_BAD_REQUEST)
             except ValueError:
-                return Response({"error": "Invalid date format. Please use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
-
+                return Response({"error": "Invalid page size."}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(render_todo_list(paginated_data["items"], {
+                "next": paginated_data["next"],
+                "previous": paginated_data["previous"],
+            }))
 
         # Paginate the todos
-        paginated_data = self.pagination(todos, page_number,page_size)
-        serializer = TodoSerializer(paginated_data["items"], many=True)  # Serialize the paginated todos
-        return Response({
-            "todos": serializer.data,  # Serialized todos
-            "pagination": {
-                "total_pages": paginated_data["total_pages"],
-                "current_page": paginated_data["current_page"],
-                "has_next": paginated_data["has_next"],
-                "has_previous": paginated_data["has_previous"],
-            }
-        })  # Respond with serialized data and pagination metadata
-            
-
-
-        
+        paginated_data = self.pagination(rows, page_number,page_size)
+        return Response(render_todo_list(paginated_data["items"], {
+            "total_pages": paginated_data["total_pages"],
+            "current_page": paginated_data["current_page"],
+            "has_next": paginated_data["has_next"],
+            "has_previous": paginated_data["has_previous"],
+        }))  # Respond with the encoded todos and pagination metadata
+
     def post(self, request):
         """
         Creates a new todo for the authenticated user.
@@ -127,8 +225,8 @@ class TodoListView(APIView):
         Deletes a specific todo item for the authenticated user.
         """
         try:
-            todo = Todo.objects.get(id=todo_id, user=request.user)  # Find the Todo by ID and ensure it belongs to the authenticated user
-            todo.delete()  # Delete the todo
+            todo = Todo.objects.for_user(request.user.id).get(id=todo_id)  # Find the Todo by ID and ensure it belongs to the authenticated user
+            delete_todo(todo)  # Delete the todo and leave a tombstone for delta sync clients
             return Response({"message": "Todo successfully deleted."}, status=status.HTTP_204_NO_CONTENT)  # Respond with success message
         except Todo.DoesNotExist:
             return Response({"message": "Todo not found or you don't have access to it."}, status=status.HTTP_404_NOT_FOUND)  # Handle case where todo does not exist or user doesn't own it
@@ -138,12 +236,286 @@ class TodoListView(APIView):
         Updates a specific todo for the authenticated user.
         """
         try:
-            todo = Todo.objects.get(id=todo_id, user=request.user)  # Get the todo item for the current user
-            print(todo_id)
+            todo = Todo.objects.for_user(request.user.id).get(id=todo_id)  # Get the todo item for the current user
+            logger.debug("Updating todo %s", todo_id, extra={"event": "todos.update", "todo_id": todo_id})
             serializer = TodoSerializer(todo, data=request.data)  # Deserialize the input data
             if serializer.is_valid():  # Check if the input data is valid
                 serializer.save()  # Save the updates to the database
                 return Response(serializer.data, status=status.HTTP_200_OK)  # Respond with the updated todo data
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)  # Respond with validation errors
         except Todo.DoesNotExist:
-            return Response({"error": "Todo not found."}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+            return Response({"error": "Todo not found."}, status=status.HTTP_404_NOT_FOUND)
+
+# Upper bound on the number of items in each list of a batch request
+MAX_BATCH_ITEMS = 500
+
+# Per-item error for a batch id that is not a JSON integer (like DRF's IntegerField message)
+INVALID_ID_ERRORS = {"id": ["A valid integer is required."]}
+
+
+def is_todo_id(value):
+    """
+    Whether a batch item id is a JSON integer: not a bool (True == 1), nor an unhashable list or object.
+    """
+    return type(value) is int
+
+
+# Class-based view for applying many todo changes at once
+class TodoBatchView(APIView):
+    """
+    Creates, updates and deletes many todos of the authenticated user in one request.
+
+    Body: {"create": [{...}], "update": [{"id": 1, ...}], "delete": [2, 3]}
+
+    Everything runs in a single transaction with one bulk_create, one bulk_update and
+    one DELETE ... WHERE id IN. If any item fails, nothing is written and the per-item
+    results show which ones failed.
+    """
+    authentication_classes = [StatelessClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        creates = request.data.get("create", [])
+        updates = request.data.get("update", [])
+        deletes = request.data.get("delete", [])
+
+        if not all(isinstance(items, list) for items in (creates, updates, deletes)):
+            return Response({"error": "create, update and delete must be lists."}, status=status.HTTP_400_BAD_REQUEST)
+        if max(len(creates), len(updates), len(deletes)) > MAX_BATCH_ITEMS:
+            return Response({"error": f"At most {MAX_BATCH_ITEMS} items per list."}, status=status.HTTP_400_BAD_REQUEST)
+
+        user_id = request.user.id
+        results = {"create": [], "update": [], "delete": []}
+        failed = False
+
+        # Validate the creates without touching the database
+        new_todos = []
+        for item in creates:
+            serializer = TodoBatchItemSerializer(data=item)
+            if serializer.is_valid():
+                new_todos.append(Todo(user_id=user_id, **serializer.validated_data))
+                results["create"].append({"status": status.HTTP_201_CREATED})
+            else:
+                failed = True
+                results["create"].append({"status": status.HTTP_400_BAD_REQUEST, "errors": serializer.errors})
+
+        # Load every todo to update in one query, then validate the changes against it
+        update_ids = [item.get("id") for item in updates if isinstance(item, dict)]
+        owned = Todo.objects.for_user(user_id).filter(id__in=[i for i in update_ids if is_todo_id(i)]).in_bulk()
+        changed_todos, changed_fields = [], {"updated_at"}
+        now = timezone.now()
+        for item in updates:
+            todo_id = item.get("id") if isinstance(item, dict) else None
+            if not is_todo_id(todo_id):
+                failed = True
+                results["update"].append({"id": None, "status": status.HTTP_400_BAD_REQUEST, "errors": INVALID_ID_ERRORS})
+                continue
+            todo = owned.get(todo_id)
+            if todo is None:
+                failed = True
+                results["update"].append({"id": todo_id, "status": status.HTTP_404_NOT_FOUND})
+                continue
+            serializer = TodoBatchItemSerializer(todo, data={k: v for k, v in item.items() if k != "id"}, partial=True)
+            if not serializer.is_valid():
+                failed = True
+                results["update"].append({"id": todo.id, "status": status.HTTP_400_BAD_REQUEST, "errors": serializer.errors})
+                continue
+            for field, value in serializer.validated_data.items():
+                setattr(todo, field, value)
+                changed_fields.add(field)
+            todo.updated_at = now  # bulk_update does not apply auto_now
+            changed_todos.append(todo)
+            results["update"].append({"id": todo.id, "status": status.HTTP_200_OK})
+
+        # Find which of the todos to delete exist and belong to the user
+        delete_ids = set(Todo.objects.for_user(user_id).filter(
+            id__in=[i for i in deletes if is_todo_id(i)]
+        ).values_list("id", flat=True))
+        for todo_id in deletes:
+            if not is_todo_id(todo_id):
+                failed = True
+                results["delete"].append({"id": None, "status": status.HTTP_400_BAD_REQUEST, "errors": INVALID_ID_ERRORS})
+            elif todo_id in delete_ids:
+                results["delete"].append({"id": todo_id, "status": status.HTTP_204_NO_CONTENT})
+            else:
+                failed = True
+                results["delete"].append({"id": todo_id, "status": status.HTTP_404_NOT_FOUND})
+
+        if failed:
+            return Response({"results": results}, status=status.HTTP_400_BAD_REQUEST)
+
+        shard = shard_for_user(user_id)  # All of the user's todos live on one shard
+        todos = Todo.objects.using(shard)
+        mark_written()  # using() bypasses the router's write tracking
+        with transaction.atomic(using=shard):
+            created = todos.bulk_create(new_todos, batch_size=MAX_BATCH_ITEMS)
+            if changed_todos:
+                todos.bulk_update(changed_todos, sorted(changed_fields), batch_size=MAX_BATCH_ITEMS)
+            if delete_ids:
+                todos.filter(id__in=delete_ids).delete()
+                record_tombstones(user_id, delete_ids)
+            transaction.on_commit(lambda: bump_version(user_id), using=shard)  # bulk_create/bulk_update send no post_save
+        if new_todos or changed_todos:
+            publish_changed(user_id)  # No per-todo events for bulk writes
+
+        # Backends that cannot return ids from a multi-row INSERT (MySQL) report "id": null for created items
+        for result, todo in zip(results["create"], TodoSerializer(created, many=True).data):
+            result["todo"] = todo
+        for result, todo in zip(results["update"], TodoSerializer(changed_todos, many=True).data):
+            result["todo"] = todo
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+# Class-based view for changing every todo that matches a filter
+class TodoFilterBatchView(TodoFilterMixin, APIView):
+    """
+    Updates or deletes all of the authenticated user's todos that match the list filters,
+    as one UPDATE or DELETE statement.
+
+    Body: {"filters": {"created_before": "2024-01-01"}, "update": {"completed": true}}
+       or {"filters": {"completed": "true"}, "delete": true}
+    """
+    authentication_classes = [StatelessClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        filters = request.data.get("filters", {})
+        if not isinstance(filters, dict):
+            return Response({"error": "filters must be an object."}, status=status.HTTP_400_BAD_REQUEST)
+        # JSON booleans/numbers arrive typed; the list filters expect query-string values
+        filters = {key: str(value).lower() if isinstance(value, bool) else str(value) for key, value in filters.items()}
+
+        try:
+            todos = self.filter_todos(Todo.objects.for_user(request.user.id), filters)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.data.get("delete") is True:
+            mark_written()  # for_user() picks the shard with using(), bypassing the router's write tracking
+            with transaction.atomic(using=shard_for_user(request.user.id)):
+                ids = list(todos.values_list("id", flat=True))
+                deleted, _ = Todo.objects.for_user(request.user.id).filter(id__in=ids).delete()
+                record_tombstones(request.user.id, ids)
+            bump_version(request.user.id)
+            return Response({"deleted": deleted}, status=status.HTTP_200_OK)
+
+        changes = request.data.get("update")
+        if not isinstance(changes, dict) or not changes:
+            return Response({"error": "Provide an update object or \"delete\": true."}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = TodoBatchItemSerializer(data=changes, partial=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        mark_written()
+        updated = todos.update(updated_at=timezone.now(), **serializer.validated_data)  # Single UPDATE ... WHERE
+        bump_version(request.user.id)  # QuerySet.update() sends no post_save
+        publish_changed(request.user.id)
+        return Response({"updated": updated}, status=status.HTTP_200_OK)
+
+
+# Class-based view for exporting todos
+class TodoExportView(TodoFilterMixin, APIView):
+    """
+    Streams the todos the user may see as NDJSON or CSV.
+
+    To export===>http://127.0.0.1:8000/api/todos/export/?format=ndjson (or format=csv)
+
+    Honours the same role rules and filters as TodoListView.get, but streams every
+    matching row instead of paginating, with memory bounded by one chunk of rows.
+    """
+    authentication_classes = [StatelessClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    export_formats = {
+        "ndjson": (ndjson_lines, "application/x-ndjson"),
+        "csv": (csv_lines, "text/csv"),
+    }
+
+    def perform_content_negotiation(self, request, force=False):
+        # ?format= selects the export format here, not a DRF renderer; errors are always JSON
+        renderer = JSONRenderer()
+        return renderer, renderer.media_type
+
+    def get(self, request):
+        export_format = request.query_params.get("format", "ndjson")
+        if export_format not in self.export_formats:
+            return Response({"error": "Invalid format. Please use ndjson or csv."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            todos = self.filter_todos(self.todos_for(request), request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        encode, content_type = self.export_formats[export_format]
+        response = StreamingHttpResponse(encode(iter_todo_rows(todos)), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="todos.{export_format}"'
+        return response
+
+
+# Class-based view for importing todos
+class TodoImportView(APIView):
+    """
+    Imports todos for the authenticated user from an uploaded CSV or NDJSON file.
+
+    Upload the file as multipart form data in the "file" field; the format comes from
+    ?format= or the file extension. Large uploads are spooled to disk by Django and parsed
+    row by row, so memory stays bounded (see todos.importer).
+    """
+    authentication_classes = [StatelessClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def perform_content_negotiation(self, request, force=False):
+        # ?format= selects the import format here, not a DRF renderer
+        renderer = JSONRenderer()
+        return renderer, renderer.media_type
+
+    def post(self, request):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"error": "Upload the file in the \"file\" field."}, status=status.HTTP_400_BAD_REQUEST)
+
+        import_format = request.query_params.get("format") or guess_format(upload.name)
+        if import_format not in IMPORT_FORMATS:
+            return Response({"error": "Invalid format. Please use ndjson or csv."}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = import_todos(upload.file, import_format, request.user.id)
+        if "fatal_error" in report:  # The rows before it were imported: the report says how many
+            return Response(report, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_200_OK)
+
+
+# Class-based view for delta sync
+class TodoChangesView(APIView):
+    """
+    To sync changes===>http://127.0.0.1:8000/api/todos/changes/?since=<cursor>&limit=100
+
+    Returns the authenticated user's todos created or updated after the cursor and the ids
+    of those deleted since, with the cursor to pass as ?since= next time. Without ?since=
+    it returns every todo (page by page while has_more is true). The work and the payload
+    grow with the number of changes, not with the size of the list (see todos.sync).
+
+    Response: {"todos": [...], "deleted": [ids], "cursor": "...", "has_more": false}
+    A cursor older than TODO_SYNC["TOMBSTONE_TTL_DAYS"] gets 410 Gone: sync again without one.
+    """
+    authentication_classes = [StatelessClaimsJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        config = settings.TODO_SYNC
+        try:
+            limit = min(max(int(request.query_params.get("limit", config["PAGE_SIZE"])), 1), config["MAX_PAGE_SIZE"])
+        except ValueError:
+            return Response({"error": "Invalid limit."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            changes = changes_since(request.user.id, request.query_params.get("since", ""), limit)
+        except InvalidCursor:
+            return Response({"error": "Invalid cursor."}, status=status.HTTP_400_BAD_REQUEST)
+        except CursorExpired as e:
+            return Response({"error": str(e)}, status=status.HTTP_410_GONE)
+
+        with measure_serialization():
+            changes["todos"] = TodoSerializer(changes["todos"], many=True).data
+        return Response(changes, status=status.HTTP_200_OK)
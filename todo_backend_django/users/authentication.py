@@ -0,0 +1,116 @@
+from django.contrib.auth import get_user_model  # Used to lazily load the real user row
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication  # Validates the Bearer token
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from middleware.structured_logging import update_log_context
+from todo_backend.routers import set_current_user
+from .revocation import get_revocation_list
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that exposes the already-validated token claims to views.
+
+    The token signature is checked exactly once, here. Views read the claims from
+    request.auth (the validated token, e.g. request.auth.get('role')) or from
+    request.user.token_claims / request.user.role, instead of decoding the header again.
+    Tokens revoked by logout are rejected (see users.revocation).
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if get_revocation_list().is_revoked(validated_token.get('jti', '')):
+            raise InvalidToken({"detail": _("Token has been revoked"), "code": "token_revoked"})
+        return validated_token
+
+    def authenticate(self, request):
+        result = super().authenticate(request)  # None when there is no Bearer token
+        if result is None:
+            return None
+
+        user, validated_token = result
+        user.token_claims = validated_token.payload  # All claims of the validated token
+        user.role = validated_token.get('role', None)  # 'role' is embedded in the JWT during token generation
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        update_log_context(user_id=user_id)  # Tag this request's log records
+        set_current_user(user_id)  # Read-your-writes pinning of the user (see todo_backend.routers)
+        return user, validated_token
+
+
+class ClaimsTokenUser:
+    """
+    Lightweight user built from the validated token claims (user_id, username, role).
+
+    id, pk, username and role never touch the database, so views that only need the
+    user's id (e.g. Todo.objects.filter(user_id=request.user.id)) skip the users.User query.
+    Any other attribute (email, is_staff, has_perm(), ...) loads the real User row once
+    and delegates to it.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, token):
+        self.token = token
+        self._user = None  # The real User row, loaded on first non-claim access
+
+    @property
+    def id(self):
+        return get_user_model()._meta.pk.to_python(self.token[api_settings.USER_ID_CLAIM])
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def username(self):
+        if 'username' in self.token:
+            return self.token['username']
+        return self.get_user().username  # Older tokens were issued without the username claim
+
+    def get_username(self):
+        return self.username
+
+    def get_user(self):
+        """
+        Returns the real users.User row, loading it on first use.
+        """
+        if self._user is None:
+            self._user = get_user_model().objects.get(**{api_settings.USER_ID_FIELD: self.id})
+        return self._user
+
+    def __getattr__(self, attr):
+        # Only called for attributes that are not claims; private names never hit the database
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        return getattr(self.get_user(), attr)
+
+    def __eq__(self, other):
+        if isinstance(other, ClaimsTokenUser):
+            return self.id == other.id
+        if isinstance(other, get_user_model()):
+            return self.id == other.pk
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __str__(self):
+        return str(self.get_user())
+
+
+class StatelessClaimsJWTAuthentication(ClaimsJWTAuthentication):
+    """
+    ClaimsJWTAuthentication that returns a ClaimsTokenUser instead of loading the User row.
+
+    Opt in per view with authentication_classes. Like simplejwt's stateless backend, it
+    trusts the token until it expires, so a user deactivated after the token was issued
+    keeps access to these views until then.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        return ClaimsTokenUser(validated_token)
@@ -0,0 +1,231 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+from middleware.metrics import registry
+
+
+class HashingPoolBusy(Exception):
+    """
+    Raised when the hashing pool already has its maximum number of pending jobs and
+    none finished within the wait timeout. Views answer it with 503 + Retry-After.
+    """
+
+
+def _init_worker(settings_module):
+    """
+    Sets Django up in a freshly spawned pool process so the hashers can read PASSWORD_HASHERS.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    import django
+    django.setup()
+
+
+def _make_password(password):
+    return hashers.make_password(password)
+
+
+def _check_password(password, encoded):
+    return hashers.check_password(password, encoded)
+
+
+class PasswordHashingPool:
+    """
+    Runs the password hasher in a bounded pool of worker processes.
+
+    PBKDF2 holds the GIL for hundreds of milliseconds, so hashing on the request thread
+    stalls every other thread of the worker. Handing it to another process leaves the
+    request thread waiting on a future, with the GIL released, so list/read traffic on
+    the same worker keeps being served during a signup or login burst.
+
+    At most max_pending jobs are queued or running. Callers beyond that wait up to
+    wait_timeout seconds for a slot and then get HashingPoolBusy (backpressure) instead
+    of growing an unbounded queue. With workers=0 the hasher runs inline (tests, dev).
+    """
+
+    def __init__(self, workers, max_pending, wait_timeout):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.wait_timeout = wait_timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+        # Metrics
+        self.pending = 0  # Jobs queued or running right now
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0  # Time callers spent waiting for a free slot
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: forking a threaded server process can copy held locks into the child
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(os.environ.get("DJANGO_SETTINGS_MODULE", "todo_backend.settings"),),
+                )
+            return self._executor
+
+    def _acquire(self):
+        started = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.wait_timeout)
+        with self._lock:
+            self.total_wait_seconds += time.perf_counter() - started
+            if not acquired:
+                self.rejected += 1
+                raise HashingPoolBusy("Too many password hashing jobs are pending.")
+            self.pending += 1
+
+    def _release(self, future=None):
+        with self._lock:
+            self.pending -= 1
+            if future is not None:
+                self.completed += 1
+        self._slots.release()
+
+    def submit(self, function, *args):
+        """
+        Queues a hashing job and returns a concurrent.futures.Future for its result.
+
+        Raises:
+            HashingPoolBusy: If no slot frees up within wait_timeout.
+        """
+        self._acquire()
+        try:
+            future = self._get_executor().submit(function, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def make_password(self, password):
+        """
+        Pooled django.contrib.auth.hashers.make_password().
+        """
+        if not self.workers:
+            return hashers.make_password(password)
+        return self.submit(_make_password, password).result()
+
+    def make_passwords(self, passwords):
+        """
+        Hashes many passwords in parallel across the pool's processes, in input order.
+        """
+        if not self.workers:
+            return [hashers.make_password(password) for password in passwords]
+        futures = [self.submit(_make_password, password) for password in passwords]
+        return [future.result() for future in futures]
+
+    def check_password(self, password, encoded):
+        """
+        Pooled django.contrib.auth.hashers.check_password() (without the rehash setter).
+        """
+        if not self.workers:
+            return hashers.check_password(password, encoded)
+        return self.submit(_check_password, password, encoded).result()
+
+    async def amake_password(self, password):
+        """
+        Awaitable make_password() for async views; waiting for a slot happens off the event loop.
+        """
+        if not self.workers:
+            return hashers.make_password(password)
+        future = await asyncio.to_thread(self.submit, _make_password, password)
+        return await asyncio.wrap_future(future)
+
+    async def acheck_password(self, password, encoded):
+        """
+        Awaitable check_password() for async views.
+        """
+        if not self.workers:
+            return hashers.check_password(password, encoded)
+        future = await asyncio.to_thread(self.submit, _check_password, password, encoded)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self):
+        """
+        Stops the worker processes, if they were started.
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def stats(self):
+        """
+        Returns the pool metrics: queue depth, capacity and counters.
+        """
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "total_wait_seconds": self.total_wait_seconds,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    """
+    Returns the process-wide hashing pool configured by settings.PASSWORD_HASHING_POOL.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            config = settings.PASSWORD_HASHING_POOL
+            _pool = PasswordHashingPool(config["WORKERS"], config["MAX_PENDING"], config["WAIT_TIMEOUT"])
+        return _pool
+
+
+def render_hashing_metrics():
+    """
+    Returns the hashing pool's metrics for /metrics (nothing until the pool is first used).
+    """
+    if _pool is None:
+        return []
+    stats = _pool.stats()
+    lines = []
+    metrics = [
+        ("password_hashing_workers", "gauge", "Hashing processes of the pool.", "workers"),
+        ("password_hashing_max_pending", "gauge", "Jobs that may be queued or running at once.", "max_pending"),
+        ("password_hashing_pending", "gauge", "Hashing jobs queued or running.", "pending"),
+        ("password_hashing_completed_total", "counter", "Hashing jobs completed by the pool.", "completed"),
+        ("password_hashing_rejected_total", "counter", "Callers turned away because the pool stayed full.", "rejected"),
+        ("password_hashing_wait_seconds_total", "counter", "Time callers spent waiting for a free slot.", "total_wait_seconds"),
+    ]
+    for name, kind, help_text, key in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {stats[key]}")
+    return lines
+
+
+registry.add_collector(render_hashing_metrics)
+
+
+def verify_password(user, password):
+    """
+    Checks a user's password through the pool and upgrades the stored hash when the
+    hasher settings changed, like AbstractBaseUser.check_password() does.
+    """
+    pool = get_hashing_pool()
+    if not pool.check_password(password, user.password):
+        return False
+    hasher = hashers.identify_hasher(user.password)
+    if hashers.get_hasher().algorithm != hasher.algorithm or hasher.must_update(user.password):
+        user.password = pool.make_password(password)
+        user.save(update_fields=["password"])
+    return True
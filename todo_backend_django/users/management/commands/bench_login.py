@@ -0,0 +1,71 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.models import User, UserSettings
+from users.views import LoginView
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures logins per second on one core with the configured password hasher: the old "
+        "authenticate() + token serializer pipeline against the current LoginView."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20, help="Logins per measurement")
+
+    def handle(self, *args, **options):
+        # Every iteration logs the same user in: without this its username bucket would answer 429
+        no_login_throttle = {**settings.AUTH_THROTTLING, "RATES": {**settings.AUTH_THROTTLING["RATES"], "login": {}}}
+        try:
+            # The benchmark user is rolled back afterwards
+            with transaction.atomic(), override_settings(AUTH_THROTTLING=no_login_throttle):
+                self.run(options["iterations"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, iterations):
+        username, password = "bench-login-user", "bench-login-password"
+        user = User.objects.create_user(username=username, email="bench-login@example.com", password=password)
+        UserSettings.objects.create(user=user, role="user")
+        credentials = {"username": username, "password": password}
+
+        def old_pipeline():
+            # What LoginView did before: authenticate(), then TokenObtainPairSerializer.validate()
+            # authenticated again, then the role lookup and a second refresh token
+            authenticate(None, **credentials)
+            serializer = TokenObtainPairSerializer(data=credentials)
+            serializer.is_valid(raise_exception=True)
+            user = serializer.user
+            refresh = RefreshToken.for_user(user)
+            refresh["role"] = user.usersettings.role
+            return str(refresh), str(refresh.access_token)
+
+        factory = APIRequestFactory()
+        view = LoginView.as_view()
+
+        def login_view():
+            response = view(factory.post("/api/users/login/", credentials, format="json"))
+            if response.status_code != 200:
+                raise CommandError(f"LoginView answered {response.status_code}: {response.data}")
+
+        for label, login in (("authenticate + serializer", old_pipeline), ("LoginView", login_view)):
+            login()  # Warm up
+            started = time.perf_counter()
+            for _ in range(iterations):
+                login()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{label:26} {iterations / elapsed:8.1f} logins/s per core")
@@ -0,0 +1,38 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from todos.importer import IMPORT_FORMATS, guess_format
+from users.hashing import PasswordHashingPool
+from users.provisioning import provision_users
+
+
+class Command(BaseCommand):
+    help = "Creates users (with their role) from a CSV or NDJSON file, hashing passwords in parallel and inserting in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV (header: username,email,password,role) or NDJSON file")
+        parser.add_argument("--format", choices=IMPORT_FORMATS, help="File format (default: from the file extension)")
+        parser.add_argument("--batch-size", type=int, default=None, help="Users per bulk insert")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Hashing processes (0 hashes inline)")
+
+    def handle(self, *args, **options):
+        import_format = options["format"] or guess_format(options["path"])
+        if import_format is None:
+            raise CommandError("Cannot tell the file format, please pass --format.")
+
+        # A dedicated pool sized for the whole machine; callers wait for slots instead of being rejected
+        pool = PasswordHashingPool(options["workers"], max_pending=max(options["workers"], 1) * 4, wait_timeout=None)
+
+        def progress(report):
+            self.stdout.write(f"{report['processed']} rows read, {report['created']} users created, {report['failed']} failed")
+
+        try:
+            with open(options["path"], "rb") as binary_file:
+                report = provision_users(binary_file, import_format, pool, options["batch_size"], on_batch=progress)
+        finally:
+            pool.shutdown()
+
+        for error in report["errors"]:
+            self.stderr.write(f"row {error['row']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(f"Created {report['created']} of {report['processed']} users."))
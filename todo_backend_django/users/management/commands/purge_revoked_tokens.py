@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.models import RevokedToken
+
+
+class Command(BaseCommand):
+    help = "Deletes revocation rows of tokens that have expired anyway (run it periodically, e.g. from cron)."
+
+    def handle(self, *args, **options):
+        deleted, _ = RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired revocations."))
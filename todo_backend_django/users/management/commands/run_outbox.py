@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.outbox import deliver_batch
+
+
+class Command(BaseCommand):
+    help = "Delivers queued outbox emails in batches over one SMTP connection per batch, retrying failures with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Emails per batch (default: EMAIL_OUTBOX['BATCH_SIZE'])")
+        parser.add_argument("--once", action="store_true", help="Deliver what is due now and exit instead of polling")
+
+    def handle(self, *args, **options):
+        poll_interval = settings.EMAIL_OUTBOX["POLL_INTERVAL"]
+        while True:
+            report = deliver_batch(options["batch_size"])
+            if any(report.values()):
+                self.stdout.write(f"{report['sent']} sent, {report['retried']} to retry, {report['failed']} failed")
+                continue  # There may be more due emails: fetch the next batch right away
+            if options["once"]:
+                return
+            time.sleep(poll_interval)  # Nothing due
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-18 07:04
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='revokedtoken',
+            name='revoked_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
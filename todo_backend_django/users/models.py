@@ -1,5 +1,7 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from .hashing import get_hashing_pool
 
 # Custom User Manager
 class CustomUserManager(BaseUserManager):
@@ -9,7 +11,10 @@ class CustomUserManager(BaseUserManager):
             raise ValueError('The Email field must be set')
         email = self.normalize_email(email)
         user = self.model(username=username, email=email, **extra_fields)
-        user.set_password(password)  # Automatically hash the password
+        if password is None:
+            user.set_unusable_password()
+        else:
+            user.password = get_hashing_pool().make_password(password)  # Hash the password off the request thread
         user.save(using=self._db)
         return user
 
@@ -45,6 +50,10 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.email  # Display the user's email when the object is printed
 
  
+# Roles a user can be given (stored in UserSettings.role)
+VALID_ROLES = ["user", "admin"]  # Add other roles if needed
+
+
 # UserSettings model to store user settings such as roles
 class UserSettings(models.Model):
     user = models.OneToOneField(User, related_name='usersettings', on_delete=models.CASCADE)
@@ -57,3 +66,45 @@ class UserSettings(models.Model):
 
     def __str__(self):
         return f"{self.user.username}'s settings"  # String representation of UserSettings
+
+
+# RevokedToken model to store the JWTs invalidated by logout
+class RevokedToken(models.Model):
+    # The token's unique "jti" claim
+    jti = models.CharField(max_length=255, unique=True)
+    # When the token itself expires; after that the row is useless and can be purged
+    expires_at = models.DateTimeField(db_index=True)
+    # When the revocation was written; workers poll for new rows by it (see users.revocation)
+    revoked_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
+# OutboxEmail model: emails queued by request handlers and delivered by `manage.py run_outbox`
+class OutboxEmail(models.Model):
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'  # Gave up after EMAIL_OUTBOX['MAX_ATTEMPTS']
+    STATUS_CHOICES = [(PENDING, 'Pending'), (SENT, 'Sent'), (FAILED, 'Failed')]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)  # Empty means DEFAULT_FROM_EMAIL
+    to = models.JSONField(default=list)  # List of recipient addresses
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # The worker only picks rows whose time has come (retry backoff, or the claim of another worker)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's query: WHERE status = 'pending' AND next_attempt_at <= now ORDER BY next_attempt_at
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_attempt'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)}"
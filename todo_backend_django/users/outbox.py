@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+
+def queue_email(subject, body, to, from_email=None):
+    """
+    Queues an email for `manage.py run_outbox` instead of talking to the SMTP server
+    during the request. Call it inside the request's transaction: the email is only
+    sent if that transaction commits.
+
+    Returns:
+        OutboxEmail: The queued row.
+    """
+    return OutboxEmail.objects.create(subject=subject, body=body, to=list(to), from_email=from_email or "")
+
+
+def claim_batch(batch_size, lease_seconds):
+    """
+    Picks the due pending emails and pushes their next_attempt_at forward by the lease,
+    so other run_outbox workers skip them while this one sends. The rows are locked
+    only for this short transaction, never while talking to the SMTP server. If the
+    worker dies mid-batch, the emails become due again when the lease runs out.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxEmail.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        if emails:
+            OutboxEmail.objects.filter(id__in=[email.id for email in emails]).update(
+                next_attempt_at=now + timedelta(seconds=lease_seconds)
+            )
+    return emails
+
+
+def retry_delay(attempts, config):
+    """
+    Exponential backoff: BACKOFF_SECONDS after the first failure, doubling up to MAX_BACKOFF_SECONDS.
+    """
+    return min(config["BACKOFF_SECONDS"] * 2 ** (attempts - 1), config["MAX_BACKOFF_SECONDS"])
+
+
+def deliver_batch(batch_size=None, connection=None):
+    """
+    Sends one batch of due outbox emails over a single SMTP connection.
+
+    Every email is sent on its own so one bad address does not fail the batch. A failed
+    email is retried with exponential backoff and marked FAILED after MAX_ATTEMPTS.
+
+    Returns:
+        dict: {"sent": n, "retried": n, "failed": n}
+    """
+    config = settings.EMAIL_OUTBOX
+    emails = claim_batch(batch_size or config["BATCH_SIZE"], config["LEASE_SECONDS"])
+    report = {"sent": 0, "retried": 0, "failed": 0}
+    if not emails:
+        return report
+
+    connection = connection or get_connection()
+    try:
+        connection.open()  # One connection (and TLS handshake/login) for the whole batch
+    except Exception as e:
+        # The server is unreachable: count it as a failed attempt for every email
+        for email in emails:
+            report[record_failure(email, e, config)] += 1
+        return report
+
+    try:
+        for email in emails:
+            message = EmailMessage(email.subject, email.body, email.from_email or None, email.to, connection=connection)
+            try:
+                message.send()
+            except Exception as e:
+                report[record_failure(email, e, config)] += 1
+                continue
+            email.status = OutboxEmail.SENT
+            email.attempts += 1
+            email.sent_at = timezone.now()
+            email.save(update_fields=["status", "attempts", "sent_at"])
+            report["sent"] += 1
+    finally:
+        connection.close()
+    return report
+
+
+def record_failure(email, error, config):
+    """
+    Schedules a retry for an email that could not be sent, or gives up on it.
+
+    Returns:
+        str: "retried" or "failed"
+    """
+    email.attempts += 1
+    email.last_error = str(error)[:1000]
+    if email.attempts >= config["MAX_ATTEMPTS"]:
+        email.status = OutboxEmail.FAILED
+    else:
+        email.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay(email.attempts, config))
+    email.save(update_fields=["status", "attempts", "last_error", "next_attempt_at"])
+    return "failed" if email.status == OutboxEmail.FAILED else "retried"
@@ -0,0 +1,117 @@
+from django.db import transaction
+
+from todos.importer import iter_records  # Same incremental CSV/NDJSON reader as the todo import
+from .models import User, UserSettings, VALID_ROLES
+
+
+# Users inserted per bulk_create
+PROVISION_BATCH_SIZE = 500
+
+# Row errors kept in the report; further errors are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+def validate_user_record(record):
+    """
+    Applies RegisterView's field rules to one record.
+
+    Returns:
+        tuple: (values, error message); the message is None when the record is valid.
+    """
+    if record is None:
+        return None, "Row could not be parsed."
+    username, email, password = record.get("username"), record.get("email"), record.get("password")
+    role = record.get("role") or "user"
+    if not username or not email or not password:
+        return None, "Username, email, and password are required."
+    if role not in VALID_ROLES:
+        return None, f"Invalid role. Valid roles are {VALID_ROLES}."
+    return {"username": username, "email": User.objects.normalize_email(email), "password": password, "role": role}, None
+
+
+def provision_batch(batch, pool, report):
+    """
+    Inserts one batch of validated records: two set-based duplicate checks, parallel
+    hashing, then one bulk_create for the users and one for their settings.
+    """
+    usernames = [values["username"] for _, values in batch]
+    emails = [values["email"] for _, values in batch]
+    taken_usernames = set(User.objects.filter(username__in=usernames).values_list("username", flat=True))
+    taken_emails = set(User.objects.filter(email__in=emails).values_list("email", flat=True))
+
+    accepted = []
+    for row_number, values in batch:
+        if values["username"] in taken_usernames:
+            error = "Username already exists."
+        elif values["email"] in taken_emails:
+            error = "Email already exists."
+        else:
+            taken_usernames.add(values["username"])  # Also catches duplicates within the file
+            taken_emails.add(values["email"])
+            accepted.append(values)
+            continue
+        record_error(report, row_number, error)
+
+    if not accepted:
+        return
+
+    hashed_passwords = pool.make_passwords([values["password"] for values in accepted])
+    users = [
+        User(username=values["username"], email=values["email"], password=hashed)
+        for values, hashed in zip(accepted, hashed_passwords)
+    ]
+
+    with transaction.atomic():
+        User.objects.bulk_create(users)
+        # MySQL does not return ids from a multi-row INSERT, so read them back in one query
+        user_ids = dict(User.objects.filter(username__in=[user.username for user in users]).values_list("username", "id"))
+        UserSettings.objects.bulk_create([
+            UserSettings(user_id=user_ids[values["username"]], role=values["role"]) for values in accepted
+        ])
+    report["created"] += len(accepted)
+
+
+def record_error(report, row_number, error):
+    report["failed"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append({"row": row_number, "error": error})
+
+
+def provision_users(binary_file, import_format, pool, batch_size=None, on_batch=None):
+    """
+    Creates users and their UserSettings from a CSV or NDJSON file in batches.
+
+    Columns/keys: username, email, password and optionally role (default "user").
+
+    Args:
+        binary_file: A binary file object.
+        import_format (str): "csv" or "ndjson".
+        pool (PasswordHashingPool): Pool that hashes each batch's passwords in parallel.
+        batch_size (int): Users per batch (default PROVISION_BATCH_SIZE).
+        on_batch (callable): Called with the running report after every batch.
+
+    Returns:
+        dict: The report (processed, created, failed, errors).
+    """
+    batch_size = batch_size or PROVISION_BATCH_SIZE
+    report = {"processed": 0, "created": 0, "failed": 0, "errors": []}
+    batch = []
+
+    for row_number, record in iter_records(binary_file, import_format):
+        report["processed"] += 1
+        values, error = validate_user_record(record)
+        if error:
+            record_error(report, row_number, error)
+            continue
+        batch.append((row_number, values))
+        if len(batch) >= batch_size:
+            provision_batch(batch, pool, report)
+            batch.clear()
+            if on_batch is not None:
+                on_batch(report)
+
+    if batch:
+        provision_batch(batch, pool, report)
+        if on_batch is not None:
+            on_batch(report)
+    return report
@@ -0,0 +1,192 @@
+import hashlib
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import RevokedToken
+
+
+# Cache key whose value changes whenever any worker revokes a token
+GENERATION_KEY = "users:revocation:generation"
+
+# Cache backends whose data is private to one process
+LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def cache_is_shared():
+    """
+    Whether the default cache is seen by every worker process (Redis, Memcached, database...).
+    """
+    return settings.CACHES["default"]["BACKEND"] not in LOCAL_CACHE_BACKENDS
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings: no false negatives, a bounded false positive rate.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))  # Bits
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))  # Double hashing
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class RevocationList:
+    """
+    In-process view of the RevokedToken table, built so that checking a valid token
+    almost never touches the database.
+
+    - A Bloom filter holds every revoked jti. A jti it does not contain is definitely not
+      revoked, which is the answer for nearly every request.
+    - A small LRU remembers the database answer for jtis the filter flags, so a false
+      positive costs one query per process, not one per request.
+    - Revocations made by other workers are picked up when the generation value in the
+      shared cache changes, by loading only the rows added since the last sync. With
+      poll_interval set (for a cache private to each process, where other workers never
+      see the generation change), those rows are polled from the table every
+      poll_interval seconds instead.
+    - "Added since the last sync" means revoked_at at or after the newest one seen, minus
+      commit_margin seconds. Ids and timestamps are taken before commit, so a row can
+      become visible after rows written later than it; the margin reads back far enough to
+      catch it, and jtis already loaded in that window are skipped. The table is always
+      read on the primary: a lagging replica would hide the newest revocations.
+    - The filter is rebuilt from the unexpired rows every REBUILD_INTERVAL, so revocations
+      of expired tokens drop out of it.
+    """
+
+    def __init__(self, capacity, error_rate, lru_size, rebuild_interval, poll_interval=None, commit_margin=60):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.lru_size = lru_size
+        self.rebuild_interval = rebuild_interval
+        self.poll_interval = poll_interval
+        self.commit_margin = timedelta(seconds=commit_margin)
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()  # jti -> revoked?
+        self._bloom = None  # Built on first use
+        self._built_at = 0.0
+        self._watermark = None  # Newest revoked_at loaded into the filter
+        self._recent = {}  # jti -> revoked_at of the rows loaded within commit_margin of the watermark
+        self._generation = None  # Last generation seen in the cache
+        self._polled_at = 0.0
+
+    def _revoked_tokens(self):
+        return RevokedToken.objects.using(settings.DATABASE_PRIMARY)
+
+    def _rebuild(self):
+        self._bloom = BloomFilter(self.capacity, self.error_rate)
+        self._lru.clear()
+        self._recent.clear()
+        self._watermark = timezone.now()  # Later syncs start from here even if no row is loaded
+        self._load(self._revoked_tokens().filter(expires_at__gt=self._watermark))
+        self._built_at = time.monotonic()
+
+    def _load_new(self):
+        self._load(self._revoked_tokens().filter(revoked_at__gte=self._watermark - self.commit_margin))
+
+    def _load(self, revoked_tokens):
+        for jti, revoked_at in revoked_tokens.values_list("jti", "revoked_at"):
+            if jti in self._recent:
+                continue  # Loaded by an earlier sync that overlapped this one
+            self._bloom.add(jti)
+            self._remember(jti, True)
+            self._recent[jti] = revoked_at
+            self._watermark = max(self._watermark, revoked_at)
+        cutoff = self._watermark - self.commit_margin
+        self._recent = {jti: revoked_at for jti, revoked_at in self._recent.items() if revoked_at >= cutoff}
+
+    def _remember(self, jti, revoked):
+        self._lru[jti] = revoked
+        self._lru.move_to_end(jti)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def _sync(self):
+        polling = self.poll_interval is not None
+        generation = None if polling else cache.get(GENERATION_KEY)
+        now = time.monotonic()
+        with self._lock:
+            if self._bloom is None or now - self._built_at > self.rebuild_interval:
+                self._rebuild()
+                self._generation, self._polled_at = generation, now
+            elif polling and now - self._polled_at >= self.poll_interval:
+                self._load_new()  # An index range over the last commit_margin: cheap when nothing is new
+                self._polled_at = now
+            elif not polling and generation != self._generation:
+                self._load_new()
+                self._generation = generation
+
+    def is_revoked(self, jti):
+        """
+        Returns True if the token with this jti was revoked.
+        """
+        self._sync()
+        with self._lock:
+            if jti not in self._bloom:
+                return False  # The common case: no database access
+            if jti in self._lru:
+                self._lru.move_to_end(jti)
+                return self._lru[jti]
+        revoked = self._revoked_tokens().filter(jti=jti, expires_at__gt=timezone.now()).exists()  # Possible false positive
+        with self._lock:
+            self._remember(jti, revoked)
+        return revoked
+
+    def revoke(self, tokens):
+        """
+        Revokes validated simplejwt tokens (access or refresh) until they expire.
+        """
+        rows = [
+            RevokedToken(jti=token["jti"], expires_at=datetime.fromtimestamp(token["exp"], tz=dt_timezone.utc))
+            for token in tokens
+        ]
+        RevokedToken.objects.bulk_create(rows, ignore_conflicts=True)
+        self._sync()  # Make sure the filter exists before adding to it
+        with self._lock:
+            for row in rows:
+                self._bloom.add(row.jti)
+                self._remember(row.jti, True)
+        cache.set(GENERATION_KEY, uuid.uuid4().hex, None)  # Tell the other workers to load the new rows
+
+
+_revocation_list = None
+_revocation_list_lock = threading.Lock()
+
+
+def get_revocation_list():
+    """
+    Returns the process-wide RevocationList configured by settings.TOKEN_REVOCATION.
+
+    Without a shared cache the list polls the table for other workers' revocations.
+    """
+    global _revocation_list
+    with _revocation_list_lock:
+        if _revocation_list is None:
+            config = settings.TOKEN_REVOCATION
+            _revocation_list = RevocationList(
+                config["BLOOM_CAPACITY"], config["BLOOM_ERROR_RATE"], config["LRU_SIZE"], config["REBUILD_INTERVAL"],
+                poll_interval=None if cache_is_shared() else config["POLL_INTERVAL"], commit_margin=config["COMMIT_MARGIN"],
+            )
+        return _revocation_list
@@ -1,7 +1,6 @@
 from rest_framework import serializers  # Importing serializers for API input/output handling
 from .models import User, UserSettings  # Importing the User model
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from rest_framework_simplejwt.tokens import RefreshToken
 
 
 
@@ -24,31 +23,22 @@ class UserSerializer(serializers.ModelSerializer):
         return User.objects.create(**validated_data)  
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
-    def validate(self, attrs):
-        # Call the parent validate method to get the token and user
-        data = super().validate(attrs)
+    @classmethod
+    def get_token(cls, user):
+        """
+        Issues the refresh token with the custom claims; the access token derived from it inherits them.
 
-        # Add custom claims
-        user = self.user
+        Called once per login (by validate() here and by LoginView). Load the user with
+        select_related('usersettings') to read the role without an extra query.
+        """
+        refresh = super().get_token(user)
 
-        
         try:
             role = user.usersettings.role
-
-           
-            
         except UserSettings.DoesNotExist:
             role = "Unknown"  # Default role if UserSettings is missing
-        
-        # Create the refresh token for the user
-        refresh = RefreshToken.for_user(user)
 
         # Add the role to the token payload
         refresh['role'] = role  # Embed role into the payload
-
-        # Add the tokens to the response
-        data['refresh'] = str(refresh)
-        data['access'] = str(refresh.access_token)
-
-
-        return data
+        refresh['username'] = user.username  # Lets StatelessClaimsJWTAuthentication answer request.user.username without a query
+        return refresh
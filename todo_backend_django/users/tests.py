@@ -1,3 +1,391 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.contrib.auth.hashers import check_password, make_password
+from django.conf import settings
+from django.test import TestCase, RequestFactory, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from middleware.queries import RepeatedQueryTestMixin
+from .hashing import HashingPoolBusy, PasswordHashingPool, get_hashing_pool
+from .authentication import ClaimsJWTAuthentication, StatelessClaimsJWTAuthentication
+from .models import OutboxEmail, RevokedToken, User, UserSettings
+from .outbox import deliver_batch, queue_email
+from .throttling import BucketStore, TokenBucket, get_bucket_store
+from .revocation import GENERATION_KEY, BloomFilter, RevocationList, get_revocation_list
+
+
+def make_user(username, role="user"):
+    """Creates a user with its settings row, like RegisterView does."""
+    user = User.objects.create_user(username=username, email=f"{username}@example.com", password="pass12345")
+    UserSettings.objects.create(user=user, role=role)
+    return user
+
+
+def access_token_for(user, role="user"):
+    """Returns an access token with the role claim embedded, like CustomTokenObtainPairSerializer does."""
+    refresh = RefreshToken.for_user(user)
+    refresh["role"] = role
+    refresh["username"] = user.username
+    return str(refresh.access_token)
+
+
+class ClaimsJWTAuthenticationTests(TestCase):
+    def test_claims_are_attached_after_a_single_signature_check(self):
+        user = make_user("carol", role="admin")
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {access_token_for(user, 'admin')}")
+
+        with mock.patch.object(TokenBackend, "decode", autospec=True, side_effect=TokenBackend.decode) as decode:
+            authenticated_user, token = ClaimsJWTAuthentication().authenticate(request)
+
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual(token.get("role"), "admin")
+        self.assertEqual(authenticated_user.role, "admin")
+        self.assertEqual(str(authenticated_user.token_claims["user_id"]), str(user.id))
+
+    def test_requests_without_a_token_are_left_anonymous(self):
+        self.assertIsNone(ClaimsJWTAuthentication().authenticate(RequestFactory().get("/")))
+
+
+class StatelessClaimsJWTAuthenticationTests(TestCase):
+    def test_claims_are_served_without_a_query_and_other_fields_load_lazily(self):
+        user = make_user("gina")
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {access_token_for(user)}")
+        get_revocation_list().is_revoked("")  # Build the revocation filter outside the count
+
+        with self.assertNumQueries(0):
+            token_user, _ = StatelessClaimsJWTAuthentication().authenticate(request)
+            self.assertEqual(token_user.id, user.id)
+            self.assertEqual(token_user.username, "gina")
+            self.assertEqual(token_user.role, "user")
+            self.assertTrue(token_user.is_authenticated)
+
+        with self.assertNumQueries(1):  # First non-claim attribute loads the row, later ones reuse it
+            self.assertEqual(token_user.email, "gina@example.com")
+            self.assertFalse(token_user.is_staff)
+        self.assertEqual(token_user, user)
+
+
+class LogoutTests(TestCase):
+    def setUp(self):
+        self.user = make_user("ivan")
+        self.refresh = RefreshToken.for_user(self.user)
+        self.access = str(self.refresh.access_token)
+        self.client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {self.access}"
+
+    def test_logout_revokes_the_access_and_refresh_tokens(self):
+        response = self.client.post("/api/users/logout/", {"refresh": str(self.refresh)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(RevokedToken.objects.count(), 2)
+
+        response = self.client.get("/api/todos/")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["code"], "token_revoked")
+        self.assertTrue(get_revocation_list().is_revoked(self.refresh["jti"]))
+
+    def test_refresh_token_of_another_user_is_rejected(self):
+        other = RefreshToken.for_user(make_user("judy"))
+        response = self.client.post("/api/users/logout/", {"refresh": str(other)})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(RevokedToken.objects.exists())
+
+    def test_valid_tokens_are_checked_without_a_query(self):
+        get_revocation_list().is_revoked("")  # Build the filter
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {self.access}")
+        with self.assertNumQueries(0):
+            StatelessClaimsJWTAuthentication().authenticate(request)
+
+    def test_revocations_by_other_workers_are_picked_up(self):
+        revocation_list = RevocationList(1000, 0.01, 100, 3600)
+        revocation_list.is_revoked("")
+        RevokedToken.objects.create(jti=self.refresh["jti"], expires_at=timezone.now() + timedelta(days=1))
+        self.assertFalse(revocation_list.is_revoked(self.refresh["jti"]))  # Generation unchanged: not seen yet
+
+        cache.set(GENERATION_KEY, "another worker")
+        self.assertTrue(revocation_list.is_revoked(self.refresh["jti"]))
+
+    def test_revocations_are_polled_when_the_cache_is_not_shared(self):
+        worker_a = RevocationList(1000, 0.01, 100, 3600, poll_interval=0)
+        worker_b = RevocationList(1000, 0.01, 100, 3600, poll_interval=0)
+        worker_b.is_revoked("")
+        # Per-process caches: the generation written by worker_a never reaches worker_b
+        with mock.patch("users.revocation.cache", DummyCache("revocation", {})):
+            worker_a.revoke([self.refresh])
+            self.assertTrue(worker_b.is_revoked(self.refresh["jti"]))
+
+    def test_revocations_committed_out_of_order_are_polled(self):
+        revocation_list = RevocationList(1000, 0.01, 100, 3600, poll_interval=0)
+        expires_at = timezone.now() + timedelta(days=1)
+        seen = RevokedToken.objects.create(id=100, jti="seen", expires_at=expires_at)
+        revocation_list.is_revoked("")
+        # Took its id and timestamp before "seen" but committed after the list loaded it
+        RevokedToken.objects.create(
+            id=50, jti=self.refresh["jti"], expires_at=expires_at, revoked_at=seen.revoked_at - timedelta(seconds=5)
+        )
+        self.assertTrue(revocation_list.is_revoked(self.refresh["jti"]))
+
+    def test_local_cache_makes_the_process_list_poll(self):
+        with mock.patch("users.revocation._revocation_list", None):
+            self.assertEqual(get_revocation_list().poll_interval, settings.TOKEN_REVOCATION["POLL_INTERVAL"])
+
+    def test_purge_deletes_only_expired_revocations(self):
+        RevokedToken.objects.create(jti="old", expires_at=timezone.now() - timedelta(minutes=1))
+        RevokedToken.objects.create(jti="new", expires_at=timezone.now() + timedelta(minutes=1))
+        call_command("purge_revoked_tokens", stdout=io.StringIO())
+        self.assertEqual(list(RevokedToken.objects.values_list("jti", flat=True)), ["new"])
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f"jti-{i}")
+        self.assertTrue(all(f"jti-{i}" in bloom for i in range(1000)))
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class LoginTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_bucket_store().clear()  # Throttle buckets outlive the test's database
+        self.user = make_user("hana", role="admin")
+
+    def test_login_verifies_the_password_once_in_a_single_query(self):
+        self.assertEqual(get_hashing_pool().workers, 0)  # The test runner hashes inline
+        with self.assertNumQueries(1), mock.patch("users.hashing.hashers.check_password", wraps=check_password) as check:
+            response = self.client.post("/api/users/login/", {"username": "hana", "password": "pass12345"})
+
+        self.assertEqual(response.status_code, 200)
+        check.assert_called_once()
+        token = AccessToken(response.json()["access_token"])
+        self.assertEqual((token["role"], token["username"]), ("admin", "hana"))
+
+    def test_wrong_password_and_unknown_user_are_rejected(self):
+        for username, password in (("hana", "wrong"), ("nobody", "pass12345")):
+            response = self.client.post("/api/users/login/", {"username": username, "password": password})
+            self.assertEqual(response.status_code, 401)
+
+    def test_inactive_user_cannot_log_in(self):
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        response = self.client.post("/api/users/login/", {"username": "hana", "password": "pass12345"})
+        self.assertEqual(response.status_code, 401)
+
+
+THROTTLE_RATES = {
+    "login": {"ip": "5/min", "username": "2/min"},
+    "password_reset": {"ip": "5/min", "username": "1/hour"},
+}
+
+
+@override_settings(AUTH_THROTTLING={**settings.AUTH_THROTTLING, "RATES": THROTTLE_RATES})
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_bucket_store().clear()
+        make_user("kate")
+
+    def login(self, username, ip="10.0.0.1"):
+        return self.client.post("/api/users/login/", {"username": username, "password": "wrong"}, REMOTE_ADDR=ip)
+
+    def test_username_bucket_rejects_before_any_query_or_hashing(self):
+        self.assertEqual(self.login("kate").status_code, 401)
+        self.assertEqual(self.login("KATE", ip="10.0.0.2").status_code, 401)  # Same account from another IP
+
+        with self.assertNumQueries(0), mock.patch("users.hashing.hashers") as hashers:
+            response = self.login("kate", ip="10.0.0.3")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+        self.assertFalse(hashers.mock_calls)
+
+    def test_ip_bucket_limits_spraying_many_usernames(self):
+        statuses = [self.login(f"user{i}").status_code for i in range(6)]
+        self.assertEqual(statuses, [401] * 5 + [429])
+        self.assertEqual(self.login("kate", ip="10.0.0.9").status_code, 401)  # Other clients are unaffected
+
+    def test_rotating_forwarded_for_header_does_not_reset_the_ip_bucket(self):
+        statuses = [
+            self.client.post(
+                "/api/users/login/", {"username": f"user{i}", "password": "wrong"},
+                REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR=f"203.0.113.{i}",
+            ).status_code
+            for i in range(6)
+        ]
+        self.assertEqual(statuses, [401] * 5 + [429])
+
+    def test_array_body_is_throttled_by_ip_and_rejected_by_the_view(self):
+        for path in ("/api/users/login/", "/api/users/password-reset/"):
+            with self.subTest(path=path):
+                response = self.client.post(path, [], content_type="application/json")
+                self.assertEqual(response.status_code, 400)
+
+    def test_password_reset_is_throttled_per_email(self):
+        first = self.client.post("/api/users/password-reset/", {"email": "kate@example.com"})
+        second = self.client.post("/api/users/password-reset/", {"email": "kate@example.com"})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 429)
+
+    def test_buckets_are_shared_between_workers_through_the_cache(self):
+        worker_a, worker_b = BucketStore(100, True, 0), BucketStore(100, True, 0)
+        key = ("login", "username", "kate")
+        self.assertTrue(worker_a.consume(key, 2, 0.001)[0])
+        self.assertTrue(worker_a.consume(key, 2, 0.001)[0])
+        # worker_b's first use adopts the shared level, so its next request is refused
+        worker_b.consume(key, 2, 0.001)
+        self.assertFalse(worker_b.consume(key, 2, 0.001)[0])
+
+    def test_bucket_refills_over_time(self):
+        bucket = TokenBucket(1, 0.5, now=100.0)
+        self.assertTrue(bucket.consume(100.0))
+        self.assertFalse(bucket.consume(100.5))
+        self.assertAlmostEqual(bucket.wait(), 1.5)
+        self.assertTrue(bucket.consume(102.0))
+
+
+class OutboxTests(TestCase):
+    # The test runner swaps in the locmem email backend, so no mail server is needed
+
+    def setUp(self):
+        cache.clear()
+        get_bucket_store().clear()
+        make_user("liam")
+
+    def test_password_reset_only_queues_the_email(self):
+        response = self.client.post("/api/users/password-reset/", {"email": "liam@example.com"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+
+        queued = OutboxEmail.objects.get()
+        self.assertEqual(queued.to, ["liam@example.com"])
+        self.assertIn(response.json()["reset_link"], queued.body)
+
+        call_command("run_outbox", "--once", stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["liam@example.com"])
+        self.assertEqual(OutboxEmail.objects.get().status, OutboxEmail.SENT)
+
+    def test_a_batch_reuses_one_connection(self):
+        for i in range(3):
+            queue_email("Hi", "body", [f"user{i}@example.com"])
+        connection = get_connection()
+        with mock.patch.object(connection, "open", wraps=connection.open) as opened:
+            report = deliver_batch(connection=connection)
+        self.assertEqual(report, {"sent": 3, "retried": 0, "failed": 0})
+        self.assertEqual(opened.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_failures_are_retried_with_backoff_then_given_up(self):
+        email = queue_email("Hi", "body", ["liam@example.com"])
+        with mock.patch("users.outbox.EmailMessage.send", side_effect=OSError("connection reset")):
+            self.assertEqual(deliver_batch(), {"sent": 0, "retried": 1, "failed": 0})
+            email.refresh_from_db()
+            self.assertEqual(email.attempts, 1)
+            self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=20))
+            self.assertEqual(deliver_batch(), {"sent": 0, "retried": 0, "failed": 0})  # Not due yet
+
+            for attempt in range(2, settings.EMAIL_OUTBOX["MAX_ATTEMPTS"] + 1):
+                OutboxEmail.objects.update(next_attempt_at=timezone.now())
+                deliver_batch()
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.FAILED)
+        self.assertEqual(email.last_error, "connection reset")
+
+
+class RepeatedQueryTests(RepeatedQueryTestMixin, TestCase):
+    def test_user_settings_listing_needs_select_related(self):
+        for i in range(6):
+            make_user(f"member{i}")
+
+        # UserSettings.__str__ reads self.user: one users.User query per row without a join
+        with self.assertRaises(AssertionError):
+            with self.assertNoRepeatedQueries():
+                [str(user_settings) for user_settings in UserSettings.objects.all()]
+        with self.assertNoRepeatedQueries():
+            [str(user_settings) for user_settings in UserSettings.objects.select_related("user")]
+
+    def test_login_and_logout_run_no_repeated_queries(self):
+        make_user("rita")
+        with self.assertNoRepeatedQueries(threshold=2):
+            tokens = self.client.post("/api/users/login/", {"username": "rita", "password": "pass12345"}).json()
+            self.client.post(
+                "/api/users/logout/", {"refresh": tokens["refresh_token"]},
+                HTTP_AUTHORIZATION=f"Bearer {tokens['access_token']}",
+            )
+
+
+class PasswordHashingPoolTests(TestCase):
+    def test_hashes_in_worker_processes_sync_and_async(self):
+        pool = PasswordHashingPool(workers=1, max_pending=4, wait_timeout=5)
+        self.addCleanup(pool.shutdown)
+
+        encoded = pool.make_password("secret")
+        self.assertTrue(check_password("secret", encoded))
+        self.assertTrue(pool.check_password("secret", encoded))
+        self.assertFalse(async_to_sync(pool.acheck_password)("wrong", encoded))
+        self.assertTrue(check_password("other", async_to_sync(pool.amake_password)("other")))
+        self.assertEqual(pool.stats()["completed"], 4)
+        self.assertEqual(pool.stats()["pending"], 0)
+
+    def test_full_pool_rejects_instead_of_queueing(self):
+        pool = PasswordHashingPool(workers=1, max_pending=1, wait_timeout=0.01)
+        pool._slots.acquire()  # Another request holds the only slot
+
+        with self.assertRaises(HashingPoolBusy):
+            pool.submit(make_password, "secret")
+        self.assertEqual(pool.stats()["rejected"], 1)
+
+    def test_register_answers_503_when_the_pool_is_saturated(self):
+        with mock.patch.object(PasswordHashingPool, "make_password", side_effect=HashingPoolBusy):
+            response = self.client.post("/api/users/register/", {"username": "ivan", "email": "ivan@example.com", "password": "pw"})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertFalse(User.objects.filter(username="ivan").exists())
+
+
+class ProvisionUsersTests(TestCase):
+    def provision(self, content, suffix, **options):
+        with tempfile.NamedTemporaryFile("w", suffix=suffix, delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.remove, f.name)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command("provision_users", f.name, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_csv_users_are_created_with_settings_and_duplicates_reported(self):
+        make_user("taken")
+        content = (
+            "username,email,password,role\n"
+            "anna,anna@example.com,pw1,admin\n"
+            "ben,ben@example.com,pw2,\n"
+            "taken,new@example.com,pw3,user\n"
+            "anna2,anna@example.com,pw4,user\n"
+            "carl,carl@example.com,pw5,superhero\n"
+        )
+        stdout, stderr = self.provision(content, ".csv", workers=0, batch_size=2)
+
+        self.assertIn("Created 2 of 5 users.", stdout)
+        self.assertIn("row 3: Username already exists.", stderr)
+        self.assertIn("row 4: Email already exists.", stderr)
+        self.assertIn("row 5: Invalid role.", stderr)
+        anna = User.objects.select_related("usersettings").get(username="anna")
+        self.assertEqual(anna.usersettings.role, "admin")
+        self.assertTrue(anna.check_password("pw1"))
+        self.assertEqual(User.objects.get(username="ben").usersettings.role, "user")
+
+    def test_ndjson_passwords_are_hashed_in_worker_processes(self):
+        content = "\n".join(json.dumps({"username": f"u{i}", "email": f"u{i}@example.com", "password": f"pw{i}"}) for i in range(3))
+        stdout, _ = self.provision(content, ".ndjson", workers=1)
+
+        self.assertIn("Created 3 of 3 users.", stdout)
+        self.assertTrue(User.objects.get(username="u2").check_password("pw2"))
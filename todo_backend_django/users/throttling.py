@@ -0,0 +1,206 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+from .revocation import cache_is_shared
+
+
+logger = logging.getLogger(__name__)
+
+
+# Seconds per rate period, for rates written like DRF's ("5/min", "100/hour")
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """
+    Turns "5/min" into (capacity, tokens per second): a bucket of 5 that refills over a minute.
+    """
+    count, period = rate.split("/")
+    count = int(count)
+    return count, count / PERIODS[period[0]]
+
+
+class TokenBucket:
+    """
+    A bucket of `capacity` tokens refilled at `rate` tokens per second; every request takes one.
+    """
+
+    def __init__(self, capacity, rate, now):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = float(capacity)
+        self.updated = now
+        self.pending = 0  # Tokens taken here since the last shared-cache sync
+        self.synced_at = 0.0  # Never: a new bucket picks up the shared level on first use
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, now):
+        self.refill(now)
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        self.pending += 1
+        return True
+
+    def wait(self):
+        """
+        Seconds until the next token is available.
+        """
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class BucketStore:
+    """
+    The token buckets of one process, keyed by (scope, kind, value).
+
+    Checking a bucket is a dict lookup and some arithmetic under a lock, so a rejected
+    request costs next to nothing. The store keeps at most max_keys buckets and drops the
+    least recently used, so a burst from many IPs cannot grow it without bound (a dropped
+    bucket simply starts full again).
+
+    With shared=True each bucket is merged with a copy in the shared cache every
+    sync_interval seconds: the cached level is refilled, the tokens this process took since
+    the last sync are subtracted, and the result is written back and adopted locally. The
+    workers then throttle against roughly one budget per key. Concurrent syncs of the same
+    key can overwrite each other, so the shared limit is approximate; each process still
+    enforces its own bucket exactly.
+    """
+
+    def __init__(self, max_keys, shared, sync_interval):
+        self.max_keys = max_keys
+        self.shared = shared
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def _get(self, key, capacity, rate, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(capacity, rate, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def consume(self, key, capacity, rate):
+        """
+        Takes one token from the bucket for key.
+
+        Returns:
+            tuple: (allowed, seconds to wait for the next token)
+        """
+        now = time.time()  # Wall clock, so levels written by other processes are comparable
+        with self._lock:
+            bucket = self._get(key, capacity, rate, now)
+            allowed = bucket.consume(now)
+            due = self.shared and now - bucket.synced_at >= self.sync_interval
+            if due:
+                bucket.synced_at = now  # Only one thread syncs this bucket
+            wait = bucket.wait()
+        if due:
+            self._sync(key, bucket, now)
+        return allowed, wait
+
+    def _sync(self, key, bucket, now):
+        cache_key = "users:throttle:" + hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+        shared = cache.get(cache_key)  # (tokens, updated) written by any worker
+        with self._lock:
+            bucket.refill(now)
+            if shared is not None:
+                tokens, updated = shared
+                tokens = min(bucket.capacity, tokens + (now - updated) * bucket.rate)
+                bucket.tokens = max(0.0, tokens - bucket.pending)
+            bucket.pending = 0
+            state = (bucket.tokens, now)
+        # Keep it until the bucket would be full again anyway
+        cache.set(cache_key, state, int(bucket.capacity / bucket.rate) + 1)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_bucket_store():
+    """
+    Returns the process-wide BucketStore configured by settings.AUTH_THROTTLING.
+
+    SHARED_CACHE is ignored (with a warning) when the cache is private to the process:
+    syncing through it would cost cache round trips and share nothing.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            config = settings.AUTH_THROTTLING
+            shared = config["SHARED_CACHE"]
+            if shared and not cache_is_shared():
+                logger.warning(
+                    "AUTH_THROTTLING['SHARED_CACHE'] needs a cache shared by the workers; %s is per process, "
+                    "so each worker throttles on its own.", settings.CACHES["default"]["BACKEND"],
+                    extra={"event": "users.throttling_cache_not_shared"},
+                )
+                shared = False
+            _store = BucketStore(config["MAX_KEYS"], shared, config["SYNC_INTERVAL"])
+        return _store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    DRF throttle with one token bucket per client IP and one per account identifier.
+
+    DRF runs throttles in APIView.initial(), before the handler, so a rejected request is
+    answered with 429 + Retry-After without touching the database or the password hasher.
+    Rates come from settings.AUTH_THROTTLING["RATES"][scope], e.g. {"ip": "20/min",
+    "username": "5/min"}; a missing kind is not throttled.
+    """
+
+    scope = None
+    ident_field = None  # Request field naming the account, throttled as "username"
+
+    def allow_request(self, request, view):
+        rates = settings.AUTH_THROTTLING["RATES"].get(self.scope, {})
+        keys = [("ip", self.get_ident(request))]
+        # A JSON array or scalar body has no account field: throttle by IP and let the view answer 400
+        data = request.data if isinstance(request.data, dict) else {}
+        account = data.get(self.ident_field) if self.ident_field else None
+        if isinstance(account, str) and account.strip():
+            keys.append(("username", account.strip().lower()))
+
+        store = get_bucket_store()
+        self.wait_seconds = None
+        for kind, value in keys:
+            if kind not in rates:
+                continue
+            capacity, rate = parse_rate(rates[kind])
+            allowed, wait = store.consume((self.scope, kind, value), capacity, rate)
+            if not allowed:
+                self.wait_seconds = wait
+                return False
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginThrottle(TokenBucketThrottle):
+    scope = "login"
+    ident_field = "username"
+
+
+class PasswordResetThrottle(TokenBucketThrottle):
+    scope = "password_reset"
+    ident_field = "email"
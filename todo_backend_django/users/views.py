@@ -2,24 +2,41 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
+from django.contrib.auth.signals import user_login_failed
 from django.contrib.auth.hashers import make_password
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework.permissions import AllowAny
-from .models import User, UserSettings  # Import custom User model from your users app
+from .models import User, UserSettings, VALID_ROLES  # Import custom User model from your users app
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.contrib.sites.shortcuts import get_current_site
 from django.conf import settings
 from django.db import transaction  # Import transaction for atomic operations
 from .serializers import CustomTokenObtainPairSerializer
+from .hashing import HashingPoolBusy, get_hashing_pool, verify_password  # Password hashing in a process pool
+from .revocation import get_revocation_list  # JWT revocation list used by logout
+from .outbox import queue_email  # Emails are delivered by `manage.py run_outbox`
+from .throttling import LoginThrottle, PasswordResetThrottle  # Per-IP / per-account token buckets
 
 
 
 
+def busy_response():
+    """
+    Response for requests turned away because the password hashing pool is saturated.
+    """
+    return Response(
+        {"error": "The server is busy, please retry shortly."},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": "1"},
+    )
+
+
 # Register view (User registration)
 class RegisterView(APIView):
     permission_classes = [AllowAny]  # Allow unauthenticated users
@@ -32,7 +49,7 @@ class RegisterView(APIView):
         role = request.data.get("role", "user")  # Default to "user" if role is not provided
 
         # Validate role if provided
-        valid_roles = ["user", "admin"]  # Add other roles if needed
+        valid_roles = VALID_ROLES
         if role not in valid_roles:
             return Response({"error": f"Invalid role. Valid roles are {valid_roles}."}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -46,6 +63,11 @@ class RegisterView(APIView):
         if User.objects.filter(email=email).exists():
             return Response({"error": "Email already exists."}, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            hashed_password = get_hashing_pool().make_password(password)  # Hash off the request thread, before opening the transaction
+        except HashingPoolBusy:
+            return busy_response()
+
         try:
             # Use a single transaction to handle both user and settings creation
             with transaction.atomic():
@@ -53,7 +75,7 @@ class RegisterView(APIView):
                 user = User.objects.create(
                     username=username,
                     email=email,
-                    password=make_password(password),
+                    password=hashed_password,
                 )
 
                 # Create the user's settings with the specified or default role
@@ -64,6 +86,8 @@ class RegisterView(APIView):
 
             # Create a token (using JWT or session, depending on your setup)
             refresh = RefreshToken.for_user(user)
+            refresh['role'] = role  # Same claims as CustomTokenObtainPairSerializer issues on login
+            refresh['username'] = user.username
             access_token = refresh.access_token
 
             return Response({
@@ -78,50 +102,71 @@ class RegisterView(APIView):
 class LoginView(APIView):
     authentication_classes = []  # Disable authentication for this view
     permission_classes = []  # Optionally disable permission check if necessary
+    throttle_classes = [LoginThrottle]  # 429 before any lookup or hashing
     
     def post(self, request):
-        username = request.data.get("username")
-        password = request.data.get("password")
+        data = request.data if isinstance(request.data, dict) else {}  # A JSON array body is answered 400 below
+        username = data.get("username")
+        password = data.get("password")
 
         if not username or not password:
             return Response({"error": "Username and password are required."}, status=status.HTTP_400_BAD_REQUEST)
       
-        user = authenticate(request, username=username, password=password)
-
-        if user is None:
-            return Response({"error": "Invalid credentials."}, status=status.HTTP_401_UNAUTHORIZED)
-
-        # Generate token using the custom serializer
-        serializer = CustomTokenObtainPairSerializer(data={"username": username, "password": password})
-        serializer.is_valid(raise_exception=True)  # This will call validate()
-        token_data = serializer.validated_data
+        # One joined query for the user and the role, then a single password hash:
+        # authenticate() plus the token serializer used to load the user and run the hasher twice
+        try:
+            user = User.objects.select_related('usersettings').filter(username=username).first()
+            if user is None:
+                get_hashing_pool().make_password(password)  # Run the hasher anyway so unknown usernames take as long as wrong passwords
+                valid = False
+            else:
+                valid = verify_password(user, password)  # Hash in the pool, upgrade the stored hash if needed
+        except HashingPoolBusy:
+            return busy_response()
+
+        if valid and user.is_active:
+            token = CustomTokenObtainPairSerializer.get_token(user)  # Embeds role and username
+            return Response({
+                "message": "Login successful",
+                "access_token": str(token.access_token),
+                "refresh_token": str(token),
+            }, status=status.HTTP_200_OK)
 
-        return Response({
-            "message": "Login successful",
-            "access_token": token_data['access'],
-            "refresh_token": token_data['refresh'],
-        }, status=status.HTTP_200_OK)
+        user_login_failed.send(sender=__name__, credentials={"username": username}, request=request)
+        return Response({"error": "Invalid credentials."}, status=status.HTTP_401_UNAUTHORIZED)
 
 # Logout view (Invalidate the token)
 class LogoutView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        # Invalidate the token (simple approach, you can implement blacklist logic)
-        try:
-            request.user.auth_token.delete()  # If using token authentication
-            return Response({"message": "Logged out successfully"}, status=status.HTTP_200_OK)
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        """
+        Revokes the access token used for this request and, if given, the refresh token
+        in the "refresh" field, until they expire.
+        """
+        tokens = [request.auth]
+        refresh = request.data.get("refresh")
+        if refresh:
+            try:
+                refresh_token = RefreshToken(refresh)  # Validates signature and expiry
+            except TokenError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            if str(refresh_token.get(api_settings.USER_ID_CLAIM)) != str(request.user.pk):
+                return Response({"error": "Refresh token belongs to another user."}, status=status.HTTP_400_BAD_REQUEST)
+            tokens.append(refresh_token)
+
+        get_revocation_list().revoke(tokens)
+        return Response({"message": "Logged out successfully"}, status=status.HTTP_200_OK)
 
 class PasswordResetRequestView(APIView):
     # Set permission to allow any user (authenticated or not) to access this view
     permission_classes = [AllowAny]
+    throttle_classes = [PasswordResetThrottle]  # 429 before the user lookup and outbox insert
 
     # Define the POST method to handle password reset requests
     def post(self, request):
-        # Retrieve the email from the incoming request data
-        email = request.data.get("email")
+        # Retrieve the email from the incoming request data (a JSON array body has none)
+        email = request.data.get("email") if isinstance(request.data, dict) else None
 
         # If the email is not provided in the request, return a 400 Bad Request error
         if not email:
@@ -141,10 +186,10 @@ class PasswordResetRequestView(APIView):
         uid = urlsafe_base64_encode(str(user.pk).encode())
         reset_link = f"http://localhost:8000/api/reset-password/{uid}/{token}/"
 
-        # Send the reset link via email (optional for testing)
+        # Queue the reset link email; `manage.py run_outbox` sends it, so the request never waits on SMTP
         subject = "Password Reset Request"  # Subject line of the email
         message = f"Click the link below to reset your password:\n\n{reset_link}"  # Body of the email containing the reset link
-        send_mail(subject, message, settings.EMAIL_HOST_USER, [email])  # Sending the email to the user
+        queue_email(subject, message, [email], settings.EMAIL_HOST_USER)  # One INSERT into the outbox
 
         # Return a response confirming that the reset link has been sent to the user's email
         # Include the reset link in the response body (usually for testing purposes)
@@ -181,8 +226,11 @@ class PasswordResetConfirmView(APIView):
         if not new_password:
             return Response({"error": "Password is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Set the user's password to the new password, securely hashing it
-        user.password = make_password(new_password)
+        # Set the user's password to the new password, securely hashing it off the request thread
+        try:
+            user.password = get_hashing_pool().make_password(new_password)
+        except HashingPoolBusy:
+            return busy_response()
 
         # Save the user object with the updated password in the database
         user.save()